@@ -0,0 +1,113 @@
+"""
+性能测试公共工具
+功能：
+1. 计时与统计（p50/p95/mean/ops_per_sec）
+2. 合成数据：随机128维特征、按身份聚类的人脸库、直接写入SQLite的测试数据库
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+# 允许以 python benchmarks/run_benchmarks.py 方式运行
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+SIZES = {'1k': 1000, '10k': 10000, '100k': 100000, '1m': 1000000}
+EXEMPLARS_PER_PERSON = 5
+
+
+def summarize(durations: List[float], unit_ops: int = 1) -> Dict[str, float]:
+    """
+    汇总一组耗时(秒)
+
+    Args:
+        durations: 每次执行的耗时
+        unit_ops: 每次执行包含的操作数，用于计算 ops_per_sec
+    """
+    values = np.asarray(durations, dtype=np.float64) * 1000.0
+    total = float(np.sum(durations))
+    return {
+        'unit': 'ms',
+        'n': len(durations),
+        'p50': float(np.percentile(values, 50)),
+        'p95': float(np.percentile(values, 95)),
+        'mean': float(values.mean()),
+        'ops_per_sec': (len(durations) * unit_ops / total) if total > 0 else 0.0,
+    }
+
+
+def measure(fn: Callable, repeat: int = 20, warmup: int = 2, unit_ops: int = 1) -> Dict[str, float]:
+    """多次执行 fn 并统计耗时"""
+    for _ in range(warmup):
+        fn()
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - start)
+    return summarize(durations, unit_ops)
+
+
+def measure_once(fn: Callable, unit_ops: int = 1) -> Dict[str, float]:
+    """只执行一次的耗时操作（如大批量导入）"""
+    return measure(fn, repeat=1, warmup=0, unit_ops=unit_ops)
+
+
+def synthetic_features(count: int, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    生成按身份聚类的随机特征：每 EXEMPLARS_PER_PERSON 个样本属于同一身份，
+    身份中心之间的距离远大于识别阈值，样本之间的距离在阈值以内
+
+    Returns:
+        (特征 float32 [count, 128], 每个样本所属身份的编号)
+    """
+    rng = np.random.default_rng(seed)
+    persons = max(1, count // EXEMPLARS_PER_PERSON)
+    centers = rng.normal(0, 0.09, size=(persons, 128))
+    labels = np.arange(count) % persons
+    return (centers[labels] + rng.normal(0, 0.015, size=(count, 128))).astype(np.float32), labels
+
+
+def synthetic_probes(features: np.ndarray, count: int = 200, seed: int = 1) -> np.ndarray:
+    """在已有样本附近生成查询特征"""
+    rng = np.random.default_rng(seed)
+    idx = rng.integers(0, len(features), size=count)
+    return features[idx] + rng.normal(0, 0.01, size=(count, 128)).astype(np.float32)
+
+
+def build_database(db_path: str, features: np.ndarray, labels: np.ndarray):
+    """
+    直接用 executemany 写入测试数据库（与 FaceDatabaseManager 的表结构一致），
+    避免夹具构建本身成为测试瓶颈
+    """
+    from face_database_manager import FaceDatabaseManager
+    FaceDatabaseManager(db_path)  # 创建表结构
+
+    conn = sqlite3.connect(db_path)
+    try:
+        persons = int(labels.max()) + 1
+        conn.executemany(
+            'INSERT INTO persons (id, name, id_card, is_temp) VALUES (?, ?, ?, 0)',
+            ((i + 1, f'bench_{i}', f'{i:018d}') for i in range(persons))
+        )
+        rows = []
+        for i, (feature, label) in enumerate(zip(features, labels)):
+            vector = [float(x) for x in feature]
+            feature_hash = hashlib.md5(json.dumps(vector).encode()).hexdigest()
+            rows.append((int(label) + 1, json.dumps(vector), feature_hash))
+            if len(rows) >= 10000:
+                conn.executemany('INSERT INTO face_features (person_id, feature_vector, feature_hash) VALUES (?, ?, ?)', rows)
+                rows = []
+        if rows:
+            conn.executemany('INSERT INTO face_features (person_id, feature_vector, feature_hash) VALUES (?, ?, ?)', rows)
+        conn.commit()
+    finally:
+        conn.close()
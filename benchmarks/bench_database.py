@@ -0,0 +1,69 @@
+"""
+数据库读写性能测试：find_similar_face、get_face_features、add_face_feature 批量写入、
+CSV导入导出、内存人脸库快照加载
+"""
+
+import os
+import tempfile
+
+import numpy as np
+
+from bench_common import build_database, measure, measure_once, synthetic_features, synthetic_probes
+
+from face_database_manager import FaceDatabaseManager
+
+# 逐条写入类测试的数据量上限，避免大规模数据库下单次运行过久
+INSERT_OPS = 500
+CSV_IMPORT_ROWS = 1000
+
+
+def run(size_name: str, count: int, results: dict, workdir: str = None):
+    workdir = workdir or tempfile.mkdtemp(prefix='face_bench_')
+    db_path = os.path.join(workdir, f'bench_{size_name}.db')
+    features, labels = synthetic_features(count)
+    build_database(db_path, features, labels)
+
+    db = FaceDatabaseManager(db_path, search_mode='coarse')
+
+    # 快照加载：从数据库构建内存人脸库
+    results[f'gallery_snapshot_load[{size_name}]'] = measure(db.load_gallery, repeat=3, warmup=0, unit_ops=count)
+
+    queries = synthetic_probes(features, 200)
+    state = {'i': 0}
+
+    def find_one():
+        db.find_similar_face(list(queries[state['i'] % len(queries)]), 0.48)
+        state['i'] += 1
+
+    results[f'find_similar_face[{size_name}]'] = measure(find_one, repeat=200, warmup=5)
+
+    results[f'get_face_features[{size_name}]'] = measure(db.get_face_features, repeat=3, warmup=0, unit_ops=count)
+
+    # 逐条添加特征（包含样本精简和内存人脸库同步）
+    rng = np.random.default_rng(2)
+    persons = int(labels.max()) + 1
+    new_features = features[rng.integers(0, count, size=INSERT_OPS)] + \
+        rng.normal(0, 0.01, size=(INSERT_OPS, 128)).astype(np.float32)
+    person_ids = rng.integers(1, persons + 1, size=INSERT_OPS)
+    state = {'i': 0}
+
+    def add_one():
+        i = state['i']
+        db.add_face_feature(int(person_ids[i]), [float(x) for x in new_features[i]])
+        state['i'] += 1
+
+    results[f'add_face_feature[{size_name}]'] = measure(add_one, repeat=INSERT_OPS, warmup=0)
+
+    # CSV导出（全部特征）与导入（限定行数，写入新数据库）
+    csv_path = os.path.join(workdir, f'bench_{size_name}.csv')
+    results[f'csv_export[{size_name}]'] = measure_once(lambda: db.export_to_csv(csv_path), unit_ops=count)
+
+    import_csv = os.path.join(workdir, f'bench_{size_name}_import.csv')
+    with open(csv_path, encoding='utf-8') as src, open(import_csv, 'w', encoding='utf-8') as dst:
+        for i, line in enumerate(src):
+            if i >= CSV_IMPORT_ROWS:
+                break
+            dst.write(line)
+    import_db = FaceDatabaseManager(os.path.join(workdir, f'bench_{size_name}_import.db'))
+    results[f'csv_import[{size_name}]'] = measure_once(lambda: import_db.import_from_csv(import_csv),
+                                                       unit_ops=min(count, CSV_IMPORT_ROWS))
@@ -0,0 +1,26 @@
+"""
+内存人脸库检索性能测试：精确检索与两级（中心特征粗筛）检索
+"""
+
+from bench_common import measure, synthetic_features, synthetic_probes
+
+from face_gallery import FaceGallery
+
+
+def run(size_name: str, count: int, results: dict, probes: int = 200):
+    features, labels = synthetic_features(count)
+    rows = ((i + 1, int(label) + 1, features[i], f'bench_{label}', None, None, 0, 0)
+            for i, label in enumerate(labels))
+    gallery = FaceGallery()
+    gallery.load(rows)
+    queries = synthetic_probes(features, probes)
+
+    for mode in (FaceGallery.MODE_EXACT, FaceGallery.MODE_COARSE):
+        gallery.search_mode = mode
+        state = {'i': 0}
+
+        def search_one():
+            gallery.search(queries[state['i'] % len(queries)], 0.48)
+            state['i'] += 1
+
+        results[f'gallery_search_{mode}[{size_name}]'] = measure(search_one, repeat=probes, warmup=5)
@@ -0,0 +1,54 @@
+"""
+Dlib 推理各阶段性能测试：不同缩放比例下的CNN检测、关键点、特征提取
+使用合成图像；未安装dlib或缺少模型文件时跳过
+"""
+
+import os
+
+import cv2
+import numpy as np
+
+from bench_common import ROOT_DIR, measure
+
+SCALES = (0.3, 0.5, 1.0)
+FRAME_SIZE = (1920, 1080)
+
+
+def synthetic_frame(width: int, height: int, faces: int = 3, seed: int = 0) -> np.ndarray:
+    """生成带有若干卡通人脸的RGB合成图像（不保证能被检测到，主要用于测量耗时）"""
+    rng = np.random.default_rng(seed)
+    img = (rng.random((height, width, 3)) * 60 + 100).astype(np.uint8)
+    for i in range(faces):
+        cx, cy = int(width * (i + 1) / (faces + 1)), height // 2
+        r = height // 8
+        cv2.ellipse(img, (cx, cy), (int(r * 0.8), r), 0, 0, 360, (224, 185, 160), -1)
+        for dx in (-r // 3, r // 3):
+            cv2.circle(img, (cx + dx, cy - r // 4), r // 10, (40, 30, 30), -1)
+        cv2.line(img, (cx, cy - r // 8), (cx, cy + r // 6), (150, 110, 100), 3)
+        cv2.ellipse(img, (cx, cy + r // 2), (r // 3, r // 8), 0, 0, 180, (120, 40, 40), 3)
+    return img
+
+
+def run(results: dict, repeat: int = 10):
+    try:
+        import dlib
+        from recognition_engine import DEFAULT_MODEL_DIR, load_models
+        models = load_models(os.path.join(ROOT_DIR, DEFAULT_MODEL_DIR))
+    except Exception as e:
+        print(f"跳过推理测试: {e}")
+        return
+    cnn_face_detector, predictor, face_reco_model = models
+
+    img = synthetic_frame(*FRAME_SIZE)
+    for scale in SCALES:
+        img_small = cv2.resize(img, (0, 0), fx=scale, fy=scale)
+        results[f'resize[{scale}]'] = measure(lambda: cv2.resize(img, (0, 0), fx=scale, fy=scale), repeat=repeat)
+        results[f'detect[{scale}]'] = measure(lambda: cnn_face_detector(img_small, 0), repeat=repeat, warmup=1)
+
+    # 关键点与特征提取在固定人脸框上测量，与检测结果无关
+    height = FRAME_SIZE[1]
+    cx, cy, r = FRAME_SIZE[0] // 4, height // 2, height // 8
+    rect = dlib.rectangle(cx - r, cy - r, cx + r, cy + r)
+    shape = predictor(img, rect)
+    results['landmarks'] = measure(lambda: predictor(img, rect), repeat=repeat * 10)
+    results['descriptor'] = measure(lambda: face_reco_model.compute_face_descriptor(img, shape), repeat=repeat, warmup=1)
@@ -0,0 +1,132 @@
+"""
+性能测试入口
+功能：
+1. 运行内存人脸库检索、数据库读写、Dlib推理各阶段的性能测试
+2. 结果写入JSON（机器可读）
+3. 与保存的基线比较，p50 超出容差即视为性能退化，以退出码1结束
+
+用法示例：
+    python benchmarks/run_benchmarks.py --sizes 1k,10k --output benchmarks/results.json
+    python benchmarks/run_benchmarks.py --save-baseline
+    python benchmarks/run_benchmarks.py --sizes 1k,10k,100k,1m --tolerance 0.3
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import bench_common
+import bench_database
+import bench_gallery
+import bench_inference
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="人脸识别性能测试")
+    parser.add_argument('--sizes', default='1k,10k,100k',
+                        help="人脸库规模，可选 " + ','.join(bench_common.SIZES))
+    parser.add_argument('--suites', default='gallery,database,inference', help="要运行的测试组")
+    parser.add_argument('--output', help="结果JSON路径")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="基线JSON路径")
+    parser.add_argument('--save-baseline', action='store_true', help="将本次结果保存为基线")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="允许的 p50 退化比例")
+    parser.add_argument('--workdir', help="测试数据库存放目录（默认临时目录）")
+    return parser.parse_args(argv)
+
+
+def compare(results: dict, baseline: dict, tolerance: float):
+    """
+    与基线比较
+
+    Returns:
+        [(名称, 基线p50, 当前p50, 变化比例, 是否退化), ...]
+    """
+    rows = []
+    for name, current in sorted(results.items()):
+        base = baseline.get(name)
+        if not base or base.get('p50', 0) <= 0:
+            continue
+        change = current['p50'] / base['p50'] - 1.0
+        rows.append((name, base['p50'], current['p50'], change, change > tolerance))
+    return rows
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sizes = [size.strip().lower() for size in args.sizes.split(',') if size.strip()]
+    unknown = [size for size in sizes if size not in bench_common.SIZES]
+    if unknown:
+        print(f"未知的规模: {unknown}")
+        return 2
+    suites = {suite.strip() for suite in args.suites.split(',')}
+    workdir = args.workdir or tempfile.mkdtemp(prefix='face_bench_')
+
+    results = {}
+    start = time.time()
+    for size in sizes:
+        count = bench_common.SIZES[size]
+        if 'gallery' in suites:
+            print(f"[gallery] {size} ...")
+            bench_gallery.run(size, count, results)
+        if 'database' in suites:
+            print(f"[database] {size} ...")
+            bench_database.run(size, count, results, workdir)
+    if 'inference' in suites:
+        print("[inference] ...")
+        bench_inference.run(results)
+
+    report = {
+        'meta': {
+            'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'machine': platform.machine(),
+            'sizes': sizes,
+            'duration': round(time.time() - start, 1),
+        },
+        'results': results,
+    }
+
+    print(f"\n{'测试项':<40} {'p50(ms)':>10} {'p95(ms)':>10} {'ops/s':>12}")
+    for name, stats in sorted(results.items()):
+        print(f"{name:<40} {stats['p50']:10.3f} {stats['p95']:10.3f} {stats['ops_per_sec']:12.1f}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n基线已保存: {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\n没有找到基线文件 {args.baseline}，跳过比较（可使用 --save-baseline 生成）")
+        return 0
+
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f).get('results', {})
+    rows = compare(results, baseline, args.tolerance)
+    regressions = [row for row in rows if row[4]]
+
+    print(f"\n与基线比较（容差 {args.tolerance:.0%}）:")
+    for name, base_p50, current_p50, change, regressed in rows:
+        flag = '  <-- 退化' if regressed else ''
+        print(f"{name:<40} {base_p50:10.3f} -> {current_p50:10.3f} ({change:+.1%}){flag}")
+
+    if regressions:
+        print(f"\n性能退化: {len(regressions)} 项超出容差")
+        return 1
+    print("\n未发现性能退化")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,537 @@
+"""
+数据库在线备份
+功能：
+1. 使用 sqlite3 在线备份接口（Connection.backup）分步复制，每步之间让出并短暂休眠，
+   不会长时间占用读锁而阻塞识别线程写库；得到的是一致的快照，不会复制到写了一半的文件
+2. 全量备份 + 页级增量备份：增量只保存与上一次备份相比内容变化的数据库页，
+   图片BLOB等未变化的数据不会每次重复保存
+3. 备份文件 gzip 压缩，先写临时文件再改名，中途失败不会留下残缺的备份
+4. 按备份链（一次全量备份及其后的增量备份）轮换，只保留最近若干条链
+5. 后台定时备份线程（默认每小时一次，每 24 次做一次全量）
+6. 人脸图像保存在外部存储（face_image_store）时，把新增的图像文件同步到备份目录的 images 下；
+   文件按内容哈希命名、写入后不再修改，只需复制新文件
+
+备份目录布局：
+    {库名}_{时间}.full.gz    全量备份（压缩后的数据库文件）
+    {库名}_{时间}.incr.gz    增量备份（变化的页），属于时间上在它之前最近的一次全量备份
+    {库名}_{链时间}.pages    该链最近一次备份时每一页的摘要，用于计算下一次增量
+    images/                  外部图像存储的副本（与存储目录结构相同）
+
+用法示例：
+    python db_backup.py backup --db data/face_database.db
+    python db_backup.py list --db data/face_database.db
+    python db_backup.py restore --db data/face_database.db --output restored.db
+"""
+
+import argparse
+import gzip
+import hashlib
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import struct
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+INCREMENT_MAGIC = b'FDBI'
+INCREMENT_VERSION = 1
+
+_INCREMENT_HEADER = struct.Struct('<4sHII')  # 标识 | 版本 | 页大小 | 快照页数
+_PAGE_NUMBER = struct.Struct('<I')
+_DIGEST_SIZE = 16
+_READ_PAGES = 256  # 读取快照时每次读取的页数
+_FILE_PATTERN = re.compile(r'^(?P<name>.+)_(?P<stamp>\d{8}_\d{6}_\d{3})\.(?P<kind>full|incr)\.gz$')
+
+
+class _TooManyRestarts(Exception):
+    """分步复制期间源库不断被修改，备份反复重来"""
+
+
+def online_backup(src_path: str, dst_path: str, pages_per_step: int = 256, step_sleep: float = 0.005,
+                  max_restarts: int = 3, progress: Optional[Callable[[int, int], None]] = None) -> int:
+    """
+    使用 sqlite3 在线备份接口把数据库复制到 dst_path
+
+    每复制 pages_per_step 页让出一次并休眠 step_sleep 秒，期间其他连接可以正常读写。
+    其他连接在复制过程中写库会使备份从头开始，连续重来超过 max_restarts 次时改为一次性复制
+    （只在复制期间短暂持有读锁）。
+
+    Args:
+        src_path: 源数据库路径
+        dst_path: 目标路径（已存在时被覆盖）
+        pages_per_step: 每步复制的页数
+        step_sleep: 每步之间的休眠时间（秒）
+        max_restarts: 允许的最大重来次数
+        progress: 进度回调 (已复制页数, 总页数)
+
+    Returns:
+        复制的总页数
+    """
+    state = {'remaining': None, 'restarts': 0, 'total': 0}
+
+    def on_step(status, remaining, total):
+        if state['remaining'] is not None and remaining > state['remaining']:
+            state['restarts'] += 1
+            if state['restarts'] > max_restarts:
+                raise _TooManyRestarts()
+        state['remaining'] = remaining
+        state['total'] = total
+        if progress:
+            progress(total - remaining, total)
+        if step_sleep > 0 and remaining > 0:
+            time.sleep(step_sleep)
+
+    src = sqlite3.connect(src_path, timeout=30)
+    dst = sqlite3.connect(dst_path)
+    try:
+        try:
+            src.backup(dst, pages=pages_per_step, progress=on_step)
+        except _TooManyRestarts:
+            logging.info(f"数据库写入频繁，分步备份已重来 {max_restarts} 次，改为一次性复制")
+            src.backup(dst, pages=-1)
+            state['total'] = dst.execute('PRAGMA page_count').fetchone()[0]
+        return state['total']
+    finally:
+        dst.close()
+        src.close()
+
+
+def _page_digest(page: bytes) -> bytes:
+    return hashlib.blake2b(page, digest_size=_DIGEST_SIZE).digest()
+
+
+def _replace(tmp_path: str, path: str):
+    """临时文件写完后再改名为正式文件"""
+    os.replace(tmp_path, path)
+
+
+class DatabaseBackup:
+    """全量/增量在线备份与恢复"""
+
+    def __init__(self, db_path: str, backup_dir: str = 'data/backups', keep_chains: int = 3,
+                 full_every: int = 24, pages_per_step: int = 256, step_sleep: float = 0.005,
+                 compress_level: int = 3, image_store_dir: Optional[str] = None):
+        """
+        初始化备份器
+
+        Args:
+            db_path: 数据库路径
+            backup_dir: 备份目录
+            keep_chains: 保留的备份链数量（每条链为一次全量备份及其增量备份）
+            full_every: 一条链中备份次数达到该值后，下一次自动备份改为全量
+            pages_per_step: 在线复制每步的页数
+            step_sleep: 在线复制每步之间的休眠时间（秒）
+            compress_level: gzip 压缩级别（1 最快，9 最小）
+            image_store_dir: 人脸图像外部存储目录，None 表示不同步图像文件
+        """
+        self.db_path = db_path
+        self.backup_dir = backup_dir
+        self.keep_chains = keep_chains
+        self.full_every = full_every
+        self.pages_per_step = pages_per_step
+        self.step_sleep = step_sleep
+        self.compress_level = compress_level
+        self.image_store_dir = image_store_dir
+        self.name = os.path.splitext(os.path.basename(db_path))[0]
+        self.lock = threading.Lock()
+        self._last_source_state = None  # 上次备份时数据库文件的 (大小, 修改时间)
+
+        os.makedirs(self.backup_dir, exist_ok=True)
+
+    # ------------------------------------------------------------------
+    # 备份文件
+    # ------------------------------------------------------------------
+
+    def list_backups(self) -> List[Dict]:
+        """
+        按时间顺序列出备份
+
+        Returns:
+            [{'path', 'kind', 'stamp', 'chain', 'size'}, ...]，chain 为所属全量备份的时间
+        """
+        entries = []
+        for filename in os.listdir(self.backup_dir):
+            match = _FILE_PATTERN.match(filename)
+            if not match or match.group('name') != self.name:
+                continue
+            path = os.path.join(self.backup_dir, filename)
+            entries.append({
+                'path': path,
+                'kind': match.group('kind'),
+                'stamp': match.group('stamp'),
+                'size': os.path.getsize(path),
+            })
+        entries.sort(key=lambda entry: entry['stamp'])
+
+        chain = None
+        for entry in entries:
+            if entry['kind'] == 'full':
+                chain = entry['stamp']
+            entry['chain'] = chain
+        # 没有全量备份作为基准的增量无法恢复，不列出
+        return [entry for entry in entries if entry['chain'] is not None]
+
+    def _new_stamp(self) -> str:
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')[:-3]
+        existing = {entry['stamp'] for entry in self.list_backups()}
+        while stamp in existing:
+            time.sleep(0.001)
+            stamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')[:-3]
+        return stamp
+
+    def _backup_path(self, stamp: str, kind: str) -> str:
+        return os.path.join(self.backup_dir, f"{self.name}_{stamp}.{kind}.gz")
+
+    def _digest_path(self, chain: str) -> str:
+        return os.path.join(self.backup_dir, f"{self.name}_{chain}.pages")
+
+    def _load_digests(self, chain: str) -> Optional[List[bytes]]:
+        path = self._digest_path(chain)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            data = f.read()
+        return [data[i:i + _DIGEST_SIZE] for i in range(0, len(data), _DIGEST_SIZE)]
+
+    def _save_digests(self, chain: str, digests: List[bytes]):
+        path = self._digest_path(chain)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(b''.join(digests))
+        _replace(path + '.tmp', path)
+
+    def _source_state(self):
+        try:
+            stat = os.stat(self.db_path)
+        except OSError:
+            return None
+        wal_path = self.db_path + '-wal'
+        wal_state = os.stat(wal_path).st_mtime_ns if os.path.exists(wal_path) else None
+        return stat.st_size, stat.st_mtime_ns, wal_state
+
+    def _snapshot(self) -> str:
+        """在线复制出一致的快照文件"""
+        snapshot_path = os.path.join(self.backup_dir, f".{self.name}.snapshot")
+        if os.path.exists(snapshot_path):
+            os.remove(snapshot_path)
+        online_backup(self.db_path, snapshot_path, self.pages_per_step, self.step_sleep)
+        return snapshot_path
+
+    @staticmethod
+    def _iter_pages(snapshot_path: str):
+        """逐页读取快照，返回 (页大小, 页迭代器)"""
+        conn = sqlite3.connect(snapshot_path)
+        try:
+            page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+        finally:
+            conn.close()
+
+        def pages():
+            with open(snapshot_path, 'rb') as f:
+                while True:
+                    block = f.read(page_size * _READ_PAGES)
+                    if not block:
+                        break
+                    for offset in range(0, len(block), page_size):
+                        yield block[offset:offset + page_size]
+
+        return page_size, pages()
+
+    def sync_images(self) -> int:
+        """
+        把外部图像存储中的新文件复制到备份目录（优先使用硬链接，已存在的文件跳过）
+
+        Returns:
+            新复制的文件数
+        """
+        if not self.image_store_dir or not os.path.isdir(self.image_store_dir):
+            return 0
+        mirror_root = os.path.join(self.backup_dir, 'images')
+        copied = 0
+        for dirpath, _, filenames in os.walk(self.image_store_dir):
+            relative = os.path.relpath(dirpath, self.image_store_dir)
+            target_dir = os.path.normpath(os.path.join(mirror_root, relative))
+            for filename in filenames:
+                if filename.endswith('.tmp'):
+                    continue
+                target = os.path.join(target_dir, filename)
+                if os.path.exists(target):
+                    continue
+                os.makedirs(target_dir, exist_ok=True)
+                source = os.path.join(dirpath, filename)
+                try:
+                    os.link(source, target)
+                except OSError:
+                    shutil.copy2(source, target + '.tmp')
+                    _replace(target + '.tmp', target)
+                copied += 1
+        if copied:
+            logging.info(f"已同步 {copied} 个人脸图像文件到备份目录")
+        return copied
+
+    # ------------------------------------------------------------------
+    # 备份
+    # ------------------------------------------------------------------
+
+    def full_backup(self) -> Optional[str]:
+        """
+        全量备份，开始一条新的备份链
+
+        Returns:
+            备份文件路径，失败返回None
+        """
+        with self.lock:
+            start = time.time()
+            source_state = self._source_state()
+            snapshot_path = None
+            try:
+                snapshot_path = self._snapshot()
+                stamp = self._new_stamp()
+                path = self._backup_path(stamp, 'full')
+
+                page_size, pages = self._iter_pages(snapshot_path)
+                digests = []
+                with gzip.open(path + '.tmp', 'wb', compresslevel=self.compress_level) as out:
+                    for page in pages:
+                        digests.append(_page_digest(page))
+                        out.write(page)
+                _replace(path + '.tmp', path)
+                self._save_digests(stamp, digests)
+                self._last_source_state = source_state
+
+                logging.info(f"数据库全量备份完成: {path} ({len(digests)} 页, "
+                             f"{os.path.getsize(path) / 1024 / 1024:.1f}MB, 耗时 {time.time() - start:.1f}秒)")
+                self.rotate()
+                self.sync_images()
+                return path
+            except Exception as e:
+                logging.error(f"数据库全量备份失败: {str(e)}")
+                return None
+            finally:
+                if snapshot_path and os.path.exists(snapshot_path):
+                    os.remove(snapshot_path)
+
+    def incremental_backup(self) -> Optional[str]:
+        """
+        增量备份：只保存与上次备份相比变化的页
+
+        没有可用的全量备份时自动改为全量备份；数据库文件自上次备份后没有变化时跳过。
+
+        Returns:
+            备份文件路径，跳过或失败返回None
+        """
+        backups = self.list_backups()
+        chain = backups[-1]['chain'] if backups else None
+        digests = self._load_digests(chain) if chain else None
+        if digests is None:
+            return self.full_backup()
+
+        with self.lock:
+            source_state = self._source_state()
+            if source_state is not None and source_state == self._last_source_state:
+                logging.debug("数据库自上次备份后没有变化，跳过增量备份")
+                return None
+
+            start = time.time()
+            snapshot_path = None
+            try:
+                snapshot_path = self._snapshot()
+                stamp = self._new_stamp()
+                path = self._backup_path(stamp, 'incr')
+
+                page_size, pages = self._iter_pages(snapshot_path)
+                new_digests = []
+                changed = 0
+                with gzip.open(path + '.tmp', 'wb', compresslevel=self.compress_level) as out:
+                    page_count = os.path.getsize(snapshot_path) // page_size
+                    out.write(_INCREMENT_HEADER.pack(INCREMENT_MAGIC, INCREMENT_VERSION, page_size, page_count))
+                    for page_no, page in enumerate(pages):
+                        digest = _page_digest(page)
+                        new_digests.append(digest)
+                        if page_no < len(digests) and digests[page_no] == digest:
+                            continue
+                        out.write(_PAGE_NUMBER.pack(page_no))
+                        out.write(page)
+                        changed += 1
+                _replace(path + '.tmp', path)
+                self._save_digests(chain, new_digests)
+                self._last_source_state = source_state
+
+                logging.info(f"数据库增量备份完成: {path} ({changed}/{len(new_digests)} 页变化, "
+                             f"{os.path.getsize(path) / 1024 / 1024:.1f}MB, 耗时 {time.time() - start:.1f}秒)")
+                self.sync_images()
+                return path
+            except Exception as e:
+                logging.error(f"数据库增量备份失败: {str(e)}")
+                return None
+            finally:
+                if snapshot_path and os.path.exists(snapshot_path):
+                    os.remove(snapshot_path)
+
+    def backup(self) -> Optional[str]:
+        """定时备份入口：当前链的备份次数达到 full_every 时做全量备份，否则做增量备份"""
+        backups = self.list_backups()
+        if backups:
+            chain = backups[-1]['chain']
+            if sum(1 for entry in backups if entry['chain'] == chain) < self.full_every:
+                return self.incremental_backup()
+        return self.full_backup()
+
+    def rotate(self) -> int:
+        """
+        只保留最近 keep_chains 条备份链，删除更早的备份和摘要文件
+
+        Returns:
+            删除的文件数
+        """
+        backups = self.list_backups()
+        chains = sorted({entry['chain'] for entry in backups})
+        expired = set(chains[:-self.keep_chains]) if self.keep_chains > 0 else set()
+        removed = 0
+        for entry in backups:
+            if entry['chain'] in expired:
+                os.remove(entry['path'])
+                removed += 1
+        for chain in expired:
+            digest_path = self._digest_path(chain)
+            if os.path.exists(digest_path):
+                os.remove(digest_path)
+        if removed:
+            logging.info(f"已删除 {len(expired)} 条过期备份链（{removed} 个文件）")
+        return removed
+
+    # ------------------------------------------------------------------
+    # 恢复
+    # ------------------------------------------------------------------
+
+    def restore(self, output_path: str, until: Optional[str] = None) -> str:
+        """
+        恢复数据库到 output_path（不会覆盖正在使用的数据库，需要时请停止程序后手动替换）
+
+        Args:
+            output_path: 恢复出的数据库路径
+            until: 恢复到不晚于该时间的最近一次备份，格式同备份文件名中的时间（如 20240101_120000_000），
+                None 表示最近一次备份
+
+        Returns:
+            使用的最后一个备份文件路径
+
+        Raises:
+            ValueError: 没有可用的备份或恢复结果校验失败
+        """
+        backups = [entry for entry in self.list_backups() if until is None or entry['stamp'] <= until]
+        if not backups:
+            raise ValueError("没有可用于恢复的备份")
+        chain = backups[-1]['chain']
+        chain_backups = [entry for entry in backups if entry['chain'] == chain]
+
+        tmp_path = output_path + '.tmp'
+        with gzip.open(chain_backups[0]['path'], 'rb') as src, open(tmp_path, 'wb') as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+
+        for entry in chain_backups[1:]:
+            with gzip.open(entry['path'], 'rb') as src, open(tmp_path, 'r+b') as dst:
+                magic, version, page_size, page_count = _INCREMENT_HEADER.unpack(src.read(_INCREMENT_HEADER.size))
+                if magic != INCREMENT_MAGIC or version > INCREMENT_VERSION:
+                    raise ValueError(f"不是有效的增量备份文件: {entry['path']}")
+                while True:
+                    number = src.read(_PAGE_NUMBER.size)
+                    if not number:
+                        break
+                    page = src.read(page_size)
+                    if len(number) < _PAGE_NUMBER.size or len(page) < page_size:
+                        raise ValueError(f"增量备份文件不完整: {entry['path']}")
+                    dst.seek(_PAGE_NUMBER.unpack(number)[0] * page_size)
+                    dst.write(page)
+                dst.truncate(page_count * page_size)
+
+        conn = sqlite3.connect(tmp_path)
+        try:
+            result = conn.execute('PRAGMA quick_check').fetchone()[0]
+        finally:
+            conn.close()
+        if result != 'ok':
+            os.remove(tmp_path)
+            raise ValueError(f"恢复出的数据库校验失败: {result}")
+
+        _replace(tmp_path, output_path)
+        logging.info(f"数据库已恢复到 {output_path}（{len(chain_backups)} 个备份文件，截至 {chain_backups[-1]['stamp']}）")
+        return chain_backups[-1]['path']
+
+
+class BackupScheduler:
+    """后台定时备份线程"""
+
+    def __init__(self, backup: DatabaseBackup, interval: float = 3600, initial_delay: float = 300):
+        """
+        Args:
+            backup: 备份器
+            interval: 备份间隔（秒）
+            initial_delay: 启动后第一次备份前的等待时间（秒），避开程序启动时加载人脸库的高峰
+        """
+        self.backup = backup
+        self.interval = interval
+        self.initial_delay = initial_delay
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """启动备份线程"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="db-backup", daemon=True)
+        self._thread.start()
+        logging.info(f"定时数据库备份已启动 (间隔: {self.interval}秒, 目录: {self.backup.backup_dir})")
+
+    def stop(self):
+        """停止备份线程（正在进行的备份会继续完成）"""
+        self._stop_event.set()
+
+    def _run(self):
+        if self._stop_event.wait(self.initial_delay):
+            return
+        while not self._stop_event.is_set():
+            try:
+                self.backup.backup()
+            except Exception as e:
+                logging.error(f"定时数据库备份出错: {str(e)}")
+            if self._stop_event.wait(self.interval):
+                return
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="人脸数据库在线备份")
+    parser.add_argument('command', choices=['backup', 'full', 'list', 'restore', 'rotate'])
+    parser.add_argument('--db', default='data/face_database.db', help="数据库路径")
+    parser.add_argument('--dir', default='data/backups', help="备份目录")
+    parser.add_argument('--keep', type=int, default=3, help="保留的备份链数量")
+    parser.add_argument('--images', help="人脸图像外部存储目录（同步到备份目录）")
+    parser.add_argument('--output', help="恢复出的数据库路径")
+    parser.add_argument('--until', help="恢复到不晚于该时间的备份，如 20240101_120000_000")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    backup = DatabaseBackup(args.db, args.dir, keep_chains=args.keep, image_store_dir=args.images)
+
+    if args.command == 'backup':
+        backup.backup()
+    elif args.command == 'full':
+        backup.full_backup()
+    elif args.command == 'rotate':
+        backup.rotate()
+    elif args.command == 'list':
+        for entry in backup.list_backups():
+            print(f"{entry['stamp']}  {entry['kind']:<4}  {entry['size'] / 1024 / 1024:8.1f}MB  {entry['path']}")
+    elif args.command == 'restore':
+        if not args.output:
+            parser.error("restore 需要指定 --output")
+        backup.restore(args.output, args.until)
+    return 0
+
+
+if __name__ == '__main__':
+    main()
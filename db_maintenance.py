@@ -0,0 +1,181 @@
+"""
+数据库后台维护
+功能：
+1. 在后台线程中定时执行维护任务，不在识别循环（process_frame）里同步执行
+2. 过期临时人员、过期识别记录按索引分批删除，每批单独提交，期间识别线程可以正常写库
+3. incremental_vacuum 归还空闲页、ANALYZE/PRAGMA optimize 更新统计信息等较重的任务只在空闲时执行
+   （由调用方提供的 is_idle 判断，例如一段时间内没有检测到人脸），一直忙碌时跳过，下次再做
+4. 每次维护输出报告：每个任务做了什么、耗时多少
+
+用法示例：
+    scheduler = MaintenanceScheduler(db_manager, is_idle=lambda: True)
+    scheduler.add_task('识别事件压缩合并', event_store.maintain)
+    scheduler.start()
+"""
+
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+
+class MaintenanceTask:
+    """维护任务"""
+
+    def __init__(self, name: str, func: Callable[[], object], idle_only: bool = False):
+        self.name = name
+        self.func = func
+        self.idle_only = idle_only  # 只在空闲时执行
+
+
+class MaintenanceScheduler:
+    """定时数据库维护"""
+
+    def __init__(self, db_manager, interval: float = 3600, temp_max_age_hours: int = 24,
+                 log_retention_days: int = 90, chunk_size: int = 500, analyze_interval: float = 86400,
+                 is_idle: Optional[Callable[[], bool]] = None, idle_wait: float = 600,
+                 on_report: Optional[Callable[[List[Dict]], None]] = None,
+                 on_temp_purged: Optional[Callable[[List[int]], None]] = None):
+        """
+        初始化维护调度器
+
+        Args:
+            db_manager: FaceDatabaseManager
+            interval: 维护间隔（秒）
+            temp_max_age_hours: 临时人员保留时间（小时）
+            log_retention_days: 识别记录保留天数
+            chunk_size: 分批删除时每批的行数
+            analyze_interval: 完整 ANALYZE 的间隔（秒），其余时候执行 PRAGMA optimize
+            is_idle: 判断当前是否空闲的回调，None 表示总是空闲
+            idle_wait: 等待空闲的最长时间（秒），超时则跳过只在空闲时执行的任务
+            on_report: 每次维护完成后的回调，参数为报告
+            on_temp_purged: 每批过期临时人员删除后的回调，参数为人员ID列表
+        """
+        self.db_manager = db_manager
+        self.interval = interval
+        self.temp_max_age_hours = temp_max_age_hours
+        self.log_retention_days = log_retention_days
+        self.chunk_size = chunk_size
+        self.analyze_interval = analyze_interval
+        self.is_idle = is_idle or (lambda: True)
+        self.idle_wait = idle_wait
+        self.on_report = on_report
+        self.on_temp_purged = on_temp_purged
+
+        self.last_analyze_time = 0.0
+        self.last_report: List[Dict] = []
+        self._stop_event = threading.Event()
+        self._run_lock = threading.Lock()
+        self._thread = None
+
+        self.tasks: List[MaintenanceTask] = [
+            MaintenanceTask('清理过期临时人员', lambda: self.db_manager.purge_temp_persons(
+                self.temp_max_age_hours, self.chunk_size, self.on_temp_purged)),
+            MaintenanceTask('清理过期识别记录', lambda: self.db_manager.prune_recognition_logs(
+                self.log_retention_days, self.chunk_size * 10)),
+        ]
+        self.idle_tasks: List[MaintenanceTask] = [
+            MaintenanceTask('归还空闲页', self.db_manager.incremental_vacuum, idle_only=True),
+            MaintenanceTask('更新统计信息', self._optimize, idle_only=True),
+        ]
+
+    def add_task(self, name: str, func: Callable[[], object], idle_only: bool = False):
+        """添加维护任务（按添加顺序在内置任务之后执行）"""
+        task = MaintenanceTask(name, func, idle_only)
+        (self.idle_tasks if idle_only else self.tasks).append(task)
+
+    def _optimize(self) -> str:
+        if time.time() - self.last_analyze_time >= self.analyze_interval:
+            self.db_manager.optimize(analyze=True)
+            self.last_analyze_time = time.time()
+            return 'ANALYZE'
+        self.db_manager.optimize()
+        return 'optimize'
+
+    def _wait_idle(self) -> bool:
+        """等待空闲，超时或停止时返回False"""
+        deadline = time.time() + self.idle_wait
+        while not self.is_idle():
+            if time.time() >= deadline or self._stop_event.wait(5):
+                return False
+        return True
+
+    def _run_task(self, task: MaintenanceTask) -> Dict:
+        start = time.perf_counter()
+        try:
+            result = task.func()
+            error = None
+        except Exception as e:
+            result = None
+            error = str(e)
+            logging.error(f"维护任务 {task.name} 出错: {error}")
+        return {
+            'task': task.name,
+            'result': result,
+            'error': error,
+            'skipped': False,
+            'seconds': time.perf_counter() - start,
+        }
+
+    def run_once(self, wait_idle: bool = True) -> List[Dict]:
+        """
+        执行一次全部维护任务
+
+        Args:
+            wait_idle: 是否等待空闲后再执行只在空闲时执行的任务；False 时立即执行
+
+        Returns:
+            报告 [{'task', 'result', 'error', 'skipped', 'seconds'}, ...]
+        """
+        with self._run_lock:
+            report = [self._run_task(task) for task in self.tasks]
+
+            idle = not wait_idle or self._wait_idle()
+            for task in self.idle_tasks:
+                if idle:
+                    report.append(self._run_task(task))
+                else:
+                    report.append({'task': task.name, 'result': None, 'error': None,
+                                   'skipped': True, 'seconds': 0.0})
+
+            self.last_report = report
+            logging.info("数据库维护完成: " + format_report(report))
+            if self.on_report:
+                try:
+                    self.on_report(report)
+                except Exception as e:
+                    logging.error(f"处理维护报告时出错: {str(e)}")
+            return report
+
+    def start(self):
+        """启动维护线程"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="db-maintenance", daemon=True)
+        self._thread.start()
+        logging.info(f"数据库后台维护已启动 (间隔: {self.interval}秒)")
+
+    def stop(self):
+        """停止维护线程（正在执行的任务会继续完成）"""
+        self._stop_event.set()
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                logging.error(f"数据库维护出错: {str(e)}")
+
+
+def format_report(report: List[Dict]) -> str:
+    """报告转为一行文字，如 "清理过期临时人员=12 (0.05秒); 归还空闲页=跳过(忙碌)" """
+    parts = []
+    for item in report:
+        if item['skipped']:
+            parts.append(f"{item['task']}=跳过(忙碌)")
+        elif item['error']:
+            parts.append(f"{item['task']}=失败({item['error']}) ({item['seconds']:.2f}秒)")
+        else:
+            parts.append(f"{item['task']}={item['result']} ({item['seconds']:.2f}秒)")
+    return '; '.join(parts)
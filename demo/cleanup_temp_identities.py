@@ -5,10 +5,17 @@
 用于清理数据库中所有临时身份（unknown1、unknown2等）
 """
 
-import sqlite3
 import os
+import sys
 import logging
-from datetime import datetime
+import time
+
+# 允许以 python demo/cleanup_temp_identities.py 方式运行
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from face_database_manager import FaceDatabaseManager
 
 # 设置日志
 logging.basicConfig(
@@ -16,29 +23,24 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
+DB_PATH = "data/face_database.db"
+
 def cleanup_temp_identities():
     """清理所有临时身份"""
-    db_path = "data/face_database.db"
-    
-    if not os.path.exists(db_path):
+    if not os.path.exists(DB_PATH):
         print("错误: 找不到数据库文件")
         return False
     
     try:
-        # 连接数据库
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
+        db_manager = FaceDatabaseManager(DB_PATH)
         
         # 获取清理前的统计信息
-        cursor.execute("SELECT COUNT(*) FROM persons WHERE is_temp = 1")
-        temp_persons_before = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM persons WHERE is_temp = 0")
-        real_persons_before = cursor.fetchone()[0]
+        stats = db_manager.get_statistics()
+        temp_persons_before = stats['temp_persons']
         
         print(f"清理前统计:")
         print(f"  临时人员: {temp_persons_before} 个")
-        print(f"  真实人员: {real_persons_before} 个")
+        print(f"  真实人员: {stats['real_persons']} 个")
         print()
         
         if temp_persons_before == 0:
@@ -51,51 +53,25 @@ def cleanup_temp_identities():
             print("取消清理操作")
             return False
         
-        # 开始清理
+        # 开始清理：分批按集合删除临时人员及其特征、图像
         print("开始清理临时身份...")
+        start = time.time()
         
-        # 获取所有临时人员的ID
-        cursor.execute("SELECT id, name FROM persons WHERE is_temp = 1")
-        temp_persons = cursor.fetchall()
-        
-        deleted_count = 0
-        
-        for person_id, person_name in temp_persons:
-            try:
-                # 删除相关的人脸特征
-                cursor.execute("DELETE FROM face_features WHERE person_id = ?", (person_id,))
-                
-                # 删除相关的人脸图像
-                cursor.execute("DELETE FROM face_images WHERE person_id = ?", (person_id,))
-                
-                # 删除人员记录
-                cursor.execute("DELETE FROM persons WHERE id = ?", (person_id,))
-                
-                deleted_count += 1
-                print(f"已删除临时身份: {person_name} (ID: {person_id})")
-                
-            except Exception as e:
-                print(f"删除临时身份 {person_name} 时出错: {str(e)}")
-                continue
-        
-        # 提交更改
-        conn.commit()
+        def show_progress(person_ids):
+            show_progress.done += len(person_ids)
+            print(f"\r已删除 {show_progress.done}/{temp_persons_before} 个临时身份", end='', flush=True)
+        show_progress.done = 0
         
-        # 获取清理后的统计信息
-        cursor.execute("SELECT COUNT(*) FROM persons WHERE is_temp = 1")
-        temp_persons_after = cursor.fetchone()[0]
+        deleted_count = db_manager.purge_temp_persons(on_purged=show_progress)
         
-        cursor.execute("SELECT COUNT(*) FROM persons WHERE is_temp = 0")
-        real_persons_after = cursor.fetchone()[0]
+        # 获取清理后的统计信息
+        stats = db_manager.get_statistics()
         
         print()
-        print(f"清理完成!")
+        print(f"清理完成! 耗时 {time.time() - start:.1f} 秒")
         print(f"  成功删除: {deleted_count} 个临时身份")
-        print(f"  剩余临时人员: {temp_persons_after} 个")
-        print(f"  真实人员: {real_persons_after} 个")
-        
-        # 关闭数据库连接
-        conn.close()
+        print(f"  剩余临时人员: {stats['temp_persons']} 个")
+        print(f"  真实人员: {stats['real_persons']} 个")
         
         return True
         
@@ -106,46 +82,32 @@ def cleanup_temp_identities():
 
 def show_database_info():
     """显示数据库信息"""
-    db_path = "data/face_database.db"
-    
-    if not os.path.exists(db_path):
+    if not os.path.exists(DB_PATH):
         print("错误: 找不到数据库文件")
         return
     
     try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
+        db_manager = FaceDatabaseManager(DB_PATH)
         
         # 获取统计信息
-        cursor.execute("SELECT COUNT(*) FROM persons WHERE is_temp = 1")
-        temp_persons = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM persons WHERE is_temp = 0")
-        real_persons = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM face_features")
-        total_features = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM face_images")
-        total_images = cursor.fetchone()[0]
+        stats = db_manager.get_statistics()
         
         print("数据库信息:")
-        print(f"  临时人员: {temp_persons} 个")
-        print(f"  真实人员: {real_persons} 个")
-        print(f"  总人员: {temp_persons + real_persons} 个")
-        print(f"  人脸特征: {total_features} 个")
-        print(f"  人脸图像: {total_images} 个")
+        print(f"  临时人员: {stats['temp_persons']} 个")
+        print(f"  真实人员: {stats['real_persons']} 个")
+        print(f"  总人员: {stats['total_persons']} 个")
+        print(f"  人脸特征: {stats['total_features']} 个")
+        print(f"  人脸图像: {stats['total_images']} 个")
         
-        if temp_persons > 0:
+        if stats['temp_persons'] > 0:
             print()
             print("临时人员列表:")
-            cursor.execute("SELECT id, name, id_card, created_time FROM persons WHERE is_temp = 1 ORDER BY created_time DESC")
-            temp_list = cursor.fetchall()
+            temp_list = sorted((person for person in db_manager.get_all_persons(include_temp=True) if person['is_temp']),
+                               key=lambda person: person['created_time'] or '', reverse=True)
             
-            for person_id, name, id_card, created_time in temp_list:
-                print(f"  ID: {person_id}, 姓名: {name}, 身份证: {id_card}, 创建时间: {created_time}")
-        
-        conn.close()
+            for person in temp_list:
+                print(f"  ID: {person['id']}, 姓名: {person['name']}, 身份证: {person['id_card']}, "
+                      f"创建时间: {person['created_time']}")
         
     except Exception as e:
         print(f"获取数据库信息时出错: {str(e)}")
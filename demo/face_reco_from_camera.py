@@ -15,6 +15,13 @@ import pandas as pd
 import os
 import time
 import logging
+
+# 二进制人脸库读取（gallery_archive.py 位于仓库根目录） / Binary gallery reader from the repository root
+import sys
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+from gallery_archive import read_gallery_archive
 from PIL import Image, ImageDraw, ImageFont
 
 # Dlib 正向人脸检测器 / Use frontal face detector of Dlib
@@ -47,20 +54,20 @@ class Face_Recognizer:
         self.font = cv2.FONT_ITALIC
         self.font_chinese = ImageFont.truetype("simsun.ttc", 30)
 
-    # 从 "features_all.csv" 读取录入人脸特征 / Read known faces from "features_all.csv"
+    # 从 "features_all.fgal"（二进制人脸库）或 "features_all.csv" 读取录入人脸特征 / Read known faces from "features_all.fgal" or "features_all.csv"
     def get_face_database(self):
-        if os.path.exists("data/features_all.csv"):
+        if os.path.exists("data/features_all.fgal"):
+            archive = read_gallery_archive("data/features_all.fgal")
+            self.face_name_known_list.extend(archive.names())
+            self.face_feature_known_list.extend(archive.features.tolist())
+            logging.info("Faces in Database：%d", len(self.face_feature_known_list))
+            return 1
+        elif os.path.exists("data/features_all.csv"):
             path_features_known_csv = "data/features_all.csv"
             csv_rd = pd.read_csv(path_features_known_csv, header=None)
-            for i in range(csv_rd.shape[0]):
-                features_someone_arr = []
-                self.face_name_known_list.append(csv_rd.iloc[i][0])
-                for j in range(1, 129):
-                    if csv_rd.iloc[i][j] == '':
-                        features_someone_arr.append('0')
-                    else:
-                        features_someone_arr.append(csv_rd.iloc[i][j])
-                self.face_feature_known_list.append(features_someone_arr)
+            # 整列转换, 缺失值按 0 处理 / Convert whole columns, missing values as 0
+            self.face_name_known_list.extend(csv_rd.iloc[:, 0].tolist())
+            self.face_feature_known_list.extend(csv_rd.iloc[:, 1:129].fillna(0).to_numpy(dtype=float).tolist())
             logging.info("Faces in Database：%d", len(self.face_feature_known_list))
             return 1
         else:
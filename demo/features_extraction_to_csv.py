@@ -13,6 +13,13 @@ import dlib
 import csv
 import numpy as np
 import logging
+
+# 二进制人脸库写入（gallery_archive.py 位于仓库根目录） / Binary gallery writer from the repository root
+import sys
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+from gallery_archive import write_gallery_archive
 import cv2
 from PIL import Image
 
@@ -85,6 +92,8 @@ def main():
     person_list = os.listdir("data/data_faces_from_camera/")
     person_list.sort()
 
+    person_names = []
+    person_features = []
     with open("data/features_all.csv", "w", newline="", encoding="utf-8") as csvfile:
         writer = csv.writer(csvfile)
         for person in person_list:
@@ -92,12 +101,20 @@ def main():
             logging.info("%sperson_%s", path_images_from_camera, person)
             features_mean_personX = return_features_mean_personX(path_images_from_camera + person)
             person_name = person.split('_', 2)[-1]
+            person_names.append(person_name)
+            person_features.append(np.asarray(features_mean_personX, dtype=np.float32))
             features_mean_personX = np.insert(features_mean_personX, 0, person_name, axis=0)
             # features_mean_personX will be 129D, person name + 128 features
             writer.writerow(features_mean_personX)
             logging.info('\n')
         logging.info("所有录入人脸数据存入 / Save all the features of faces registered into: data/features_all.csv")
 
+    # 同时写入二进制人脸库, 识别程序优先读取 / Also save the binary gallery, which the recognizers load first
+    if person_names:
+        write_gallery_archive("data/features_all.fgal", np.stack(person_features), np.arange(len(person_names)),
+                              [{'name': name, 'is_temp': False, 'is_important': False} for name in person_names])
+        logging.info("二进制人脸库存入 / Save the binary gallery into: data/features_all.fgal")
+
 
 if __name__ == '__main__':
     main()
@@ -55,6 +55,8 @@ class Face_Register:
             shutil.rmtree(self.path_photos_from_camera+folders_rd[i])
         if os.path.isfile("data/features_all.csv"):
             os.remove("data/features_all.csv")
+        if os.path.isfile("data/features_all.fgal"):
+            os.remove("data/features_all.fgal")
 
     # 如果有之前录入的人脸, 在之前 person_x 的序号按照 person_x+1 开始录入 / Start from person_x+1
     def check_existing_faces_cnt(self):
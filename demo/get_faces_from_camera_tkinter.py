@@ -97,6 +97,8 @@ class Face_Register:
             shutil.rmtree(self.path_photos_from_camera + folders_rd[i])
         if os.path.isfile("./data/features_all.csv"):
             os.remove("./data/features_all.csv")
+        if os.path.isfile("./data/features_all.fgal"):
+            os.remove("./data/features_all.fgal")
         self.label_cnt_face_in_database['text'] = "0"
         self.registered_names.clear()
         self.log_all["text"] = "全部图片和`features_all.csv`已全部移除!"
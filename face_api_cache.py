@@ -0,0 +1,194 @@
+"""
+身份识别API结果缓存 - 以人脸特征向量为键
+功能：
+1. 以128维特征向量作为键缓存API识别结果，距离小于epsilon即视为同一人
+2. 支持TTL过期和容量上限（按最近使用淘汰）
+3. 请求合并：相近的特征在API请求进行中时直接加入等待，不再重复发起请求
+"""
+
+import time
+import logging
+import threading
+from typing import Optional, Tuple, Dict
+
+import numpy as np
+
+
+class CacheEntry:
+    """单条缓存记录"""
+
+    PENDING = 'pending'
+    RESOLVED = 'resolved'
+
+    def __init__(self, feature: np.ndarray, created_time: float):
+        self.feature = feature
+        self.created_time = created_time
+        self.last_access = created_time
+        self.expire_time = float('inf')  # 请求进行中的记录不过期
+        self.state = CacheEntry.PENDING
+        self.result = None     # API返回结果（失败时为None）
+        self.person_id = None  # 对应的数据库人员ID
+        self.waiters = 0       # 合并到该请求上的探测次数
+        self.event = threading.Event()
+
+    @property
+    def is_pending(self) -> bool:
+        return self.state == CacheEntry.PENDING
+
+
+class EmbeddingResultCache:
+    """以特征向量为键的API结果缓存"""
+
+    def __init__(self, epsilon: float = 0.4, ttl: float = 600, negative_ttl: float = 60,
+                 max_entries: int = 1024):
+        """
+        初始化结果缓存
+
+        Args:
+            epsilon: 特征距离小于该值即视为命中
+            ttl: 成功结果的有效期(秒)
+            negative_ttl: 失败结果的有效期(秒)，避免对同一张脸反复请求失败的API
+            max_entries: 最大缓存条数
+        """
+        self.epsilon = epsilon
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+
+        self._entries = []      # List[CacheEntry]，与_features行一一对应
+        self._features = None   # np.ndarray (N, 128)，用于向量化距离计算
+
+        # 统计信息
+        self.stats = {
+            'hits': 0,        # 命中已完成的结果
+            'coalesced': 0,   # 合并到进行中的请求
+            'misses': 0,      # 未命中，需要发起新请求
+            'evictions': 0,   # 因过期或容量被淘汰
+        }
+
+    @staticmethod
+    def _to_array(feature) -> np.ndarray:
+        """将dlib向量或列表转换为float32数组"""
+        return np.asarray(list(feature) if not isinstance(feature, np.ndarray) else feature,
+                          dtype=np.float32)
+
+    def _purge_expired(self, now: float):
+        """清理过期记录（调用方需持有锁）"""
+        keep = [i for i, entry in enumerate(self._entries) if entry.expire_time > now]
+        if len(keep) == len(self._entries):
+            return
+        self.stats['evictions'] += len(self._entries) - len(keep)
+        self._entries = [self._entries[i] for i in keep]
+        self._features = self._features[keep] if keep else None
+
+    def _evict_lru(self):
+        """容量已满时淘汰最久未使用的已完成记录（调用方需持有锁）"""
+        candidates = [i for i, entry in enumerate(self._entries) if not entry.is_pending]
+        if not candidates:
+            return False
+        victim = min(candidates, key=lambda i: self._entries[i].last_access)
+        self._entries.pop(victim)
+        self._features = np.delete(self._features, victim, axis=0)
+        if len(self._features) == 0:
+            self._features = None
+        self.stats['evictions'] += 1
+        return True
+
+    def _nearest(self, probe: np.ndarray) -> Tuple[Optional[CacheEntry], float]:
+        """查找最近的缓存记录（调用方需持有锁）"""
+        if self._features is None or not self._entries:
+            return None, float('inf')
+        distances = np.linalg.norm(self._features - probe, axis=1)
+        idx = int(np.argmin(distances))
+        return self._entries[idx], float(distances[idx])
+
+    def lookup(self, feature) -> Optional[CacheEntry]:
+        """
+        非阻塞查找：返回epsilon范围内最近的记录（进行中或已完成），否则返回None
+
+        命中进行中的记录即视为合并请求，调用方无需再发起API调用。
+        """
+        probe = self._to_array(feature)
+        now = time.time()
+        with self.lock:
+            self._purge_expired(now)
+            entry, distance = self._nearest(probe)
+            if entry is None or distance >= self.epsilon:
+                return None
+            entry.last_access = now
+            if entry.is_pending:
+                entry.waiters += 1
+                self.stats['coalesced'] += 1
+            else:
+                self.stats['hits'] += 1
+            return entry
+
+    def reserve(self, feature) -> Tuple[CacheEntry, bool]:
+        """
+        查找或登记一个进行中的请求
+
+        Returns:
+            (entry, is_owner) - is_owner为True表示调用方负责发起API请求并调用resolve()
+        """
+        probe = self._to_array(feature)
+        now = time.time()
+        with self.lock:
+            self._purge_expired(now)
+            entry, distance = self._nearest(probe)
+            if entry is not None and distance < self.epsilon:
+                entry.last_access = now
+                if entry.is_pending:
+                    entry.waiters += 1
+                    self.stats['coalesced'] += 1
+                else:
+                    self.stats['hits'] += 1
+                return entry, False
+
+            # 容量已满时先淘汰，全是进行中的请求时允许暂时超出上限
+            while len(self._entries) >= self.max_entries and self._evict_lru():
+                pass
+
+            entry = CacheEntry(probe, now)
+            self._entries.append(entry)
+            self._features = probe[np.newaxis, :] if self._features is None \
+                else np.vstack([self._features, probe])
+            self.stats['misses'] += 1
+            return entry, True
+
+    def resolve(self, entry: CacheEntry, result: Optional[Dict], person_id: int = None):
+        """完成一个进行中的请求，唤醒所有等待者"""
+        now = time.time()
+        with self.lock:
+            entry.result = result
+            entry.person_id = person_id
+            entry.state = CacheEntry.RESOLVED
+            entry.last_access = now
+            entry.expire_time = now + (self.ttl if result else self.negative_ttl)
+        entry.event.set()
+        if entry.waiters:
+            logging.debug(f"API结果已完成，合并了 {entry.waiters} 次重复请求")
+
+    def wait(self, entry: CacheEntry, timeout: float = None) -> Optional[Dict]:
+        """阻塞等待进行中的请求完成（仅用于后台线程），返回API结果"""
+        entry.event.wait(timeout)
+        return entry.result
+
+    def invalidate_person(self, person_id: int) -> int:
+        """人员被删除时移除对应的缓存记录"""
+        with self.lock:
+            keep = [i for i, entry in enumerate(self._entries) if entry.person_id != person_id]
+            removed = len(self._entries) - len(keep)
+            if removed:
+                self._entries = [self._entries[i] for i in keep]
+                self._features = self._features[keep] if keep else None
+            return removed
+
+    def clear(self):
+        """清空缓存（进行中的请求会照常完成，但不再可被查找）"""
+        with self.lock:
+            self._entries = []
+            self._features = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
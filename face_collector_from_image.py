@@ -631,25 +631,8 @@ class FaceCollector:
         # 生成临时身份信息（参考screen_face_monitor.py中的自动发现新面孔）
         temp_name, temp_id = self.generate_temp_identity()
         
-        # 添加人员到数据库，将输入框中的信息保存为real_name和real_id_card
-        try:
-            person_id = self.db_manager.add_person(
-                name=temp_name, 
-                id_card=temp_id, 
-                is_temp=False,  # 手动注册的不标记为临时
-                real_name=name,  # 输入框中的姓名作为真实姓名
-                real_id_card=id_number  # 输入框中的身份证号作为真实身份证号
-            )
-            print(f"添加人员到数据库成功: 临时身份 {temp_name}_{temp_id} -> 真实身份 {name}_{id_number} (ID: {person_id})")
-        except Exception as e:
-            print(f"添加人员到数据库失败: {str(e)}")
-            self.update_status("添加人员到数据库失败")
-            messagebox.showerror("错误", f"添加人员到数据库失败: {str(e)}")
-            return
-        
-        # 保存每个人脸
-        saved_count = 0
-        
+        # 先提取全部人脸的图像和特征
+        faces = []
         for i, face in enumerate(faces_to_save):
             try:
                 # 提取人脸区域
@@ -670,47 +653,35 @@ class FaceCollector:
                     print(f"提取人脸 {i+1} 特征向量失败: {str(feature_error)}")
                     feature = None
                 
-                # 转换为BGR格式并编码为JPEG
-                bgr_image = cv2.cvtColor(face_image, cv2.COLOR_RGB2BGR)
-                success, encoded_image = cv2.imencode('.jpg', bgr_image, [cv2.IMWRITE_JPEG_QUALITY, 95])
-                
-                if success:
-                    # 保存到数据库
-                    image_data = encoded_image.tobytes()
-                    image_id = self.db_manager.add_face_image(person_id, image_data, 'jpg')
-                    print(f"成功保存人脸图像到数据库: 图像ID {image_id}")
-                    
-                    # 保存特征向量
-                    if feature is not None:
-                        feature_id = self.db_manager.add_face_feature(person_id, feature)
-                        print(f"成功保存人脸特征向量到数据库: 特征ID {feature_id}")
-                    
-                    saved_count += 1
-                else:
-                    print(f"编码人脸图像失败")
-                    # 尝试使用PIL作为备用方案
-                    try:
-                        pil_image = Image.fromarray(face_image)
-                        import io
-                        img_buffer = io.BytesIO()
-                        pil_image.save(img_buffer, format='JPEG', quality=95)
-                        image_data = img_buffer.getvalue()
-                        image_id = self.db_manager.add_face_image(person_id, image_data, 'jpg')
-                        print(f"使用PIL成功保存人脸图像到数据库: 图像ID {image_id}")
-                        
-                        # 保存特征向量
-                        if feature is not None:
-                            feature_id = self.db_manager.add_face_feature(person_id, feature)
-                            print(f"成功保存人脸特征向量到数据库: 特征ID {feature_id}")
-                        
-                        saved_count += 1
-                    except Exception as pil_error:
-                        print(f"PIL保存也失败: {str(pil_error)}")
+                # 转换为BGR格式，由数据库按统一的尺寸上限和编码参数压缩后保存
+                faces.append((cv2.cvtColor(face_image, cv2.COLOR_RGB2BGR), feature))
                         
             except Exception as e:
-                print(f"保存第 {i+1} 张人脸图像时出错: {str(e)}")
+                print(f"处理第 {i+1} 张人脸图像时出错: {str(e)}")
                 continue
         
+        # 人员和全部人脸在一个事务中写入，将输入框中的信息保存为real_name和real_id_card
+        saved_count = 0
+        if faces:
+            try:
+                results = self.db_manager.enroll_faces({
+                    'name': temp_name,
+                    'id_card': temp_id,
+                    'is_temp': False,  # 手动注册的不标记为临时
+                    'real_name': name,  # 输入框中的姓名作为真实姓名
+                    'real_id_card': id_number  # 输入框中的身份证号作为真实身份证号
+                }, faces)
+                print(f"添加人员到数据库成功: 临时身份 {temp_name}_{temp_id} -> 真实身份 {name}_{id_number} "
+                      f"(ID: {results[0]['person_id']})")
+                for result in results:
+                    print(f"成功保存人脸到数据库: 图像ID {result['image_id']}, 特征ID {result['feature_id']}")
+                saved_count = len(results)
+            except Exception as e:
+                print(f"保存人脸到数据库失败: {str(e)}")
+                self.update_status("保存人脸到数据库失败")
+                messagebox.showerror("错误", f"保存人脸到数据库失败: {str(e)}")
+                return
+        
         if saved_count > 0:
             self.update_status(f"已保存 {saved_count} 张人脸图像到数据库")
             messagebox.showinfo("成功", f"已保存 {saved_count} 张人脸图像到数据库\n临时身份: {temp_name}_{temp_id}\n真实身份: {name}_{id_number}")
@@ -814,7 +785,8 @@ class FaceCollector:
         """批量保存不同姓名的人脸到数据库"""
         self.update_status("正在批量保存人脸到数据库...")
         
-        saved_count = 0
+        # 先准备好全部人脸，再在一个事务中写入数据库
+        entries = []
         for i, (face_idx, name, id_number) in enumerate(zip(self.selected_faces, names, id_numbers)):
             if not name or not id_number:
                 continue
@@ -823,17 +795,6 @@ class FaceCollector:
                 # 生成临时身份信息
                 temp_name, temp_id = self.generate_temp_identity()
                 
-                # 添加人员到数据库，将输入框中的信息保存为real_name和real_id_card
-                person_id = self.db_manager.add_person(
-                    name=temp_name, 
-                    id_card=temp_id, 
-                    is_temp=False,  # 手动注册的不标记为临时
-                    real_name=name,  # 输入框中的姓名作为真实姓名
-                    real_id_card=id_number  # 输入框中的身份证号作为真实身份证号
-                )
-                print(f"添加人员到数据库成功: 临时身份 {temp_name}_{temp_id} -> 真实身份 {name}_{id_number} (ID: {person_id})")
-                
-                # 保存人脸
                 face = self.current_faces[face_idx]
                 face_image = self.current_image[face.top():face.bottom(), face.left():face.right()]
                 
@@ -852,46 +813,34 @@ class FaceCollector:
                     print(f"提取人脸 {i+1} 特征向量失败: {str(feature_error)}")
                     feature = None
                 
-                # 转换为BGR格式并编码为JPEG
-                bgr_image = cv2.cvtColor(face_image, cv2.COLOR_RGB2BGR)
-                success, encoded_image = cv2.imencode('.jpg', bgr_image, [cv2.IMWRITE_JPEG_QUALITY, 95])
-                
-                if success:
-                    # 保存到数据库
-                    image_data = encoded_image.tobytes()
-                    image_id = self.db_manager.add_face_image(person_id, image_data, 'jpg')
-                    print(f"成功保存 {name} 的人脸图像到数据库: 图像ID {image_id}")
-                    
-                    # 保存特征向量
-                    if feature is not None:
-                        feature_id = self.db_manager.add_face_feature(person_id, feature)
-                        print(f"成功保存人脸特征向量到数据库: 特征ID {feature_id}")
-                    
-                    saved_count += 1
-                else:
-                    # 尝试PIL保存
-                    try:
-                        pil_image = Image.fromarray(face_image)
-                        import io
-                        img_buffer = io.BytesIO()
-                        pil_image.save(img_buffer, format='JPEG', quality=95)
-                        image_data = img_buffer.getvalue()
-                        image_id = self.db_manager.add_face_image(person_id, image_data, 'jpg')
-                        print(f"使用PIL成功保存 {name} 的人脸图像到数据库: 图像ID {image_id}")
-                        
-                        # 保存特征向量
-                        if feature is not None:
-                            feature_id = self.db_manager.add_face_feature(person_id, feature)
-                            print(f"成功保存人脸特征向量到数据库: 特征ID {feature_id}")
-                        
-                        saved_count += 1
-                    except Exception as pil_error:
-                        print(f"保存 {name} 的人脸图像失败: {str(pil_error)}")
+                # 将输入框中的信息保存为real_name和real_id_card；
+                # 图像转换为BGR格式，由数据库按统一的尺寸上限和编码参数压缩后保存
+                entries.append({
+                    'name': temp_name,
+                    'id_card': temp_id,
+                    'is_temp': False,  # 手动注册的不标记为临时
+                    'real_name': name,
+                    'real_id_card': id_number,
+                    'image': cv2.cvtColor(face_image, cv2.COLOR_RGB2BGR),
+                    'feature': feature,
+                })
                 
             except Exception as e:
-                print(f"保存 {name} 的人脸时出错: {str(e)}")
+                print(f"准备 {name} 的人脸时出错: {str(e)}")
                 continue
         
+        saved_count = 0
+        if entries:
+            try:
+                results = self.db_manager.add_persons_with_faces(entries)
+                for entry, result in zip(entries, results):
+                    print(f"成功保存人脸到数据库: 临时身份 {entry['name']}_{entry['id_card']} -> "
+                          f"真实身份 {entry['real_name']}_{entry['real_id_card']} "
+                          f"(人员ID: {result['person_id']}, 图像ID: {result['image_id']}, 特征ID: {result['feature_id']})")
+                saved_count = len(results)
+            except Exception as e:
+                print(f"批量保存人脸到数据库时出错: {str(e)}")
+        
         if saved_count > 0:
             self.load_registered_names()
             self.update_status(f"批量保存完成，共保存 {saved_count} 张人脸到数据库")
@@ -10,38 +10,191 @@ import numpy as np
 import logging
 import json
 import base64
-from datetime import datetime
-from typing import List, Dict, Optional, Tuple
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, List, Dict, Optional, Tuple
 import threading
 
+from db_backup import online_backup
+from face_gallery import FaceGallery, PersonTemplate, select_exemplars
+from face_image_store import ImageStore
+from person_cache import PERSON_COLUMNS, PersonCache
+from gallery_archive import FILE_EXTENSION, PERSON_FIELDS, read_gallery_archive, write_gallery_archive
+
+# 预生成的缩略图尺寸（长边像素）：64 用于列表/内存，200 用于预览和弹窗
+THUMBNAIL_SIZES = (64, 200)
+THUMBNAIL_QUALITY = 85
+
+# 人脸原图入库前统一处理：长边上限、编码格式（jpg/webp）和质量；重新编码同时去掉EXIF等元数据
+IMAGE_MAX_EDGE = 400
+IMAGE_CODEC = 'jpg'
+IMAGE_QUALITY = 90
+_IMAGE_QUALITY_FLAGS = {'jpg': cv2.IMWRITE_JPEG_QUALITY, 'webp': cv2.IMWRITE_WEBP_QUALITY}
+# 不需要缩放且格式相同的图像，重新编码至少小这么多才替换，避免反复有损编码
+IMAGE_MIN_SAVING = 0.05
+
+
+def make_thumbnail(image_bytes: bytes, size: int) -> Optional[Tuple[bytes, int, int]]:
+    """
+    生成缩略图（保持宽高比，长边不超过 size，JPEG编码）
+
+    Returns:
+        (JPEG数据, 宽, 高)，图像无法解码时返回None
+    """
+    img = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        return None
+    height, width = img.shape[:2]
+    ratio = min(1.0, size / float(max(height, width)))
+    if ratio < 1.0:
+        width, height = max(1, int(width * ratio)), max(1, int(height * ratio))
+        img = cv2.resize(img, (width, height), interpolation=cv2.INTER_AREA)
+    ok, encoded = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, THUMBNAIL_QUALITY])
+    if not ok:
+        return None
+    return encoded.tobytes(), width, height
+
+
+def normalize_face_image(image, max_edge: int = IMAGE_MAX_EDGE, codec: str = IMAGE_CODEC,
+                         quality: int = IMAGE_QUALITY) -> Optional[Tuple[bytes, str]]:
+    """
+    缩放并重新编码人脸图像
+
+    Args:
+        image: 编码后的图像数据(bytes)或 BGR 图像数组
+        max_edge: 长边像素上限，0 表示不缩放
+        codec: 'jpg' 或 'webp'
+        quality: 编码质量 (0-100)
+
+    Returns:
+        (编码后的数据, 格式)，图像无法解码或编码时返回None。
+        传入的已编码图像不需要缩放、格式相同且重新编码节省不到 IMAGE_MIN_SAVING 时，原样返回
+    """
+    if codec not in _IMAGE_QUALITY_FLAGS:
+        raise ValueError(f"不支持的图像编码格式: {codec}")
+    original = image if isinstance(image, bytes) else None
+    if original is not None:
+        image = cv2.imdecode(np.frombuffer(original, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            return None
+    
+    height, width = image.shape[:2]
+    resized = bool(max_edge) and max(height, width) > max_edge
+    if resized:
+        ratio = max_edge / float(max(height, width))
+        image = cv2.resize(image, (max(1, int(width * ratio)), max(1, int(height * ratio))),
+                           interpolation=cv2.INTER_AREA)
+    ok, encoded = cv2.imencode('.' + codec, image, [_IMAGE_QUALITY_FLAGS[codec], int(quality)])
+    if not ok:
+        return None
+    encoded = encoded.tobytes()
+    
+    if (original is not None and not resized and _image_codec(original) == codec
+            and len(encoded) > len(original) * (1 - IMAGE_MIN_SAVING)):
+        return original, codec
+    return encoded, codec
+
+
+def _image_codec(image_bytes: bytes) -> Optional[str]:
+    """按文件头判断编码格式"""
+    if image_bytes[:3] == b'\xff\xd8\xff':
+        return 'jpg'
+    if image_bytes[:4] == b'RIFF' and image_bytes[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+
 class FaceDatabaseManager:
     """人脸数据库管理器 - 使用SQLite存储"""
     
-    def __init__(self, db_path: str = "data/face_database.db"):
+    def __init__(self, db_path: str = "data/face_database.db", max_exemplars_per_person: int = 5,
+                 exemplar_method: str = 'kmedoids', search_mode: str = 'exact', coarse_top_p: int = 8,
+                 coarse_threshold: float = None, image_store_dir: str = None,
+                 image_max_edge: int = IMAGE_MAX_EDGE, image_codec: Optional[str] = IMAGE_CODEC,
+                 image_quality: int = IMAGE_QUALITY, gallery_check_interval: float = 1.0):
         """
         初始化数据库管理器
         
         Args:
             db_path: 数据库文件路径
+            max_exemplars_per_person: 每个身份最多保留的样本特征数
+            exemplar_method: 样本选择方法，'kmedoids' 或 'fps'（最远点采样）
+            search_mode: 检索模式，'exact'（全部样本）或 'coarse'（中心特征粗筛+前P个身份精确比对）
+            coarse_top_p: 两级检索时精确比对的候选身份数
+            coarse_threshold: 两级检索时中心特征距离上限（None表示不限制）
+            image_store_dir: 人脸图像外部存储目录；为None时使用数据库所在目录下的 face_images，
+                该目录存在（已执行过迁移）时新图像写入外部存储，否则仍保存在数据库中
+            image_max_edge: 入库图像长边像素上限，0 表示不缩放
+            image_codec: 入库图像编码格式，'jpg' 或 'webp'；None 表示按原样保存
+            image_quality: 入库图像编码质量
+            gallery_check_interval: 检查其他进程是否修改了人脸库的间隔（秒），0 表示每次检索都检查
         """
         self.db_path = db_path
         self.lock = threading.Lock()  # 线程锁，确保数据库操作的线程安全
         
+        # 每个身份的模板管理：最多保留K个差异化样本
+        self.max_exemplars_per_person = max_exemplars_per_person
+        self.exemplar_method = exemplar_method
+        
+        # 内存人脸库，首次检索时从数据库加载，之后随写操作增量更新
+        self.gallery = FaceGallery(search_mode, coarse_top_p, coarse_threshold)
+        self._gallery_loaded = False
+        
+        # 其他进程（人脸库管理、采集工具等）修改人员或特征后自动重新加载内存人脸库：
+        # 每隔 gallery_check_interval 秒在常驻连接上读取 PRAGMA data_version（数据库有其他连接提交时变化），
+        # 变化时再比较触发器维护的 gallery_version 计数与内存人脸库对应的版本
+        self.gallery_check_interval = gallery_check_interval
+        self._gallery_version = None
+        self._data_version = None
+        self._last_gallery_check = 0.0
+        self._watch_conn = None
+        
+        # 人员信息缓存，随内存人脸库加载填充，识别循环中查询人员信息不访问数据库
+        self.person_cache = PersonCache()
+        
         # 确保数据库目录存在
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
         
+        # 人脸图像外部存储：数据库只保存内容哈希
+        if image_store_dir is None:
+            image_store_dir = os.path.join(os.path.dirname(db_path), 'face_images')
+            self.external_images = os.path.isdir(image_store_dir)
+        else:
+            self.external_images = True
+        self.image_store = ImageStore(image_store_dir)
+        
+        # 入库图像统一缩放和编码
+        self.image_max_edge = image_max_edge
+        self.image_codec = image_codec
+        self.image_quality = image_quality
+        
         # 初始化数据库
         self._init_database()
         
         logging.info(f"人脸数据库管理器初始化完成，数据库路径: {db_path}")
     
+    def _connect(self) -> sqlite3.Connection:
+        """
+        打开数据库连接
+
+        开启 recursive_triggers：本类的写入已使用 UPSERT，但外部工具仍可能执行 INSERT OR REPLACE，
+        因唯一约束删除旧行时只有开启该选项才会触发 DELETE 触发器，统计计数才能保持准确
+        """
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('PRAGMA recursive_triggers = ON')
+        return conn
+    
     def _init_database(self):
         """初始化数据库表结构"""
         with self.lock:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
             try:
+                # 新建的数据库使用增量自动清理，删除数据后可由 incremental_vacuum 分批归还空间
+                # （对已有表的数据库不生效，执行一次 vacuum() 后转换）
+                cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+                
                 # 创建人员信息表
                 cursor.execute('''
                     CREATE TABLE IF NOT EXISTS persons (
@@ -71,6 +224,33 @@ class FaceDatabaseManager:
                     )
                 ''')
                 
+                # 图像保存在外部存储时 image_data 为空，image_hash 为内容哈希
+                cursor.execute('PRAGMA table_info(face_images)')
+                if 'image_hash' not in [row[1] for row in cursor.fetchall()]:
+                    cursor.execute('ALTER TABLE face_images ADD COLUMN image_hash TEXT')
+                self._create_image_store_tables(cursor)
+                
+                # 创建人脸缩略图表（随图像写入生成，或显示时按需生成）
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS face_thumbnails (
+                        image_id INTEGER NOT NULL,
+                        size INTEGER NOT NULL,         -- 长边像素
+                        person_id INTEGER NOT NULL,
+                        data BLOB NOT NULL,            -- JPEG
+                        width INTEGER,
+                        height INTEGER,
+                        PRIMARY KEY (image_id, size),
+                        FOREIGN KEY (image_id) REFERENCES face_images (id) ON DELETE CASCADE
+                    )
+                ''')
+                cursor.execute('''
+                    CREATE TRIGGER IF NOT EXISTS trg_face_images_delete_thumbnails
+                    AFTER DELETE ON face_images
+                    BEGIN
+                        DELETE FROM face_thumbnails WHERE image_id = OLD.id;
+                    END
+                ''')
+                
                 # 创建人脸特征表
                 cursor.execute('''
                     CREATE TABLE IF NOT EXISTS face_features (
@@ -82,6 +262,20 @@ class FaceDatabaseManager:
                         FOREIGN KEY (person_id) REFERENCES persons (id) ON DELETE CASCADE
                     )
                 ''')
+                # 外键约束未开启，ON DELETE CASCADE 不会生效：删除人员时由触发器删除其特征
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'trg_persons_delete_features'")
+                if cursor.fetchone() is None:
+                    cursor.execute('''
+                        CREATE TRIGGER trg_persons_delete_features
+                        AFTER DELETE ON persons
+                        BEGIN
+                            DELETE FROM face_features WHERE person_id = OLD.id;
+                        END
+                    ''')
+                    # 清理此前删除人员后遗留的特征
+                    cursor.execute('DELETE FROM face_features WHERE person_id NOT IN (SELECT id FROM persons)')
+                    if cursor.rowcount > 0:
+                        logging.info(f"已清理 {cursor.rowcount} 条无对应人员的特征")
                 
                 # 创建识别记录表
                 cursor.execute('''
@@ -95,12 +289,85 @@ class FaceDatabaseManager:
                     )
                 ''')
                 
+                # 识别记录按人按小时汇总表，由触发器随识别记录增量维护
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'recognition_hourly'")
+                rollup_exists = cursor.fetchone() is not None
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS recognition_hourly (
+                        person_id INTEGER NOT NULL,
+                        hour TIMESTAMP NOT NULL,       -- 整点时间 YYYY-MM-DD HH:00:00 (UTC)
+                        sightings INTEGER NOT NULL DEFAULT 0,
+                        first_seen TIMESTAMP,
+                        last_seen TIMESTAMP,
+                        min_distance REAL,
+                        PRIMARY KEY (person_id, hour)
+                    ) WITHOUT ROWID
+                ''')
+                cursor.execute('''
+                    CREATE TRIGGER IF NOT EXISTS trg_recognition_logs_rollup
+                    AFTER INSERT ON recognition_logs
+                    WHEN NEW.person_id IS NOT NULL
+                    BEGIN
+                        INSERT INTO recognition_hourly (person_id, hour, sightings, first_seen, last_seen, min_distance)
+                        VALUES (NEW.person_id, strftime('%Y-%m-%d %H:00:00', NEW.frame_time), 1,
+                                NEW.frame_time, NEW.frame_time, NEW.distance)
+                        ON CONFLICT (person_id, hour) DO UPDATE SET
+                            sightings = sightings + 1,
+                            first_seen = MIN(first_seen, excluded.first_seen),
+                            last_seen = MAX(last_seen, excluded.last_seen),
+                            min_distance = MIN(COALESCE(min_distance, excluded.min_distance),
+                                               COALESCE(excluded.min_distance, min_distance));
+                    END
+                ''')
+                cursor.execute('''
+                    CREATE TRIGGER IF NOT EXISTS trg_persons_delete_rollup
+                    AFTER DELETE ON persons
+                    BEGIN
+                        DELETE FROM recognition_hourly WHERE person_id = OLD.id;
+                    END
+                ''')
+                if not rollup_exists:
+                    # 首次创建汇总表时从已有识别记录回填
+                    cursor.execute('''
+                        INSERT INTO recognition_hourly (person_id, hour, sightings, first_seen, last_seen, min_distance)
+                        SELECT person_id, strftime('%Y-%m-%d %H:00:00', frame_time), COUNT(*),
+                               MIN(frame_time), MAX(frame_time), MIN(distance)
+                        FROM recognition_logs
+                        WHERE person_id IS NOT NULL
+                        GROUP BY person_id, strftime('%Y-%m-%d %H:00:00', frame_time)
+                    ''')
+                
+                # 统计计数表，由触发器随增删改维护，get_statistics 直接读取
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'db_counters'")
+                counters_exist = cursor.fetchone() is not None
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS db_counters (
+                        name TEXT PRIMARY KEY,
+                        value INTEGER NOT NULL DEFAULT 0
+                    ) WITHOUT ROWID
+                ''')
+                self._create_counter_triggers(cursor)
+                cursor.execute("INSERT OR IGNORE INTO db_counters (name, value) VALUES ('gallery_version', 0)")
+                if not counters_exist:
+                    self._rebuild_counters(cursor)
+                
                 # 创建索引以提高查询性能
                 cursor.execute('CREATE INDEX IF NOT EXISTS idx_persons_name ON persons(name)')
                 cursor.execute('CREATE INDEX IF NOT EXISTS idx_persons_id_card ON persons(id_card)')
-                cursor.execute('CREATE INDEX IF NOT EXISTS idx_persons_is_temp ON persons(is_temp)')
+                # 临时人员过期清理按 (is_temp, created_time) 范围查找，取代原来只有 is_temp 的索引
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_persons_temp_created ON persons(is_temp, created_time)')
+                cursor.execute('DROP INDEX IF EXISTS idx_persons_is_temp')
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_persons_real_name ON persons(real_name)')
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_persons_real_id_card ON persons(real_id_card)')
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_persons_created ON persons(created_time)')
+                dedup_key = self.PERSON_DEDUP_KEY.format('')
+                cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_persons_dedup_key ON persons({dedup_key}, created_time)')
                 cursor.execute('CREATE INDEX IF NOT EXISTS idx_face_features_hash ON face_features(feature_hash)')
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_face_features_person ON face_features(person_id)')
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_face_images_person ON face_images(person_id, created_time)')
                 cursor.execute('CREATE INDEX IF NOT EXISTS idx_recognition_logs_time ON recognition_logs(frame_time)')
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_recognition_logs_person_time ON recognition_logs(person_id, frame_time)')
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_recognition_hourly_hour ON recognition_hourly(hour)')
                 
                 conn.commit()
                 logging.info("数据库表结构初始化完成")
@@ -112,10 +379,176 @@ class FaceDatabaseManager:
             finally:
                 conn.close()
     
+    @staticmethod
+    def _create_image_store_tables(cursor):
+        """创建外部图像引用计数表及维护引用计数的触发器"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS image_store_refs (
+                hash TEXT PRIMARY KEY,
+                refcount INTEGER NOT NULL DEFAULT 0,
+                size INTEGER
+            ) WITHOUT ROWID
+        ''')
+        # 引用计数降为0的文件等待回收
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_image_store_refs_garbage ON image_store_refs(hash) WHERE refcount <= 0')
+        add_ref = '''
+            INSERT INTO image_store_refs (hash, refcount, size) VALUES (NEW.image_hash, 1, NEW.image_size)
+            ON CONFLICT (hash) DO UPDATE SET refcount = refcount + 1;
+        '''
+        release_ref = 'UPDATE image_store_refs SET refcount = refcount - 1 WHERE hash = OLD.image_hash;'
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_face_images_store_insert
+            AFTER INSERT ON face_images WHEN NEW.image_hash IS NOT NULL
+            BEGIN {add_ref} END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_face_images_store_delete
+            AFTER DELETE ON face_images WHEN OLD.image_hash IS NOT NULL
+            BEGIN {release_ref} END
+        ''')
+        # 迁出/迁回时修改 image_hash：释放旧引用、增加新引用
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_face_images_store_update_release
+            AFTER UPDATE OF image_hash ON face_images
+            WHEN OLD.image_hash IS NOT NULL AND OLD.image_hash IS NOT NEW.image_hash
+            BEGIN {release_ref} END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_face_images_store_update_add
+            AFTER UPDATE OF image_hash ON face_images
+            WHEN NEW.image_hash IS NOT NULL AND OLD.image_hash IS NOT NEW.image_hash
+            BEGIN {add_ref} END
+        ''')
+        # 外键约束未开启，删除人员时由触发器删除其图像（进而释放外部图像引用、删除缩略图）
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_persons_delete_images
+            AFTER DELETE ON persons
+            BEGIN
+                DELETE FROM face_images WHERE person_id = OLD.id;
+            END
+        ''')
+    
+    # 人员去重键：优先真实身份证号，其次身份证号（与人脸库管理器的去重规则一致）
+    PERSON_DEDUP_KEY = "COALESCE(NULLIF({0}real_id_card, ''), NULLIF({0}id_card, ''))"
+    
+    # 统计计数项 -> 计算SQL（用于重建）
+    COUNTER_QUERIES = {
+        'total_persons': 'SELECT COUNT(*) FROM persons',
+        'temp_persons': 'SELECT COUNT(*) FROM persons WHERE is_temp = 1',
+        'real_persons': 'SELECT COUNT(*) FROM persons WHERE is_temp = 0',
+        'important_persons': 'SELECT COUNT(*) FROM persons WHERE is_important = 1',
+        'total_images': 'SELECT COUNT(*) FROM face_images',
+        'total_features': 'SELECT COUNT(*) FROM face_features',
+        'total_logs': 'SELECT COUNT(*) FROM recognition_logs',
+    }
+    
+    @staticmethod
+    def _create_counter_triggers(cursor):
+        """创建维护 db_counters 的触发器"""
+        # persons：新增/删除时按 is_temp、is_important 分别计数，修改这两个字段时调整
+        person_delta = '''
+            UPDATE db_counters SET value = value + {sign} * CASE name
+                WHEN 'total_persons' THEN 1
+                WHEN 'temp_persons' THEN ({row}.is_temp = 1)
+                WHEN 'real_persons' THEN ({row}.is_temp = 0)
+                WHEN 'important_persons' THEN ({row}.is_important = 1)
+            END
+            WHERE name IN ('total_persons', 'temp_persons', 'real_persons', 'important_persons');
+        '''
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_counters_persons_insert AFTER INSERT ON persons
+            BEGIN {person_delta.format(sign=1, row='NEW')} END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_counters_persons_delete AFTER DELETE ON persons
+            BEGIN {person_delta.format(sign=-1, row='OLD')} END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_counters_persons_update
+            AFTER UPDATE OF is_temp, is_important ON persons
+            BEGIN
+                {person_delta.format(sign=-1, row='OLD')}
+                {person_delta.format(sign=1, row='NEW')}
+            END
+        ''')
+        # 人员和特征的任何增删改都使人脸库版本加一，其他进程据此判断是否需要重新加载内存人脸库
+        for table in ('persons', 'face_features'):
+            for event in ('INSERT', 'DELETE', 'UPDATE'):
+                cursor.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS trg_gallery_version_{table}_{event.lower()} AFTER {event} ON {table}
+                    BEGIN
+                        UPDATE db_counters SET value = value + 1 WHERE name = 'gallery_version';
+                    END
+                ''')
+        # 其他表只计行数
+        for table, counter in (('face_images', 'total_images'),
+                               ('face_features', 'total_features'),
+                               ('recognition_logs', 'total_logs')):
+            for event, sign in (('INSERT', 1), ('DELETE', -1)):
+                cursor.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS trg_counters_{table}_{event.lower()} AFTER {event} ON {table}
+                    BEGIN
+                        UPDATE db_counters SET value = value + ({sign}) WHERE name = '{counter}';
+                    END
+                ''')
+    
+    @classmethod
+    def _rebuild_counters(cls, cursor):
+        """按实际行数重新计算所有计数项"""
+        for name, query in cls.COUNTER_QUERIES.items():
+            cursor.execute(query)
+            value = cursor.fetchone()[0]
+            cursor.execute('''
+                INSERT INTO db_counters (name, value) VALUES (?, ?)
+                ON CONFLICT (name) DO UPDATE SET value = excluded.value
+            ''', (name, value))
+    
+    def rebuild_statistics(self) -> bool:
+        """重新计算统计计数（计数与实际数据不一致时使用，如外部工具直接修改了数据库）"""
+        with self.lock:
+            conn = self._connect()
+            cursor = conn.cursor()
+            
+            try:
+                self._rebuild_counters(cursor)
+                conn.commit()
+                logging.info("统计计数已重新计算")
+                return True
+                
+            except Exception as e:
+                logging.error(f"重新计算统计计数失败: {str(e)}")
+                conn.rollback()
+                return False
+            finally:
+                conn.close()
+    
+    # 人员写入使用 UPSERT：(name, id_card) 冲突时原地更新，人员ID保持不变，图像和特征不会因删除重建而丢失关联
+    PERSON_UPSERT_SQL = '''
+        INSERT INTO persons (name, id_card, real_name, real_id_card, is_temp, is_important, updated_time)
+        VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT (name, id_card) DO UPDATE SET
+            real_name = excluded.real_name,
+            real_id_card = excluded.real_id_card,
+            is_temp = excluded.is_temp,
+            is_important = excluded.is_important,
+            updated_time = CURRENT_TIMESTAMP
+        RETURNING id
+    '''
+    
+    # 特征按 feature_hash 去重：相同特征改为归属新的人员，特征ID保持不变
+    FEATURE_UPSERT_SQL = '''
+        INSERT INTO face_features (person_id, feature_vector, feature_hash, created_time)
+        VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT (feature_hash) DO UPDATE SET
+            person_id = excluded.person_id,
+            feature_vector = excluded.feature_vector,
+            created_time = excluded.created_time
+    '''
+    
     def add_person(self, name: str, id_card: str = None, is_temp: bool = False, 
                    real_name: str = None, real_id_card: str = None, is_important: bool = False) -> int:
         """
-        添加新人员
+        添加新人员（姓名和身份证号相同的人员已存在时更新其信息，人员ID不变）
         
         Args:
             name: 人员姓名
@@ -129,17 +562,19 @@ class FaceDatabaseManager:
             人员ID
         """
         with self.lock:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
             try:
-                cursor.execute('''
-                    INSERT OR REPLACE INTO persons (name, id_card, real_name, real_id_card, is_temp, is_important, updated_time)
-                    VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-                ''', (name, id_card, real_name, real_id_card, is_temp, is_important))
-                
-                person_id = cursor.lastrowid
+                in_sync = self._begin_gallery_write(conn)
+                person_id = self._upsert_person(cursor, name, id_card, is_temp, real_name, real_id_card, is_important)
+                self._end_gallery_write(conn, in_sync)
                 conn.commit()
+                self._refresh_cached_persons([person_id])
+                
+                # 已在内存人脸库中的人员（更新了已有记录）同步元数据
+                if person_id in self.gallery.templates:
+                    self._sync_person_template(cursor, person_id)
                 
                 logging.info(f"添加人员成功: {name} (ID: {person_id})")
                 return person_id
@@ -151,46 +586,86 @@ class FaceDatabaseManager:
             finally:
                 conn.close()
     
+    def _upsert_person(self, cursor, name: str, id_card: str = None, is_temp: bool = False,
+                       real_name: str = None, real_id_card: str = None, is_important: bool = False) -> int:
+        """写入或更新人员，返回人员ID（调用方需持有锁并负责提交）"""
+        cursor.execute(self.PERSON_UPSERT_SQL,
+                       (name, id_card, real_name, real_id_card, bool(is_temp), bool(is_important)))
+        return cursor.fetchone()[0]
+    
+    def _refresh_cached_persons(self, person_ids):
+        """人员写入提交后使其缓存失效，下次查询时重新读库"""
+        for person_id in person_ids:
+            self.person_cache.discard(person_id)
+        self.person_cache.forget_missing()
+    
+    def _prepare_image(self, image_data, image_format: str = 'jpg') -> Tuple[bytes, str]:
+        """
+        读取并按配置缩放、重新编码图像（不需要持有锁）
+
+        Returns:
+            (图像数据, 格式)
+        """
+        img_bytes = None
+        # 判断传入的是文件路径还是二进制数据
+        if isinstance(image_data, str) and os.path.exists(image_data):
+            # 如果是有效的文件路径，读取文件内容
+            logging.info(f"从文件路径加载图像: {image_data}")
+            with open(image_data, 'rb') as f:
+                img_bytes = f.read()
+        elif isinstance(image_data, (bytes, np.ndarray)):
+            img_bytes = image_data
+        else:
+            raise ValueError("无效的图像数据类型，必须是文件路径(str)、二进制数据(bytes)或图像数组(np.ndarray)")
+        
+        if self.image_codec or isinstance(img_bytes, np.ndarray):
+            normalized = normalize_face_image(img_bytes, self.image_max_edge, self.image_codec or IMAGE_CODEC,
+                                              self.image_quality)
+            if normalized is None:
+                raise IOError("无法获取有效的图像二进制数据")
+            img_bytes, image_format = normalized
+        return img_bytes, image_format
+    
+    def _insert_image(self, cursor, person_id: int, img_bytes: bytes, image_format: str) -> int:
+        """写入已处理的图像及其缩略图，返回图像ID（调用方需持有锁、已开始 BEGIN IMMEDIATE 写事务并负责提交）"""
+        # 外部存储模式下先写文件，数据库只保存哈希（写库失败留下的文件由 collect_image_garbage 清理）。
+        # 相同内容的文件已存在时不重写：持有写事务才能保证其他进程不会在提交前把它当作无引用文件删除
+        image_hash = self.image_store.put(img_bytes) if self.external_images else None
+        cursor.execute('''
+            INSERT INTO face_images (person_id, image_data, image_format, image_size, image_hash, created_time)
+            VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+        ''', (person_id, b'' if image_hash else img_bytes, image_format, len(img_bytes), image_hash))
+        
+        image_id = cursor.lastrowid
+        self._store_thumbnails(cursor, image_id, person_id, img_bytes)
+        return image_id
+    
     def add_face_image(self, person_id: int, image_data: any,
                       image_format: str = 'jpg') -> int:
         """
         添加人脸图像，智能处理传入的数据类型。
 
+        入库前按 image_max_edge 缩放并按 image_codec/image_quality 重新编码（去掉元数据），
+        实际保存的格式以 image_codec 为准。
+
         Args:
             person_id: 人员ID
-            image_data: 图像数据，可以是文件路径(str)或二进制数据(bytes)
-            image_format: 图像格式
+            image_data: 图像数据，可以是文件路径(str)、二进制数据(bytes)或 BGR 图像数组(np.ndarray)
+            image_format: 图像格式（未开启重新编码时使用）
 
         Returns:
             图像ID
         """
+        # 缩放和编码在加锁前完成，不占用数据库锁
+        img_bytes, image_format = self._prepare_image(image_data, image_format)
+        
         with self.lock:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
 
             try:
-                img_bytes = None
-                # 判断传入的是文件路径还是二进制数据
-                if isinstance(image_data, str) and os.path.exists(image_data):
-                    # 如果是有效的文件路径，读取文件内容
-                    logging.info(f"从文件路径加载图像: {image_data}")
-                    with open(image_data, 'rb') as f:
-                        img_bytes = f.read()
-                elif isinstance(image_data, bytes):
-                    # 如果已经是二进制数据，直接使用
-                    img_bytes = image_data
-                else:
-                    raise ValueError("无效的图像数据类型，必须是文件路径(str)或二进制数据(bytes)")
-
-                if img_bytes is None:
-                    raise IOError("无法获取有效的图像二进制数据")
-                
-                cursor.execute('''
-                    INSERT INTO face_images (person_id, image_data, image_format, image_size, created_time)
-                    VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
-                ''', (person_id, img_bytes, image_format, len(img_bytes)))
-
-                image_id = cursor.lastrowid
+                conn.execute('BEGIN IMMEDIATE')
+                image_id = self._insert_image(cursor, person_id, img_bytes, image_format)
                 conn.commit()
 
                 logging.debug(f"添加人脸图像成功: 人员ID {person_id}, 图像ID {image_id}")
@@ -203,6 +678,43 @@ class FaceDatabaseManager:
             finally:
                 conn.close()
     
+    def _insert_feature(self, cursor, person_id: int, feature_list: List[float]) -> Tuple[int, Optional[Tuple], List[int]]:
+        """
+        写入特征并精简样本（调用方需持有锁并负责提交，提交后调用 _sync_feature）
+
+        Returns:
+            (特征ID, 被改为归属本人员的原特征 (ID, 原人员ID) 或None, 被精简掉的特征ID列表)
+        """
+        feature_json = json.dumps(feature_list)
+        
+        # 生成特征哈希值（用于快速查找重复特征）
+        feature_hash = self._hash_feature(feature_list)
+        
+        # 相同哈希的特征原地改为归属本人员，内存人脸库需从原人员移除
+        cursor.execute('SELECT id, person_id FROM face_features WHERE feature_hash = ?', (feature_hash,))
+        replaced = cursor.fetchone()
+        
+        cursor.execute(self.FEATURE_UPSERT_SQL + ' RETURNING id', (person_id, feature_json, feature_hash))
+        feature_id = cursor.fetchone()[0]
+        
+        # 超过样本上限时只保留差异化的K个样本
+        pruned_ids = self._enforce_exemplar_limit(cursor, person_id)
+        return feature_id, replaced, pruned_ids
+    
+    def _sync_feature(self, cursor, person_id: int, feature_id: int, feature_list: List[float],
+                      replaced: Optional[Tuple], pruned_ids: List[int]):
+        """特征写入提交后增量同步内存人脸库（中心特征随之更新，调用方需持有锁）"""
+        if not self._gallery_loaded:
+            return
+        if replaced:
+            self.gallery.remove_feature(replaced[1], replaced[0])
+        if feature_id not in pruned_ids and \
+                not self.gallery.add_feature(person_id, feature_id, feature_list):
+            # 新身份，从数据库读取完整模板
+            self._sync_person_template(cursor, person_id)
+        for pruned_id in pruned_ids:
+            self.gallery.remove_feature(person_id, pruned_id)
+    
     def add_face_feature(self, person_id: int, feature_vector) -> int:
         """
         添加人脸特征向量
@@ -214,43 +726,305 @@ class FaceDatabaseManager:
         Returns:
             特征ID
         """
+        # 将dlib特征向量转换为Python列表
+        feature_list = list(feature_vector)
+        
         with self.lock:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
             try:
-                # 将dlib特征向量转换为Python列表
-                if hasattr(feature_vector, '__iter__') and not isinstance(feature_vector, (list, tuple)):
-                    # 如果是dlib向量类型，转换为Python列表
-                    feature_list = list(feature_vector)
-                else:
-                    # 如果已经是列表或元组，直接使用
-                    feature_list = list(feature_vector)
-                
-                # 将特征向量转换为JSON字符串
-                feature_json = json.dumps(feature_list)
+                in_sync = self._begin_gallery_write(conn)
+                feature_id, replaced, pruned_ids = self._insert_feature(cursor, person_id, feature_list)
+                self._end_gallery_write(conn, in_sync)
+                conn.commit()
                 
-                # 生成特征哈希值（用于快速查找重复特征）
-                feature_hash = self._hash_feature(feature_list)
+                self._sync_feature(cursor, person_id, feature_id, feature_list, replaced, pruned_ids)
                 
-                cursor.execute('''
-                    INSERT OR REPLACE INTO face_features (person_id, feature_vector, feature_hash, created_time)
-                    VALUES (?, ?, ?, CURRENT_TIMESTAMP)
-                ''', (person_id, feature_json, feature_hash))
+                logging.debug(f"添加人脸特征成功: 人员ID {person_id}, 特征ID {feature_id}" +
+                              (f", 精简样本 {len(pruned_ids)} 个" if pruned_ids else ""))
+                return feature_id
                 
-                feature_id = cursor.lastrowid
+            except Exception as e:
+                logging.error(f"添加人脸特征失败: {str(e)}")
+                conn.rollback()
+                raise
+            finally:
+                conn.close()
+    
+    def add_persons_with_faces(self, entries: List[Dict]) -> List[Dict]:
+        """
+        在一个事务中批量写入人员、人脸图像和特征（全部成功或全部回滚）
+
+        Args:
+            entries: 每项为一张人脸，字段：
+                name, id_card, real_name, real_id_card, is_temp, is_important —— 人员信息（同 add_person）
+                image —— 图像（同 add_face_image 的 image_data，可省略）
+                feature —— 128维特征向量（可省略）
+
+        Returns:
+            每项对应 {'person_id', 'image_id', 'feature_id'}（省略的部分为None）
+        """
+        # 图像缩放和编码在加锁前完成
+        images = [self._prepare_image(entry['image']) if entry.get('image') is not None else None
+                  for entry in entries]
+        features = [list(entry['feature']) if entry.get('feature') is not None else None for entry in entries]
+        
+        with self.lock:
+            conn = self._connect()
+            cursor = conn.cursor()
+            
+            try:
+                in_sync = self._begin_gallery_write(conn)
+                results = []
+                feature_writes = []
+                for entry, image, feature_list in zip(entries, images, features):
+                    person_id = self._upsert_person(
+                        cursor, entry['name'], entry.get('id_card'), entry.get('is_temp', False),
+                        entry.get('real_name'), entry.get('real_id_card'), entry.get('is_important', False))
+                    image_id = self._insert_image(cursor, person_id, *image) if image else None
+                    feature_id = None
+                    if feature_list is not None:
+                        feature_id, replaced, pruned_ids = self._insert_feature(cursor, person_id, feature_list)
+                        feature_writes.append((person_id, feature_id, feature_list, replaced, pruned_ids))
+                    results.append({'person_id': person_id, 'image_id': image_id, 'feature_id': feature_id})
+                self._end_gallery_write(conn, in_sync)
                 conn.commit()
+                self._refresh_cached_persons({result['person_id'] for result in results})
                 
-                logging.debug(f"添加人脸特征成功: 人员ID {person_id}, 特征ID {feature_id}")
-                return feature_id
+                # 同一人员的后续写入可能精简掉前面的样本，按人员从数据库读取完整模板同步
+                for person_id in dict.fromkeys(result['person_id'] for result in results):
+                    if person_id in self.gallery.templates or any(write[0] == person_id for write in feature_writes):
+                        self._sync_person_template(cursor, person_id)
+                for person_id, _, _, replaced, _ in feature_writes:
+                    if replaced and replaced[1] != person_id:
+                        self._sync_person_template(cursor, replaced[1])
+                
+                logging.info(f"批量添加人脸成功: {len(results)} 张人脸, "
+                             f"{len({result['person_id'] for result in results})} 个人员")
+                return results
                 
             except Exception as e:
-                logging.error(f"添加人脸特征失败: {str(e)}")
+                logging.error(f"批量添加人脸失败: {str(e)}")
                 conn.rollback()
                 raise
             finally:
                 conn.close()
     
+    def enroll_face(self, person_fields: Dict, image_data=None, feature_vector=None) -> Dict:
+        """
+        录入一张人脸：人员、图像、特征在一个事务中写入，提交后同步内存人脸库；
+        任何一步失败都整体回滚，不会留下没有图像或特征的人员
+
+        Args:
+            person_fields: 人员信息，字段同 add_person（name 必填）
+            image_data: 人脸图像（同 add_face_image），可为None
+            feature_vector: 128维特征向量，可为None
+
+        Returns:
+            {'person_id', 'image_id', 'feature_id'}
+        """
+        return self.add_persons_with_faces([dict(person_fields, image=image_data, feature=feature_vector)])[0]
+    
+    def enroll_faces(self, person_fields: Dict, faces: List[Tuple]) -> List[Dict]:
+        """
+        录入同一人员的多张人脸（如一张图片中选中的多张人脸），在一个事务中写入
+
+        Args:
+            person_fields: 人员信息，字段同 add_person（name 必填）
+            faces: [(图像, 特征向量), ...]，图像或特征可为None
+
+        Returns:
+            每张人脸对应 {'person_id', 'image_id', 'feature_id'}
+        """
+        return self.add_persons_with_faces([dict(person_fields, image=image_data, feature=feature_vector)
+                                            for image_data, feature_vector in faces])
+    
+    def _enforce_exemplar_limit(self, cursor, person_id: int) -> List[int]:
+        """
+        将某人员的特征样本精简到 max_exemplars_per_person 个（调用方需持有锁并负责提交）
+        
+        Returns:
+            被删除的特征ID列表
+        """
+        cursor.execute('SELECT COUNT(*) FROM face_features WHERE person_id = ?', (person_id,))
+        if cursor.fetchone()[0] <= self.max_exemplars_per_person:
+            return []
+        
+        cursor.execute('SELECT id, feature_vector FROM face_features WHERE person_id = ?', (person_id,))
+        rows = cursor.fetchall()
+        feature_ids = [row[0] for row in rows]
+        vectors = [json.loads(row[1]) for row in rows]
+        
+        keep = set(select_exemplars(vectors, self.max_exemplars_per_person, self.exemplar_method))
+        removed_ids = [feature_id for i, feature_id in enumerate(feature_ids) if i not in keep]
+        cursor.executemany('DELETE FROM face_features WHERE id = ?', [(feature_id,) for feature_id in removed_ids])
+        return removed_ids
+    
+    def prune_features_to_exemplars(self) -> int:
+        """
+        将所有人员的特征样本精简到上限以内（用于升级已有数据库）
+        
+        Returns:
+            删除的特征总数
+        """
+        with self.lock:
+            conn = self._connect()
+            cursor = conn.cursor()
+            
+            try:
+                cursor.execute('''
+                    SELECT person_id FROM face_features
+                    GROUP BY person_id HAVING COUNT(*) > ?
+                ''', (self.max_exemplars_per_person,))
+                person_ids = [row[0] for row in cursor.fetchall()]
+                
+                removed = 0
+                for person_id in person_ids:
+                    removed += len(self._enforce_exemplar_limit(cursor, person_id))
+                conn.commit()
+                
+                if removed > 0:
+                    self._gallery_loaded = False
+                    logging.info(f"已精简 {len(person_ids)} 个人员的特征样本，共删除 {removed} 个冗余特征")
+                return removed
+                
+            except Exception as e:
+                logging.error(f"精简特征样本失败: {str(e)}")
+                conn.rollback()
+                return 0
+            finally:
+                conn.close()
+    
+    def _load_gallery(self):
+        """从数据库加载内存人脸库（调用方需持有锁）"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        
+        try:
+            # 先读版本：加载期间有其他写入时版本落后，下次检查会再次加载
+            self._gallery_version = self._read_gallery_version(conn)
+            cursor.execute('''
+                SELECT f.id, f.person_id, f.feature_vector, p.name, p.real_name, p.real_id_card,
+                       p.is_temp, p.is_important
+                FROM face_features f
+                JOIN persons p ON f.person_id = p.id
+            ''')
+            
+            rows = []
+            for row in cursor.fetchall():
+                try:
+                    rows.append((row[0], row[1], json.loads(row[2])) + tuple(row[3:]))
+                except Exception as e:
+                    logging.warning(f"解析特征向量失败 (person_id: {row[1]}): {str(e)}")
+            
+            self.gallery.load(rows)
+            
+            cursor.execute(f'SELECT {", ".join(PERSON_COLUMNS)} FROM persons')
+            self.person_cache.load(PersonCache.person_from_row(row) for row in cursor.fetchall())
+            self._gallery_loaded = True
+            
+        finally:
+            conn.close()
+    
+    def _ensure_gallery(self):
+        """确保内存人脸库已加载，且包含其他进程对人员和特征的修改"""
+        self._check_external_changes()
+        if not self._gallery_loaded:
+            with self.lock:
+                if not self._gallery_loaded:
+                    self._load_gallery()
+    
+    def load_gallery(self):
+        """立即从数据库加载内存人脸库和人员信息缓存（启动时预热，首次识别不再计入加载耗时）"""
+        with self.lock:
+            self._load_gallery()
+    
+    def reload_gallery(self):
+        """丢弃内存人脸库和人员信息缓存，下次使用时从数据库重新读取"""
+        with self.lock:
+            self._invalidate_memory()
+    
+    def _invalidate_memory(self):
+        """内存人脸库标记为需要重新加载，并清空人员信息缓存（调用方需持有锁）"""
+        self._gallery_loaded = False
+        self.person_cache.clear()
+    
+    def _check_external_changes(self):
+        """
+        每隔 gallery_check_interval 秒检查一次其他进程是否修改了人员或特征，有修改时丢弃内存数据
+        
+        识别线程每帧都会调用；锁被回填缩略图、清理临时人员等长操作占用时跳过本次检查，不阻塞识别
+        """
+        if time.time() - self._last_gallery_check < self.gallery_check_interval:
+            return
+        if not self.lock.acquire(blocking=False):
+            return
+        try:
+            self._last_gallery_check = time.time()
+            if self._gallery_changed():
+                logging.info("检测到其他进程修改了人脸库，重新加载内存人脸库和人员信息缓存")
+                self._invalidate_memory()
+        finally:
+            self.lock.release()
+    
+    @staticmethod
+    def _read_gallery_version(conn: sqlite3.Connection) -> int:
+        row = conn.execute("SELECT value FROM db_counters WHERE name = 'gallery_version'").fetchone()
+        return row[0] if row else 0
+    
+    def _gallery_changed(self) -> bool:
+        """其他连接是否修改了人员或特征（调用方需持有锁）"""
+        if self._watch_conn is None:
+            self._watch_conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        data_version = self._watch_conn.execute('PRAGMA data_version').fetchone()[0]
+        if data_version == self._data_version:
+            return False
+        self._data_version = data_version
+        gallery_version = self._read_gallery_version(self._watch_conn)
+        changed = gallery_version != self._gallery_version
+        self._gallery_version = gallery_version
+        return changed
+    
+    def _begin_gallery_write(self, conn: sqlite3.Connection) -> bool:
+        """
+        开始修改人员或特征的写事务（调用方需持有锁）
+
+        立即取得写锁，读取写入前的人脸库版本：与内存数据对应的版本一致说明此前没有其他进程的修改，
+        本次写入后内存人脸库和人员信息缓存增量同步即可
+
+        Returns:
+            写入前内存数据是否与数据库一致，传给 _end_gallery_write
+        """
+        conn.execute('BEGIN IMMEDIATE')
+        return self._read_gallery_version(conn) == self._gallery_version
+    
+    def _end_gallery_write(self, conn: sqlite3.Connection, in_sync: bool):
+        """提交前调用：记录本次写入后的人脸库版本；写入前已不一致时丢弃内存数据（调用方需持有锁）"""
+        if not in_sync:
+            self._invalidate_memory()
+        self._gallery_version = self._read_gallery_version(conn)
+    
+    def _sync_person_template(self, cursor, person_id: int):
+        """从数据库重新读取某人员的模板并更新内存人脸库（调用方需持有锁）"""
+        if not self._gallery_loaded:
+            return
+        
+        cursor.execute('''
+            SELECT name, real_name, real_id_card, is_temp, is_important FROM persons WHERE id = ?
+        ''', (person_id,))
+        person = cursor.fetchone()
+        if not person:
+            self.gallery.remove_person(person_id)
+            return
+        
+        cursor.execute('SELECT id, feature_vector FROM face_features WHERE person_id = ?', (person_id,))
+        rows = cursor.fetchall()
+        
+        template = PersonTemplate(person_id, person[0], person[1], person[2], bool(person[3]), bool(person[4]))
+        template.set_exemplars([row[0] for row in rows], [json.loads(row[1]) for row in rows])
+        self.gallery.set_person(template)
+    
     def _hash_feature(self, feature_vector) -> str:
         """生成特征向量的哈希值"""
         # 确保特征向量是列表格式
@@ -262,40 +1036,42 @@ class FaceDatabaseManager:
             feature_list = list(feature_vector)
         
         # 将特征向量转换为字符串并生成哈希
-        feature_str = ','.join(map(str, feature_list))
+        return self._hash_feature_text(','.join(map(str, feature_list)))
+    
+    @staticmethod
+    def _hash_feature_text(feature_str: str) -> str:
+        """由逗号连接的特征文本生成哈希值"""
         return str(hash(feature_str))
     
     def get_person_by_name_id(self, name: str, id_card: str = None) -> Optional[Dict]:
-        """根据姓名和身份证号获取人员信息"""
+        """根据姓名和身份证号获取人员信息（指定身份证号时优先读取人员信息缓存）"""
+        self._check_external_changes()
+        if id_card:
+            hit, person = self.person_cache.get_by_name_id(name, id_card)
+            if hit:
+                return person
+        
         with self.lock:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
             try:
                 if id_card:
-                    cursor.execute('''
-                        SELECT id, name, id_card, real_name, real_id_card, is_temp, is_important, created_time, updated_time
-                        FROM persons WHERE name = ? AND id_card = ?
+                    cursor.execute(f'''
+                        SELECT {", ".join(PERSON_COLUMNS)} FROM persons WHERE name = ? AND id_card = ?
                     ''', (name, id_card))
                 else:
-                    cursor.execute('''
-                        SELECT id, name, id_card, real_name, real_id_card, is_temp, is_important, created_time, updated_time
-                        FROM persons WHERE name = ?
+                    cursor.execute(f'''
+                        SELECT {", ".join(PERSON_COLUMNS)} FROM persons WHERE name = ?
                     ''', (name,))
                 
                 row = cursor.fetchone()
                 if row:
-                    return {
-                        'id': row[0],
-                        'name': row[1],
-                        'id_card': row[2],
-                        'real_name': row[3],
-                        'real_id_card': row[4],
-                        'is_temp': bool(row[5]),
-                        'is_important': bool(row[6]),
-                        'created_time': row[7],
-                        'updated_time': row[8]
-                    }
+                    person = PersonCache.person_from_row(row)
+                    self.person_cache.put(person)
+                    return person
+                if id_card:
+                    self.person_cache.mark_missing(name=name, id_card=id_card)
                 return None
                 
             finally:
@@ -304,7 +1080,7 @@ class FaceDatabaseManager:
     def get_person_by_name(self, name: str) -> Optional[Dict]:
         """根据姓名获取人员信息（返回第一个匹配的记录）"""
         with self.lock:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
             try:
@@ -332,31 +1108,96 @@ class FaceDatabaseManager:
             finally:
                 conn.close()
     
+    def get_persons_page(self, after: Optional[Tuple[str, int]] = None, limit: int = 200,
+                         search: str = None, dedup: bool = True) -> Tuple[List[Dict], Optional[Tuple[str, int]]]:
+        """
+        按创建时间倒序分页获取人员（键集分页，翻页开销与页码无关）
+
+        Args:
+            after: 上一页返回的游标 (created_time, id)，为空表示第一页
+            limit: 每页条数
+            search: 按姓名、真实姓名、身份证号、真实身份证号前缀搜索
+            dedup: 同一去重键（真实身份证号或身份证号）只保留最新的一条
+
+        Returns:
+            (人员列表, 下一页游标)，没有更多数据时游标为None
+        """
+        conditions = []
+        params = []
+        if after is not None:
+            conditions.append('(p.created_time, p.id) < (?, ?)')
+            params.extend(after)
+        if search:
+            # 前缀范围查询，可分别使用四个字段上的索引
+            upper = search[:-1] + chr(ord(search[-1]) + 1)
+            conditions.append('(' + ' OR '.join(
+                f'(p.{column} >= ? AND p.{column} < ?)'
+                for column in ('name', 'real_name', 'id_card', 'real_id_card')) + ')')
+            params.extend([search, upper] * 4)
+        if dedup:
+            # 同一去重键下存在更新的记录则跳过（使用去重键表达式索引）
+            newer_key, row_key = self.PERSON_DEDUP_KEY.format('q.'), self.PERSON_DEDUP_KEY.format('p.')
+            conditions.append(f'''NOT EXISTS (
+                SELECT 1 FROM persons q
+                WHERE {newer_key} = {row_key}
+                  AND (q.created_time, q.id) > (p.created_time, p.id))''')
+        where = ('WHERE ' + ' AND '.join(conditions)) if conditions else ''
+        
+        with self.lock:
+            conn = self._connect()
+            cursor = conn.cursor()
+            
+            try:
+                cursor.execute(f'''
+                    SELECT p.id, p.name, p.id_card, p.is_temp, p.is_important, p.created_time,
+                           p.real_name, p.real_id_card
+                    FROM persons p
+                    {where}
+                    ORDER BY p.created_time DESC, p.id DESC
+                    LIMIT ?
+                ''', params + [limit])
+                
+                persons = [{
+                    'id': row[0],
+                    'name': row[1],
+                    'id_card': row[2],
+                    'is_temp': bool(row[3]),
+                    'is_important': bool(row[4]),
+                    'created_time': row[5],
+                    'real_name': row[6],
+                    'real_id_card': row[7],
+                } for row in cursor.fetchall()]
+                
+                next_cursor = None
+                if len(persons) == limit:
+                    next_cursor = (persons[-1]['created_time'], persons[-1]['id'])
+                return persons, next_cursor
+                
+            finally:
+                conn.close()
+    
     def get_person_by_id(self, person_id: int) -> Optional[Dict]:
-        """根据ID获取人员信息"""
+        """根据ID获取人员信息（优先读取人员信息缓存）"""
+        self._check_external_changes()
+        hit, person = self.person_cache.get(person_id)
+        if hit:
+            return person
+        
         with self.lock:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
             try:
-                cursor.execute('''
-                    SELECT id, name, id_card, real_name, real_id_card, is_temp, is_important, created_time, updated_time
-                    FROM persons WHERE id = ?
+                cursor.execute(f'''
+                    SELECT {", ".join(PERSON_COLUMNS)} FROM persons WHERE id = ?
                 ''', (person_id,))
                 
                 row = cursor.fetchone()
                 if row:
-                    return {
-                        'id': row[0],
-                        'name': row[1],
-                        'id_card': row[2],
-                        'real_name': row[3],
-                        'real_id_card': row[4],
-                        'is_temp': bool(row[5]),
-                        'is_important': bool(row[6]),
-                        'created_time': row[7],
-                        'updated_time': row[8]
-                    }
+                    person = PersonCache.person_from_row(row)
+                    self.person_cache.put(person)
+                    return person
+                self.person_cache.mark_missing(person_id=person_id)
                 return None
                 
             finally:
@@ -372,7 +1213,7 @@ class FaceDatabaseManager:
             人员信息列表
         """
         with self.lock:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
             try:
@@ -409,33 +1250,152 @@ class FaceDatabaseManager:
     def get_face_image(self, person_id: int, image_id: int = None) -> Optional[bytes]:
         """获取人脸图像数据"""
         with self.lock:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
             try:
                 if image_id:
                     cursor.execute('''
-                        SELECT image_data FROM face_images WHERE person_id = ? AND id = ?
+                        SELECT image_data, image_hash FROM face_images WHERE person_id = ? AND id = ?
                     ''', (person_id, image_id))
                 else:
                     # 获取最新的图像
                     cursor.execute('''
-                        SELECT image_data FROM face_images WHERE person_id = ? 
+                        SELECT image_data, image_hash FROM face_images WHERE person_id = ? 
                         ORDER BY created_time DESC LIMIT 1
                     ''', (person_id,))
                 
                 row = cursor.fetchone()
-                return row[0] if row else None
+                return self._image_bytes(row[0], row[1]) if row else None
                 
             finally:
                 conn.close()
     
+    def _image_bytes(self, image_data: bytes, image_hash: Optional[str]) -> Optional[bytes]:
+        """图像原始数据：保存在外部存储时按哈希读取文件"""
+        if image_hash:
+            return self.image_store.get(image_hash)
+        return image_data
+    
+    @staticmethod
+    def _store_thumbnails(cursor, image_id: int, person_id: int, image_bytes: bytes,
+                          sizes=THUMBNAIL_SIZES) -> Dict[int, bytes]:
+        """生成并写入缩略图，返回 {尺寸: JPEG数据}"""
+        thumbnails = {}
+        for size in sizes:
+            thumbnail = make_thumbnail(image_bytes, size)
+            if thumbnail is None:
+                logging.warning(f"无法生成缩略图: 图像ID {image_id}")
+                break
+            data, width, height = thumbnail
+            cursor.execute('''
+                INSERT INTO face_thumbnails (image_id, size, person_id, data, width, height)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (image_id, size) DO UPDATE SET
+                    person_id = excluded.person_id, data = excluded.data,
+                    width = excluded.width, height = excluded.height
+            ''', (image_id, size, person_id, data, width, height))
+            thumbnails[size] = data
+        return thumbnails
+    
+    def get_face_thumbnail(self, person_id: int, size: int = 200, image_id: int = None) -> Optional[bytes]:
+        """
+        获取人脸缩略图（JPEG），默认为该人员最新的图像；缩略图不存在时从原图生成并保存
+
+        Args:
+            person_id: 人员ID
+            size: 长边像素，通常为 THUMBNAIL_SIZES 中的尺寸
+            image_id: 指定图像ID
+        """
+        with self.lock:
+            conn = self._connect()
+            cursor = conn.cursor()
+            
+            try:
+                if image_id is None:
+                    # 只读索引，不读取原图数据
+                    cursor.execute('''
+                        SELECT id FROM face_images WHERE person_id = ?
+                        ORDER BY created_time DESC LIMIT 1
+                    ''', (person_id,))
+                    row = cursor.fetchone()
+                    if not row:
+                        return None
+                    image_id = row[0]
+                
+                cursor.execute('SELECT data FROM face_thumbnails WHERE image_id = ? AND size = ?', (image_id, size))
+                row = cursor.fetchone()
+                if row:
+                    return row[0]
+                
+                # 旧数据没有缩略图，按需生成
+                cursor.execute('SELECT person_id, image_data, image_hash FROM face_images WHERE id = ?', (image_id,))
+                row = cursor.fetchone()
+                image_bytes = self._image_bytes(row[1], row[2]) if row else None
+                if not image_bytes:
+                    return None
+                thumbnails = self._store_thumbnails(cursor, image_id, row[0], image_bytes, sizes=(size,))
+                conn.commit()
+                return thumbnails.get(size)
+                
+            except Exception as e:
+                logging.error(f"获取人脸缩略图失败: {str(e)}")
+                conn.rollback()
+                return None
+            finally:
+                conn.close()
+    
+    def backfill_thumbnails(self, batch_size: int = 200) -> int:
+        """
+        为没有缩略图的图像批量生成缩略图（适合在后台线程中运行，每批单独提交并释放锁）
+
+        Returns:
+            处理的图像数
+        """
+        total = 0
+        last_id = 0
+        while True:
+            with self.lock:
+                conn = self._connect()
+                cursor = conn.cursor()
+                
+                try:
+                    cursor.execute(f'''
+                        SELECT id, person_id, image_data, image_hash FROM face_images i
+                        WHERE id > ? AND (
+                            SELECT COUNT(*) FROM face_thumbnails t WHERE t.image_id = i.id
+                        ) < {len(THUMBNAIL_SIZES)}
+                        ORDER BY id LIMIT ?
+                    ''', (last_id, batch_size))
+                    rows = cursor.fetchall()
+                    for image_id, person_id, image_data, image_hash in rows:
+                        image_bytes = self._image_bytes(image_data, image_hash)
+                        if image_bytes:
+                            self._store_thumbnails(cursor, image_id, person_id, image_bytes)
+                    conn.commit()
+                    
+                except Exception as e:
+                    logging.error(f"批量生成缩略图失败: {str(e)}")
+                    conn.rollback()
+                    return total
+                finally:
+                    conn.close()
+            
+            if not rows:
+                break
+            total += len(rows)
+            last_id = rows[-1][0]
+        
+        if total:
+            logging.info(f"已为 {total} 张人脸图像生成缩略图")
+        return total
+    
     def get_face_features(self, person_id: int = None) -> List[Tuple[int, List[float], str, str]]:
         """获取人脸特征数据
         返回格式: (person_id, feature_vector, person_name, real_name)
         """
         with self.lock:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
             try:
@@ -482,46 +1442,9 @@ class FaceDatabaseManager:
         Returns:
             匹配结果 (person_id, distance, person_name, real_name, is_important) 或 None
         """
-        with self.lock:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            try:
-                # 将dlib特征向量转换为Python列表
-                if hasattr(feature_vector, '__iter__') and not isinstance(feature_vector, (list, tuple)):
-                    # 如果是dlib向量类型，转换为Python列表
-                    feature_list = list(feature_vector)
-                else:
-                    # 如果已经是列表或元组，直接使用
-                    feature_list = list(feature_vector)
-                
-                # 获取所有非临时身份的特征，包括real_name和is_important
-                cursor.execute('''
-                    SELECT f.person_id, f.feature_vector, p.name, p.real_name, p.is_important
-                    FROM face_features f
-                    JOIN persons p ON f.person_id = p.id
-                    WHERE p.is_temp = 0
-                ''')
-                
-                min_distance = float('inf')
-                best_match = None
-                
-                for row in cursor.fetchall():
-                    stored_feature = json.loads(row[1])
-                    distance = self._calculate_distance(feature_list, stored_feature)
-                    
-                    if distance < min_distance:
-                        min_distance = distance
-                        best_match = (row[0], distance, row[2], row[3], bool(row[4]))  # person_id, distance, name, real_name, is_important
-                
-                # 检查是否满足阈值
-                if best_match and best_match[1] < threshold:
-                    return best_match
-                
-                return None
-                
-            finally:
-                conn.close()
+        # 使用内存人脸库检索，只匹配非临时身份
+        self._ensure_gallery()
+        return self.gallery.search(list(feature_vector), threshold, include_temp=False)
     
     def _calculate_distance(self, feature1, feature2) -> float:
         """计算两个特征向量之间的欧氏距离"""
@@ -552,10 +1475,11 @@ class FaceDatabaseManager:
             是否更新成功
         """
         with self.lock:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
             try:
+                in_sync = self._begin_gallery_write(conn)
                 if is_temp is not None:
                     # 同时更新身份类型
                     cursor.execute('''
@@ -571,10 +1495,16 @@ class FaceDatabaseManager:
                         WHERE id = ?
                     ''', (real_name, real_id_card, person_id))
                 
+                self._end_gallery_write(conn, in_sync)
                 conn.commit()
                 success = cursor.rowcount > 0
                 
                 if success:
+                    self.gallery.update_person(person_id, real_name=real_name, real_id_card=real_id_card,
+                                               is_temp=is_temp)
+                    self.person_cache.update(person_id, real_name=real_name, real_id_card=real_id_card,
+                                             is_temp=None if is_temp is None else bool(is_temp),
+                                             updated_time=self._to_db_time(time.time()))
                     status = "临时身份" if is_temp else "真实身份" if is_temp is not None else "身份信息"
                     logging.info(f"更新人员{status}成功: ID {person_id} -> {real_name} - {real_id_card}")
                 else:
@@ -601,20 +1531,25 @@ class FaceDatabaseManager:
             是否设置成功
         """
         with self.lock:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
             try:
+                in_sync = self._begin_gallery_write(conn)
                 cursor.execute('''
                     UPDATE persons 
                     SET is_important = ?, updated_time = CURRENT_TIMESTAMP
                     WHERE id = ?
                 ''', (is_important, person_id))
                 
+                self._end_gallery_write(conn, in_sync)
                 conn.commit()
                 success = cursor.rowcount > 0
                 
                 if success:
+                    self.gallery.update_person(person_id, is_important=bool(is_important))
+                    self.person_cache.update(person_id, is_important=bool(is_important),
+                                             updated_time=self._to_db_time(time.time()))
                     status = "重点关注" if is_important else "普通人员"
                     logging.info(f"设置人员重点关注状态成功: ID {person_id} -> {status}")
                 else:
@@ -637,7 +1572,7 @@ class FaceDatabaseManager:
             重点关注人员列表
         """
         with self.lock:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
             try:
@@ -671,159 +1606,599 @@ class FaceDatabaseManager:
             finally:
                 conn.close()
     
-    def delete_temp_persons(self, max_age_hours: int = 24) -> int:
-        """删除过期的临时人员数据"""
+    def delete_temp_persons(self, max_age_hours: int = 24, chunk_size: int = 1000) -> int:
+        """删除过期的临时人员数据（见 purge_temp_persons）"""
+        return self.purge_temp_persons(max_age_hours, chunk_size)
+    
+    def purge_temp_persons(self, max_age_hours: Optional[float] = None, chunk_size: int = 1000,
+                           on_purged: Optional[Callable[[List[int]], None]] = None) -> int:
+        """
+        批量删除临时人员及其特征、图像（缩略图、外部图像引用由触发器处理）
+
+        每批最多 chunk_size 人，在一个事务中按集合删除，提交后在同一次加锁内从内存人脸库移除，
+        再调用 on_purged；批与批之间释放锁，不会长时间阻塞识别线程写库。
+
+        Args:
+            max_age_hours: 只删除创建时间早于该小时数的临时人员，None 表示全部临时人员
+            chunk_size: 每批删除的人数
+            on_purged: 每批删除后的回调，参数为本批删除的人员ID列表（调用方据此清理自己的内存数据）
+
+        Returns:
+            删除的人数
+        """
+        if max_age_hours is None:
+            condition, params = 'is_temp = 1', ()
+        else:
+            condition = 'is_temp = 1 AND created_time < ?'
+            params = (self._to_db_time(time.time() - max_age_hours * 3600),)
+        
+        deleted_count = 0
+        start = time.time()
+        while True:
+            with self.lock:
+                conn = self._connect()
+                cursor = conn.cursor()
+                
+                try:
+                    in_sync = self._begin_gallery_write(conn)
+                    cursor.execute('CREATE TEMP TABLE IF NOT EXISTS purge_ids (id INTEGER PRIMARY KEY)')
+                    cursor.execute(f'INSERT INTO purge_ids (id) SELECT id FROM persons WHERE {condition} LIMIT ?',
+                                   params + (chunk_size,))
+                    cursor.execute('SELECT id FROM purge_ids')
+                    person_ids = [row[0] for row in cursor.fetchall()]
+                    if not person_ids:
+                        conn.rollback()
+                        break
+                    
+                    cursor.execute('DELETE FROM face_features WHERE person_id IN (SELECT id FROM purge_ids)')
+                    cursor.execute('DELETE FROM face_images WHERE person_id IN (SELECT id FROM purge_ids)')
+                    cursor.execute('DELETE FROM persons WHERE id IN (SELECT id FROM purge_ids)')
+                    self._end_gallery_write(conn, in_sync)
+                    conn.commit()
+                    
+                    self.gallery.remove_persons(person_ids)
+                    self.person_cache.remove(person_ids)
+                    self._collect_image_garbage(conn)
+                    if on_purged:
+                        on_purged(person_ids)
+                    
+                except Exception as e:
+                    logging.error(f"删除临时人员失败: {str(e)}")
+                    conn.rollback()
+                    break
+                finally:
+                    conn.close()
+            
+            deleted_count += len(person_ids)
+            if len(person_ids) < chunk_size:
+                break
+        
+        if deleted_count > 0:
+            logging.info(f"已删除 {deleted_count} 个{'过期的' if max_age_hours is not None else ''}临时人员，"
+                         f"耗时 {time.time() - start:.2f}秒")
+        return deleted_count
+    
+    def prune_recognition_logs(self, retention_days: int = 90, chunk_size: int = 5000) -> int:
+        """
+        分批删除早于保留期的识别记录（按小时汇总表不受影响）
+
+        Returns:
+            删除的记录数
+        """
+        cutoff = self._to_db_time(time.time() - retention_days * 86400)
+        deleted_count = 0
+        while True:
+            with self.lock:
+                conn = self._connect()
+                cursor = conn.cursor()
+                
+                try:
+                    cursor.execute('''
+                        DELETE FROM recognition_logs WHERE id IN (
+                            SELECT id FROM recognition_logs WHERE frame_time < ? LIMIT ?
+                        )
+                    ''', (cutoff, chunk_size))
+                    deleted = cursor.rowcount
+                    conn.commit()
+                    
+                except Exception as e:
+                    logging.error(f"清理识别记录失败: {str(e)}")
+                    conn.rollback()
+                    return deleted_count
+                finally:
+                    conn.close()
+            
+            deleted_count += deleted
+            if deleted < chunk_size:
+                break
+        
+        if deleted_count > 0:
+            logging.info(f"已删除 {deleted_count} 条超过 {retention_days} 天的识别记录")
+        return deleted_count
+    
+    @staticmethod
+    def _to_db_time(value) -> Optional[str]:
+        """
+        转换为数据库时间字符串（UTC，与 CURRENT_TIMESTAMP 格式一致）
+
+        Args:
+            value: None、Unix时间戳、datetime（无时区时按本地时间处理）或已格式化的字符串
+        """
+        if value is None or isinstance(value, str):
+            return value
+        if isinstance(value, (int, float)):
+            value = datetime.fromtimestamp(value, timezone.utc)
+        elif value.tzinfo is None:
+            value = value.astimezone()
+        return value.astimezone(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+    
+    @classmethod
+    def _today_range(cls) -> Tuple[str, str]:
+        """本地时间今天的起止时间（数据库时间格式）"""
+        start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        return cls._to_db_time(start), cls._to_db_time(start + timedelta(days=1))
+    
+    def add_recognition_log(self, person_id: int = None, confidence: float = None, 
+                           distance: float = None, frame_time=None) -> int:
+        """添加识别记录（frame_time 为空时使用当前时间）"""
         with self.lock:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
             try:
-                # 删除超过指定时间的临时人员
                 cursor.execute('''
-                    DELETE FROM persons 
-                    WHERE is_temp = 1 AND 
-                          created_time < datetime('now', '-{} hours')
-                '''.format(max_age_hours))
+                    INSERT INTO recognition_logs (person_id, confidence, distance, frame_time)
+                    VALUES (?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+                ''', (person_id, confidence, distance, self._to_db_time(frame_time)))
                 
-                deleted_count = cursor.rowcount
+                log_id = cursor.lastrowid
                 conn.commit()
-                
-                if deleted_count > 0:
-                    logging.info(f"已删除 {deleted_count} 个过期的临时人员")
-                
-                return deleted_count
+                return log_id
                 
             except Exception as e:
-                logging.error(f"删除临时人员失败: {str(e)}")
+                logging.error(f"添加识别记录失败: {str(e)}")
                 conn.rollback()
                 return 0
             finally:
                 conn.close()
     
-    def add_recognition_log(self, person_id: int = None, confidence: float = None, 
-                           distance: float = None) -> int:
-        """添加识别记录"""
+    def add_recognition_logs(self, entries: List[Tuple]) -> int:
+        """
+        批量添加识别记录
+
+        Args:
+            entries: [(person_id, confidence, distance, frame_time), ...]
+
+        Returns:
+            写入的记录数
+        """
+        if not entries:
+            return 0
+        rows = [(person_id, confidence, distance, self._to_db_time(frame_time))
+                for person_id, confidence, distance, frame_time in entries]
         with self.lock:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
             try:
-                cursor.execute('''
+                cursor.executemany('''
                     INSERT INTO recognition_logs (person_id, confidence, distance, frame_time)
-                    VALUES (?, ?, ?, CURRENT_TIMESTAMP)
-                ''', (person_id, confidence, distance))
-                
-                log_id = cursor.lastrowid
+                    VALUES (?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+                ''', rows)
                 conn.commit()
-                return log_id
+                return len(rows)
                 
             except Exception as e:
-                logging.error(f"添加识别记录失败: {str(e)}")
+                logging.error(f"批量添加识别记录失败: {str(e)}")
                 conn.rollback()
                 return 0
             finally:
                 conn.close()
     
-    def get_statistics(self) -> Dict:
-        """获取数据库统计信息"""
+    def get_sightings(self, person_id: int, start=None, end=None, limit: int = 1000) -> List[Dict]:
+        """
+        查询某人在时间范围内的识别记录（使用 (person_id, frame_time) 复合索引）
+
+        Args:
+            person_id: 人员ID
+            start, end: 时间范围，参见 _to_db_time，为空表示不限制
+            limit: 最多返回的记录数（按时间倒序）
+        """
         with self.lock:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
             try:
-                stats = {}
-                
-                # 总人员数
-                cursor.execute('SELECT COUNT(*) FROM persons')
-                stats['total_persons'] = cursor.fetchone()[0]
-                
-                # 临时人员数
-                cursor.execute('SELECT COUNT(*) FROM persons WHERE is_temp = 1')
-                stats['temp_persons'] = cursor.fetchone()[0]
-                
-                # 真实身份人员数
-                cursor.execute('SELECT COUNT(*) FROM persons WHERE is_temp = 0')
-                stats['real_persons'] = cursor.fetchone()[0]
+                cursor.execute('''
+                    SELECT id, confidence, distance, frame_time
+                    FROM recognition_logs
+                    WHERE person_id = ?
+                      AND frame_time >= COALESCE(?, '')
+                      AND frame_time < COALESCE(?, '9999-12-31 23:59:59')
+                    ORDER BY frame_time DESC
+                    LIMIT ?
+                ''', (person_id, self._to_db_time(start), self._to_db_time(end), limit))
+                
+                return [{'id': row[0], 'confidence': row[1], 'distance': row[2], 'frame_time': row[3]}
+                        for row in cursor.fetchall()]
                 
-                # 总图像数
-                cursor.execute('SELECT COUNT(*) FROM face_images')
-                stats['total_images'] = cursor.fetchone()[0]
+            finally:
+                conn.close()
+    
+    def get_hourly_sightings(self, person_id: int, start=None, end=None) -> List[Tuple[str, int]]:
+        """按小时汇总某人的识别次数 [(整点时间, 次数), ...]，读取汇总表"""
+        with self.lock:
+            conn = self._connect()
+            cursor = conn.cursor()
+            
+            try:
+                cursor.execute('''
+                    SELECT hour, sightings FROM recognition_hourly
+                    WHERE person_id = ?
+                      AND hour >= COALESCE(strftime('%Y-%m-%d %H:00:00', ?), '')
+                      AND hour < COALESCE(?, '9999-12-31 23:59:59')
+                    ORDER BY hour
+                ''', (person_id, self._to_db_time(start), self._to_db_time(end)))
+                return cursor.fetchall()
                 
-                # 总特征数
-                cursor.execute('SELECT COUNT(*) FROM face_features')
-                stats['total_features'] = cursor.fetchone()[0]
+            finally:
+                conn.close()
+    
+    def get_top_persons(self, limit: int = 10, start=None, end=None) -> List[Dict]:
+        """
+        查询时间范围内识别次数最多的人员（读取按小时汇总表，按整点计入）
+
+        Args:
+            limit: 返回人数
+            start, end: 时间范围，都为空时为本地时间的今天
+        """
+        if start is None and end is None:
+            start, end = self._today_range()
+        with self.lock:
+            conn = self._connect()
+            cursor = conn.cursor()
+            
+            try:
+                cursor.execute('''
+                    SELECT h.person_id, p.name, p.id_card, p.real_name, p.is_important,
+                           SUM(h.sightings) AS total, MIN(h.first_seen), MAX(h.last_seen)
+                    FROM recognition_hourly h
+                    JOIN persons p ON p.id = h.person_id
+                    WHERE h.hour >= COALESCE(strftime('%Y-%m-%d %H:00:00', ?), '')
+                      AND h.hour < COALESCE(?, '9999-12-31 23:59:59')
+                    GROUP BY h.person_id
+                    ORDER BY total DESC
+                    LIMIT ?
+                ''', (self._to_db_time(start), self._to_db_time(end), limit))
+                
+                return [{
+                    'person_id': row[0],
+                    'name': row[1],
+                    'id_card': row[2],
+                    'real_name': row[3],
+                    'is_important': bool(row[4]),
+                    'sightings': row[5],
+                    'first_seen': row[6],
+                    'last_seen': row[7],
+                } for row in cursor.fetchall()]
                 
-                # 识别记录数
-                cursor.execute('SELECT COUNT(*) FROM recognition_logs')
-                stats['total_logs'] = cursor.fetchone()[0]
+            finally:
+                conn.close()
+    
+    def get_first_last_seen(self, person_id: int) -> Optional[Tuple[str, str, int]]:
+        """查询某人首次、最后一次被识别的时间和总识别次数，没有记录时返回None"""
+        with self.lock:
+            conn = self._connect()
+            cursor = conn.cursor()
+            
+            try:
+                cursor.execute('''
+                    SELECT MIN(first_seen), MAX(last_seen), SUM(sightings)
+                    FROM recognition_hourly WHERE person_id = ?
+                ''', (person_id,))
+                row = cursor.fetchone()
+                return tuple(row) if row and row[0] is not None else None
                 
-                return stats
+            finally:
+                conn.close()
+    
+    def get_statistics(self) -> Dict:
+        """
+        获取数据库统计信息（读取触发器维护的计数表，不扫描数据表）
+
+        Returns:
+            {'total_persons', 'temp_persons', 'real_persons', 'important_persons',
+             'total_images', 'total_features', 'total_logs'}
+        """
+        with self.lock:
+            conn = self._connect()
+            cursor = conn.cursor()
+            
+            try:
+                cursor.execute('SELECT name, value FROM db_counters')
+                counters = dict(cursor.fetchall())
+                return {name: counters.get(name, 0) for name in self.COUNTER_QUERIES}
                 
             finally:
                 conn.close()
     
-    def export_to_csv(self, csv_path: str = "data/features_all.csv") -> bool:
-        """导出特征数据到CSV文件（兼容旧格式）"""
+    def export_to_csv(self, csv_path: str = "data/features_all.csv", progress=None,
+                      chunk_size: int = 5000) -> bool:
+        """
+        导出特征数据到CSV文件（兼容旧格式：姓名, 特征1, ..., 特征128）
+
+        逐行读取数据库游标并直接写出JSON中的数值文本，不在内存中保存全部特征、不解析JSON；
+        先写入临时文件，完成后替换目标文件。
+
+        Args:
+            csv_path: 输出路径
+            progress: 进度回调 progress(已导出行数, 完成比例0~1)，每 chunk_size 行调用一次
+            chunk_size: 进度回调间隔行数
+        """
+        if csv_path.lower().endswith(FILE_EXTENSION):
+            return self.export_gallery(csv_path, progress=progress)
+        
+        tmp_path = csv_path + '.tmp'
         try:
-            features = self.get_face_features()
-            
             # 确保目录存在
-            os.makedirs(os.path.dirname(csv_path), exist_ok=True)
+            os.makedirs(os.path.dirname(csv_path) or '.', exist_ok=True)
+            total = max(1, self.get_statistics()['total_features'])
             
-            with open(csv_path, 'w', newline='', encoding='utf-8') as csvfile:
-                import csv
-                writer = csv.writer(csvfile)
-                
-                for person_id, feature_vector, person_name, real_name in features:
-                    # 写入格式：姓名, 特征1, 特征2, ..., 特征128
-                    row = [person_name] + feature_vector
-                    writer.writerow(row)
+            # 只读查询不持有 self.lock，SQLite保证单条查询读取一致的快照
+            conn = self._connect()
+            try:
+                cursor = conn.execute('''
+                    SELECT p.name, ff.feature_vector
+                    FROM face_features ff
+                    JOIN persons p ON ff.person_id = p.id
+                    ORDER BY ff.id
+                ''')
+                count = 0
+                with open(tmp_path, 'w', newline='', encoding='utf-8') as csvfile:
+                    while True:
+                        rows = cursor.fetchmany(chunk_size)
+                        if not rows:
+                            break
+                        # feature_vector 为 json.dumps 的结果 "[a, b, ...]"，数值文本与 repr(float) 一致，
+                        # 直接拼接成与 csv.writer 相同的行，只有姓名需要按CSV规则转义
+                        csvfile.writelines(
+                            f"{self._csv_field(name)},{vector[1:-1].replace(', ', ',')}\r\n" for name, vector in rows)
+                        count += len(rows)
+                        if progress:
+                            progress(count, min(1.0, count / total))
+            finally:
+                conn.close()
             
-            logging.info(f"特征数据已导出到: {csv_path}")
+            os.replace(tmp_path, csv_path)
+            logging.info(f"特征数据已导出到: {csv_path}，共 {count} 条")
             return True
             
         except Exception as e:
             logging.error(f"导出CSV失败: {str(e)}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
             return False
     
-    def import_from_csv(self, csv_path: str = "data/features_all.csv") -> bool:
-        """从CSV文件导入特征数据"""
+    @staticmethod
+    def _csv_field(value: str) -> str:
+        """按 csv.writer 默认规则（QUOTE_MINIMAL）转义单个字段"""
+        if any(ch in value for ch in ',"\r\n'):
+            return '"' + value.replace('"', '""') + '"'
+        return value
+    
+    def import_from_csv(self, csv_path: str = "data/features_all.csv", progress=None,
+                        chunk_size: int = 5000) -> bool:
+        """
+        从CSV文件导入特征数据（姓名, 特征1, ..., 特征128）
+
+        分块读取CSV，每块在一个事务内用 executemany 写入；同一姓名的多行归入同一人员
+        （已有的同名非临时、无身份证号人员会被复用），导入后每人的样本数按上限精简。
+
+        Args:
+            csv_path: CSV文件路径
+            progress: 进度回调 progress(已导入行数, 完成比例0~1)，每块调用一次
+            chunk_size: 每个事务处理的行数
+        """
+        import csv
+        if csv_path.lower().endswith(FILE_EXTENSION):
+            return self.import_gallery(csv_path, progress=progress, chunk_size=chunk_size)
         try:
             if not os.path.exists(csv_path):
                 logging.warning(f"CSV文件不存在: {csv_path}")
                 return False
             
-            import csv
+            file_size = max(1, os.path.getsize(csv_path))
+            person_ids = {}  # 人员信息 -> 人员ID
+            imported = 0
             with open(csv_path, 'r', newline='', encoding='utf-8') as csvfile:
                 reader = csv.reader(csvfile)
-                
-                for row in reader:
-                    if len(row) >= 129:  # 姓名 + 128维特征
-                        name = row[0]
-                        feature_vector = [float(x) for x in row[1:129]]
-                        
-                        # 添加人员
-                        person_id = self.add_person(name, is_temp=False)
-                        
-                        # 添加特征
-                        self.add_face_feature(person_id, feature_vector)
-            
-            logging.info(f"从CSV文件导入特征数据成功: {csv_path}")
+                while True:
+                    chunk = []
+                    for row in reader:
+                        if len(row) >= 129:  # 姓名 + 128维特征
+                            chunk.append(((row[0], None, None, None, False, False), [float(x) for x in row[1:129]]))
+                            if len(chunk) >= chunk_size:
+                                break
+                    if not chunk:
+                        break
+                    
+                    self._import_feature_chunk(chunk, person_ids)
+                    imported += len(chunk)
+                    if progress:
+                        # 文本读取按块缓冲，底层文件位置可作为近似进度
+                        progress(imported, min(1.0, csvfile.buffer.tell() / file_size))
+                    logging.debug(f"已导入 {imported} 条特征")
+            
+            self._gallery_loaded = False
+            self.person_cache.clear()
+            logging.info(f"从CSV文件导入特征数据成功: {csv_path}，共 {imported} 条特征、{len(person_ids)} 个人员")
             return True
             
         except Exception as e:
             logging.error(f"从CSV导入失败: {str(e)}")
             return False
     
+    def export_gallery(self, path: str = "data/features_all.fgal", codec: str = 'auto', progress=None) -> bool:
+        """
+        导出人脸库为二进制文件（float64特征矩阵 + 人员信息，可选压缩，带校验），见 gallery_archive；
+        特征保持数据库中的精度，导回同一数据库时特征哈希相同，不会重复
+
+        Args:
+            path: 输出路径
+            codec: 'auto'（有 zstandard 时用 zstd，否则 deflate）、'zstd'、'deflate' 或 'none'
+            progress: 进度回调 progress(已读取特征数, 完成比例0~1)
+        """
+        tmp_path = path + '.tmp'
+        try:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            total = self.get_statistics()['total_features']
+            
+            # 只读查询不持有 self.lock
+            conn = sqlite3.connect(self.db_path)
+            try:
+                persons = []
+                person_positions = {}
+                for row in conn.execute('''
+                    SELECT id, name, id_card, real_name, real_id_card, is_temp, is_important
+                    FROM persons WHERE id IN (SELECT DISTINCT person_id FROM face_features)
+                    ORDER BY id
+                '''):
+                    person_positions[row[0]] = len(persons)
+                    persons.append(dict(zip(PERSON_FIELDS, row[1:5] + (bool(row[5]), bool(row[6])))))
+                
+                feature_chunks = []
+                index_chunks = []
+                count = 0
+                cursor = conn.execute('''
+                    SELECT person_id, feature_vector FROM face_features ORDER BY person_id, id
+                ''')
+                while True:
+                    batch = cursor.fetchmany(5000)
+                    if not batch:
+                        break
+                    # 跳过没有对应人员的孤立特征
+                    rows = [row for row in batch if row[0] in person_positions]
+                    if rows:
+                        feature_chunks.append(np.array([vector[1:-1].split(', ') for _, vector in rows],
+                                                       dtype=np.float64))
+                        index_chunks.append(np.array([person_positions[person_id] for person_id, _ in rows],
+                                                     dtype=np.int32))
+                        count += len(rows)
+                    if progress:
+                        progress(count, min(1.0, count / max(1, total)))
+            finally:
+                conn.close()
+            
+            features = np.concatenate(feature_chunks) if feature_chunks else np.zeros((0, 128), dtype=np.float64)
+            person_index = np.concatenate(index_chunks) if index_chunks else np.zeros(0, dtype=np.int32)
+            header = write_gallery_archive(tmp_path, features, person_index, persons, codec=codec)
+            os.replace(tmp_path, path)
+            logging.info(f"人脸库已导出到: {path}，{header['count']} 条特征、{header['persons']} 个人员")
+            return True
+            
+        except Exception as e:
+            logging.error(f"导出人脸库失败: {str(e)}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False
+    
+    def import_gallery(self, path: str = "data/features_all.fgal", progress=None, chunk_size: int = 5000) -> bool:
+        """
+        从二进制人脸库文件导入（先校验再写入），人员按 (姓名, 身份证号, 是否临时) 复用已有记录
+
+        Args:
+            path: .fgal 文件路径
+            progress: 进度回调 progress(已导入特征数, 完成比例0~1)
+            chunk_size: 每个事务处理的特征数
+        """
+        try:
+            if not os.path.exists(path):
+                logging.warning(f"人脸库文件不存在: {path}")
+                return False
+            archive = read_gallery_archive(path)
+            
+            person_keys = [tuple(person.get(field) for field in PERSON_FIELDS) for person in archive.persons]
+            person_ids = {}
+            total = len(archive)
+            for start in range(0, total, chunk_size):
+                vectors = archive.features[start:start + chunk_size].tolist()
+                indexes = archive.person_index[start:start + chunk_size].tolist()
+                self._import_feature_chunk([(person_keys[i], vector) for i, vector in zip(indexes, vectors)],
+                                           person_ids)
+                done = min(total, start + chunk_size)
+                if progress:
+                    progress(done, done / total)
+            
+            self._gallery_loaded = False
+            self.person_cache.clear()
+            logging.info(f"从人脸库文件导入成功: {path}，共 {total} 条特征、{len(person_ids)} 个人员")
+            return True
+            
+        except Exception as e:
+            logging.error(f"导入人脸库失败: {str(e)}")
+            return False
+    
+    def _import_feature_chunk(self, chunk: List[Tuple[Tuple, List[float]]], person_ids: Dict[Tuple, int]):
+        """
+        在一个事务内写入一块导入数据
+
+        Args:
+            chunk: [((name, id_card, real_name, real_id_card, is_temp, is_important), 特征), ...]
+            person_ids: 人员信息 -> 人员ID，在各块之间共享；按 (姓名, 身份证号, 是否临时) 复用已有人员
+        """
+        with self.lock:
+            conn = self._connect()
+            cursor = conn.cursor()
+            
+            try:
+                for person in dict.fromkeys(person for person, _ in chunk):
+                    if person in person_ids:
+                        continue
+                    name, id_card, real_name, real_id_card, is_temp, is_important = person
+                    cursor.execute('''
+                        SELECT id FROM persons WHERE name = ? AND id_card IS ? AND is_temp = ?
+                        ORDER BY id DESC LIMIT 1
+                    ''', (name, id_card, bool(is_temp)))
+                    row = cursor.fetchone()
+                    if row:
+                        person_ids[person] = row[0]
+                    else:
+                        cursor.execute('''
+                            INSERT INTO persons (name, id_card, real_name, real_id_card, is_temp, is_important, updated_time)
+                            VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                        ''', (name, id_card, real_name, real_id_card, bool(is_temp), bool(is_important)))
+                        person_ids[person] = cursor.lastrowid
+                
+                rows = []
+                for person, vector in chunk:
+                    # 浮点数只转换一次文本，与 json.dumps 和 _hash_feature 的结果一致
+                    texts = [repr(value) for value in vector]
+                    rows.append((person_ids[person], '[' + ', '.join(texts) + ']',
+                                 self._hash_feature_text(','.join(texts))))
+                cursor.executemany(self.FEATURE_UPSERT_SQL, rows)
+                
+                for person_id in {person_ids[person] for person, _ in chunk}:
+                    self._enforce_exemplar_limit(cursor, person_id)
+                conn.commit()
+                
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                conn.close()
+    
     def backup_database(self, backup_path: str = None) -> bool:
-        """备份数据库"""
+        """
+        备份数据库（在线备份接口分步复制，得到一致的快照，不阻塞其他线程写库）
+
+        定时的压缩/增量备份见 db_backup.DatabaseBackup
+        """
         try:
             if backup_path is None:
                 timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
                 backup_path = f"data/face_database_backup_{timestamp}.db"
             
-            import shutil
-            shutil.copy2(self.db_path, backup_path)
+            online_backup(self.db_path, backup_path)
             logging.info(f"数据库备份成功: {backup_path}")
             return True
             
@@ -834,17 +2209,22 @@ class FaceDatabaseManager:
     def delete_person(self, person_id: int) -> bool:
         """删除指定的人员及其所有相关数据"""
         with self.lock:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
             try:
-                # 删除人员记录（由于外键约束，会自动删除相关的图像和特征）
+                in_sync = self._begin_gallery_write(conn)
+                # 删除人员记录（图像由触发器删除）
                 cursor.execute('DELETE FROM persons WHERE id = ?', (person_id,))
                 
                 deleted_count = cursor.rowcount
+                self._end_gallery_write(conn, in_sync)
                 conn.commit()
                 
                 if deleted_count > 0:
+                    self.gallery.remove_person(person_id)
+                    self.person_cache.remove([person_id])
+                    self._collect_image_garbage(conn)
                     logging.info(f"已删除人员ID {person_id} 及其所有相关数据")
                     return True
                 else:
@@ -861,25 +2241,31 @@ class FaceDatabaseManager:
     def clear_database(self) -> bool:
         """清空数据库中的所有数据"""
         with self.lock:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
             try:
                 # 开始事务
-                cursor.execute('BEGIN TRANSACTION')
+                in_sync = self._begin_gallery_write(conn)
                 
                 # 清空所有表
                 cursor.execute('DELETE FROM recognition_logs')
+                cursor.execute('DELETE FROM recognition_hourly')
                 cursor.execute('DELETE FROM face_features')
                 cursor.execute('DELETE FROM face_images')
+                cursor.execute('DELETE FROM face_thumbnails')
                 cursor.execute('DELETE FROM persons')
                 
                 # 重置自增ID
                 cursor.execute('DELETE FROM sqlite_sequence WHERE name IN ("persons", "face_images", "face_features", "recognition_logs")')
                 
                 # 提交事务
+                self._end_gallery_write(conn, in_sync)
                 conn.commit()
                 
+                self.gallery.clear()
+                self.person_cache.clear()
+                self._collect_image_garbage(conn)
                 logging.info("数据库已清空")
                 return True
                 
@@ -890,9 +2276,342 @@ class FaceDatabaseManager:
             finally:
                 conn.close()
     
+    def _collect_image_garbage(self, conn: sqlite3.Connection) -> int:
+        """
+        删除引用计数为0的外部图像文件（调用方需持有锁，且已提交删除图像的事务）
+
+        在 BEGIN IMMEDIATE 写事务中删除文件后再提交：写入图像的一方同样在写事务中调用 ImageStore.put，
+        不会出现其他进程看到文件已存在而跳过写入、随后文件被本进程删除的情况
+        """
+        cursor = conn.cursor()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            cursor.execute('SELECT hash FROM image_store_refs WHERE refcount <= 0')
+            hashes = [row[0] for row in cursor.fetchall()]
+            if not hashes:
+                conn.rollback()
+                return 0
+            cursor.executemany('DELETE FROM image_store_refs WHERE hash = ? AND refcount <= 0',
+                               [(digest,) for digest in hashes])
+            # 提交失败时引用计数为0的记录保留，下次回收时重试；文件已删除也不会有引用指向它
+            removed = sum(1 for digest in hashes if self.image_store.delete(digest))
+            conn.commit()
+        except Exception as e:
+            logging.error(f"回收外部图像失败: {str(e)}")
+            conn.rollback()
+            return 0
+        
+        if removed:
+            logging.info(f"已回收 {removed} 个无引用的外部图像文件")
+        return removed
+    
+    def collect_image_garbage(self, sweep: bool = False, grace_seconds: float = 3600) -> int:
+        """
+        回收外部存储中无引用的图像文件
+
+        Args:
+            sweep: 同时遍历存储目录，删除数据库中没有引用记录的文件（如写库失败留下的文件）
+            grace_seconds: 遍历时只删除早于该时间的文件，避免删掉正在入库的图像
+
+        Returns:
+            删除的文件数
+        """
+        with self.lock:
+            conn = self._connect()
+            try:
+                removed = self._collect_image_garbage(conn)
+                if not sweep:
+                    return removed
+                
+                # 遍历期间持有写事务，其他进程不能在此期间引用已存在的旧文件
+                cursor = conn.cursor()
+                conn.execute('BEGIN IMMEDIATE')
+                cursor.execute('SELECT hash FROM image_store_refs WHERE refcount > 0')
+                referenced = {row[0] for row in cursor.fetchall()}
+                deadline = time.time() - grace_seconds
+                swept = 0
+                try:
+                    for digest, path, mtime in self.image_store.iter_files():
+                        if digest in referenced or mtime > deadline:
+                            continue
+                        try:
+                            os.remove(path)
+                            swept += 1
+                        except OSError:
+                            pass
+                finally:
+                    conn.rollback()
+                if swept:
+                    logging.info(f"已清理 {swept} 个数据库中没有记录的外部图像文件")
+                return removed + swept
+                
+            finally:
+                conn.close()
+    
+    def migrate_images_to_store(self, batch_size: int = 200, progress=None) -> int:
+        """
+        把保存在数据库中的图像迁出到外部存储，之后新图像也写入外部存储
+
+        每批单独提交并释放锁，可以在程序运行时执行。迁移后需要 VACUUM 才能缩小数据库文件。
+
+        Args:
+            batch_size: 每批迁移的图像数
+            progress: 进度回调 (已处理数, 总数)
+
+        Returns:
+            迁出的图像数
+        """
+        return self._migrate_images(True, batch_size, progress)
+    
+    def migrate_images_to_database(self, batch_size: int = 200, progress=None) -> int:
+        """把外部存储中的图像迁回数据库（停用外部存储时使用），返回迁回的图像数"""
+        return self._migrate_images(False, batch_size, progress)
+    
+    def _migrate_images(self, to_store: bool, batch_size: int, progress) -> int:
+        if to_store:
+            os.makedirs(self.image_store.root, exist_ok=True)
+            self.external_images = True
+        condition = 'image_hash IS NULL' if to_store else 'image_hash IS NOT NULL'
+        
+        with self.lock:
+            conn = self._connect()
+            try:
+                total = conn.execute(f'SELECT COUNT(*) FROM face_images WHERE {condition}').fetchone()[0]
+            finally:
+                conn.close()
+        
+        done = 0
+        last_id = 0
+        while True:
+            with self.lock:
+                conn = self._connect()
+                cursor = conn.cursor()
+                
+                try:
+                    # 迁出时在写事务中写文件，避免与其他进程的图像回收交错
+                    conn.execute('BEGIN IMMEDIATE')
+                    cursor.execute(f'''
+                        SELECT id, image_data, image_hash FROM face_images
+                        WHERE id > ? AND {condition}
+                        ORDER BY id LIMIT ?
+                    ''', (last_id, batch_size))
+                    rows = cursor.fetchall()
+                    updates = []
+                    for image_id, image_data, image_hash in rows:
+                        if to_store:
+                            updates.append((b'', self.image_store.put(image_data), image_id))
+                        else:
+                            image_bytes = self.image_store.get(image_hash)
+                            if image_bytes is not None:
+                                updates.append((image_bytes, None, image_id))
+                    cursor.executemany('UPDATE face_images SET image_data = ?, image_hash = ? WHERE id = ?', updates)
+                    conn.commit()
+                    
+                except Exception as e:
+                    logging.error(f"迁移人脸图像失败: {str(e)}")
+                    conn.rollback()
+                    return done
+                finally:
+                    conn.close()
+            
+            if not rows:
+                break
+            done += len(updates)
+            last_id = rows[-1][0]
+            if progress:
+                progress(done, total)
+        
+        if not to_store:
+            # 删除已迁回的文件和空目录：默认存储目录不存在时不再启用外部存储
+            self.external_images = False
+            self.collect_image_garbage()
+            self.image_store.remove_empty_dirs()
+        logging.info(f"已{'迁出' if to_store else '迁回'} {done} 张人脸图像")
+        return done
+    
+    def recompress_images(self, batch_size: int = 100, dry_run: bool = False, progress=None) -> Dict:
+        """
+        按当前的尺寸上限和编码参数重新压缩已有的人脸图像，只在结果更小时替换
+
+        每批单独提交并释放锁，可以在程序运行时执行。图像保存在数据库中时，需要 VACUUM 才能缩小数据库文件。
+
+        Args:
+            batch_size: 每批处理的图像数
+            dry_run: 只统计可节省的空间，不写入
+            progress: 进度回调 (已处理数, 总数)
+
+        Returns:
+            {'images': 处理数, 'recompressed': 替换数, 'bytes_before': 原大小, 'bytes_after': 处理后大小}
+        """
+        codec = self.image_codec or IMAGE_CODEC
+        stats = {'images': 0, 'recompressed': 0, 'bytes_before': 0, 'bytes_after': 0}
+        
+        with self.lock:
+            conn = self._connect()
+            try:
+                total = conn.execute('SELECT COUNT(*) FROM face_images').fetchone()[0]
+            finally:
+                conn.close()
+        
+        done = 0
+        last_id = 0
+        while True:
+            with self.lock:
+                conn = self._connect()
+                cursor = conn.cursor()
+                
+                try:
+                    cursor.execute('''
+                        SELECT id, image_data, image_hash FROM face_images
+                        WHERE id > ? ORDER BY id LIMIT ?
+                    ''', (last_id, batch_size))
+                    rows = cursor.fetchall()
+                    updates = []
+                    for image_id, image_data, image_hash in rows:
+                        image_bytes = self._image_bytes(image_data, image_hash)
+                        if not image_bytes:
+                            continue
+                        stats['images'] += 1
+                        stats['bytes_before'] += len(image_bytes)
+                        normalized = normalize_face_image(image_bytes, self.image_max_edge, codec, self.image_quality)
+                        if normalized is None or len(normalized[0]) >= len(image_bytes) or normalized[0] is image_bytes:
+                            stats['bytes_after'] += len(image_bytes)
+                            continue
+                        new_bytes, new_format = normalized
+                        stats['bytes_after'] += len(new_bytes)
+                        stats['recompressed'] += 1
+                        if dry_run:
+                            continue
+                        updates.append((new_bytes, image_hash, new_format, len(new_bytes), image_id))
+                    # 重新编码在写事务外完成，写文件和更新记录在写事务中进行，避免与其他进程的图像回收交错
+                    conn.execute('BEGIN IMMEDIATE')
+                    updates = [(b'', self.image_store.put(new_bytes), new_format, size, image_id) if image_hash
+                               else (new_bytes, None, new_format, size, image_id)
+                               for new_bytes, image_hash, new_format, size, image_id in updates]
+                    cursor.executemany('''
+                        UPDATE face_images SET image_data = ?, image_hash = ?, image_format = ?, image_size = ?
+                        WHERE id = ?
+                    ''', updates)
+                    conn.commit()
+                    
+                except Exception as e:
+                    logging.error(f"重新压缩人脸图像失败: {str(e)}")
+                    conn.rollback()
+                    return stats
+                finally:
+                    conn.close()
+            
+            if not rows:
+                break
+            done += len(rows)
+            last_id = rows[-1][0]
+            if progress:
+                progress(done, total)
+        
+        if not dry_run:
+            # 外部存储中被替换的旧文件
+            self.collect_image_garbage()
+        saved = stats['bytes_before'] - stats['bytes_after']
+        logging.info(f"人脸图像重新压缩{'（试运行）' if dry_run else ''}: {stats['recompressed']}/{stats['images']} 张, "
+                     f"{stats['bytes_before'] / 1024 / 1024:.1f}MB -> {stats['bytes_after'] / 1024 / 1024:.1f}MB, "
+                     f"节省 {saved / 1024 / 1024:.1f}MB")
+        return stats
+    
+    def get_space_info(self) -> Dict:
+        """数据库文件空间信息：页大小、总页数、空闲页数、自动清理模式（0 关闭，1 完全，2 增量）"""
+        with self.lock:
+            conn = self._connect()
+            try:
+                return {
+                    'page_size': conn.execute('PRAGMA page_size').fetchone()[0],
+                    'page_count': conn.execute('PRAGMA page_count').fetchone()[0],
+                    'freelist_count': conn.execute('PRAGMA freelist_count').fetchone()[0],
+                    'auto_vacuum': conn.execute('PRAGMA auto_vacuum').fetchone()[0],
+                }
+            finally:
+                conn.close()
+    
+    def incremental_vacuum(self, max_pages: int = None, pages_per_step: int = 1000) -> int:
+        """
+        分批把空闲页归还给文件系统（需要 auto_vacuum = INCREMENTAL，否则不做任何事）
+
+        Args:
+            max_pages: 最多归还的页数，None 表示全部
+            pages_per_step: 每批归还的页数，每批之间释放锁
+
+        Returns:
+            归还的页数
+        """
+        freed = 0
+        while max_pages is None or freed < max_pages:
+            step = pages_per_step if max_pages is None else min(pages_per_step, max_pages - freed)
+            with self.lock:
+                conn = self._connect()
+                try:
+                    if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+                        logging.debug("数据库未开启增量自动清理，跳过 incremental_vacuum（执行一次 vacuum() 后开启）")
+                        return freed
+                    before = conn.execute('PRAGMA freelist_count').fetchone()[0]
+                    if before == 0:
+                        break
+                    conn.execute(f'PRAGMA incremental_vacuum({int(step)})').fetchall()
+                    conn.commit()
+                    freed += before - conn.execute('PRAGMA freelist_count').fetchone()[0]
+                except Exception as e:
+                    logging.error(f"incremental_vacuum 失败: {str(e)}")
+                    return freed
+                finally:
+                    conn.close()
+        return freed
+    
+    def optimize(self, analyze: bool = False) -> bool:
+        """
+        更新查询规划器的统计信息
+
+        Args:
+            analyze: True 时执行完整的 ANALYZE（按 analysis_limit 抽样），否则执行 PRAGMA optimize（只分析需要的表）
+        """
+        with self.lock:
+            conn = self._connect()
+            try:
+                conn.execute('PRAGMA analysis_limit = 1000')
+                conn.execute('ANALYZE' if analyze else 'PRAGMA optimize')
+                conn.commit()
+                return True
+            except Exception as e:
+                logging.error(f"更新数据库统计信息失败: {str(e)}")
+                return False
+            finally:
+                conn.close()
+    
+    def vacuum(self) -> bool:
+        """
+        重建数据库文件以释放已删除数据占用的空间（耗时与数据库大小成正比，期间其他写操作等待）
+
+        同时把数据库转换为增量自动清理模式，之后可由 incremental_vacuum 分批归还空间
+        """
+        with self.lock:
+            conn = self._connect()
+            try:
+                size_before = os.path.getsize(self.db_path)
+                conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+                conn.execute('VACUUM')
+                logging.info(f"数据库 VACUUM 完成: {size_before / 1024 / 1024:.1f}MB -> "
+                             f"{os.path.getsize(self.db_path) / 1024 / 1024:.1f}MB")
+                return True
+            except Exception as e:
+                logging.error(f"数据库 VACUUM 失败: {str(e)}")
+                return False
+            finally:
+                conn.close()
+    
     def close(self):
         """关闭数据库连接"""
         # SQLite会自动管理连接，这里主要是清理资源
+        with self.lock:
+            if self._watch_conn is not None:
+                self._watch_conn.close()
+                self._watch_conn = None
         logging.info("人脸数据库管理器已关闭")
     
     def set_important_status_by_real_id_card(self, real_id_card: str, is_important: bool) -> int:
@@ -905,16 +2624,24 @@ class FaceDatabaseManager:
             受影响的人员数量
         """
         with self.lock:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             try:
+                in_sync = self._begin_gallery_write(conn)
+                cursor.execute('SELECT id FROM persons WHERE real_id_card = ?', (real_id_card,))
+                person_ids = [row[0] for row in cursor.fetchall()]
                 cursor.execute('''
                     UPDATE persons 
                     SET is_important = ?, updated_time = CURRENT_TIMESTAMP
                     WHERE real_id_card = ?
                 ''', (is_important, real_id_card))
+                self._end_gallery_write(conn, in_sync)
                 conn.commit()
                 affected = cursor.rowcount
+                updated_time = self._to_db_time(time.time())
+                for person_id in person_ids:
+                    self.gallery.update_person(person_id, is_important=bool(is_important))
+                    self.person_cache.update(person_id, is_important=bool(is_important), updated_time=updated_time)
                 if affected > 0:
                     status = "重点关注" if is_important else "普通人员"
                     logging.info(f"批量设置人员重点关注状态成功: real_id_card {real_id_card} -> {status}，共{affected}人")
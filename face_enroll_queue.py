@@ -0,0 +1,192 @@
+"""
+新面孔入库工作队列
+功能：
+1. 有界优先队列：优先处理更大、更清晰、更正面的人脸
+2. 队列满时淘汰优先级最低的任务（背压），而不是无限制地创建线程
+3. 按特征距离合并重复的人脸，只保留质量更好的一张
+4. 固定数量的工作线程消费队列
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+
+class EnrollmentJob:
+    """待入库的人脸任务"""
+
+    def __init__(self, feature, priority: float, payload: Dict):
+        self.feature = np.asarray(list(feature) if not isinstance(feature, np.ndarray) else feature,
+                                  dtype=np.float32)
+        self.priority = priority
+        self.payload = payload
+        self.submit_time = time.time()
+        self.cancelled = False  # 被合并替换或淘汰的任务标记为取消，出队时跳过
+
+
+class EnrollmentQueue:
+    """有界优先级入库队列，由固定工作线程池消费"""
+
+    # submit() 的返回状态
+    QUEUED = 'queued'
+    MERGED = 'merged'
+    DROPPED = 'dropped'
+
+    def __init__(self, handler: Callable[[EnrollmentJob], None], max_size: int = 32,
+                 num_workers: int = 2, merge_distance: float = 0.4):
+        """
+        初始化入库队列
+
+        Args:
+            handler: 处理单个任务的回调，在工作线程中执行
+            max_size: 队列最大长度
+            num_workers: 工作线程数量
+            merge_distance: 特征距离小于该值的任务视为同一人并合并
+        """
+        self.handler = handler
+        self.max_size = max_size
+        self.num_workers = num_workers
+        self.merge_distance = merge_distance
+
+        self._heap = []  # (-priority, seq, job)
+        self._seq = itertools.count()
+        self._pending = []  # 队列中有效的任务，用于按特征合并
+        self._cond = threading.Condition()
+        self._workers = []
+        self._running = False
+        self.active_workers = 0
+
+        # 统计信息
+        self.stats = {
+            'submitted': 0,
+            'merged': 0,
+            'dropped': 0,
+            'processed': 0,
+            'failed': 0,
+        }
+
+    def stats_snapshot(self) -> Dict[str, int]:
+        """统计信息的一致副本（工作线程会同时修改 stats）"""
+        with self._cond:
+            return dict(self.stats)
+
+    @property
+    def depth(self) -> int:
+        """当前队列中等待处理的任务数"""
+        return len(self._pending)
+
+    def start(self):
+        """启动工作线程"""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        for i in range(self.num_workers):
+            worker = threading.Thread(target=self._worker_loop, name=f"enroll-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        logging.info(f"新面孔入库队列已启动 (容量: {self.max_size}, 工作线程: {self.num_workers})")
+
+    def stop(self):
+        """停止工作线程，丢弃未处理的任务"""
+        with self._cond:
+            self._running = False
+            self._heap.clear()
+            self._pending.clear()
+            self._cond.notify_all()
+        self._workers = []
+
+    def clear(self) -> int:
+        """清空等待中的任务，返回清除的数量"""
+        with self._cond:
+            cleared = len(self._pending)
+            for job in self._pending:
+                job.cancelled = True
+            self._heap.clear()
+            self._pending.clear()
+            return cleared
+
+    def _push(self, job: EnrollmentJob):
+        """入堆（调用方需持有锁）"""
+        heapq.heappush(self._heap, (-job.priority, next(self._seq), job))
+        self._pending.append(job)
+
+    def _find_duplicate(self, job: EnrollmentJob) -> Optional[EnrollmentJob]:
+        """查找特征相近的等待任务（调用方需持有锁）"""
+        if not self._pending:
+            return None
+        features = np.stack([pending.feature for pending in self._pending])
+        distances = np.linalg.norm(features - job.feature, axis=1)
+        idx = int(np.argmin(distances))
+        return self._pending[idx] if distances[idx] < self.merge_distance else None
+
+    def submit(self, feature, priority: float, payload: Dict) -> str:
+        """
+        提交一个入库任务
+
+        Returns:
+            QUEUED / MERGED / DROPPED
+        """
+        job = EnrollmentJob(feature, priority, payload)
+        with self._cond:
+            self.stats['submitted'] += 1
+
+            duplicate = self._find_duplicate(job)
+            if duplicate is not None:
+                self.stats['merged'] += 1
+                if job.priority > duplicate.priority:
+                    # 新的人脸质量更好，替换掉旧任务
+                    duplicate.cancelled = True
+                    self._pending.remove(duplicate)
+                    self._push(job)
+                    self._cond.notify()
+                return EnrollmentQueue.MERGED
+
+            if len(self._pending) >= self.max_size:
+                lowest = min(self._pending, key=lambda pending: pending.priority)
+                if job.priority <= lowest.priority:
+                    self.stats['dropped'] += 1
+                    return EnrollmentQueue.DROPPED
+                # 淘汰优先级最低的任务，为新任务腾出位置
+                lowest.cancelled = True
+                self._pending.remove(lowest)
+                self.stats['dropped'] += 1
+
+            self._push(job)
+            self._cond.notify()
+            return EnrollmentQueue.QUEUED
+
+    def _next_job(self) -> Optional[EnrollmentJob]:
+        """取出优先级最高的有效任务，队列为空时阻塞"""
+        with self._cond:
+            while self._running:
+                while self._heap:
+                    _, _, job = heapq.heappop(self._heap)
+                    if not job.cancelled:
+                        self._pending.remove(job)
+                        self.active_workers += 1
+                        return job
+                self._cond.wait()
+            return None
+
+    def _worker_loop(self):
+        """工作线程主循环"""
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            outcome = 'processed'
+            try:
+                self.handler(job)
+            except Exception as e:
+                outcome = 'failed'
+                logging.error(f"处理新面孔入库任务时出错: {str(e)}")
+            finally:
+                with self._cond:
+                    self.stats[outcome] += 1
+                    self.active_workers -= 1
@@ -0,0 +1,422 @@
+"""
+人脸库模板管理（内存）
+功能：
+1. 每个身份最多保留K个差异化的样本特征（k-medoids 或最远点采样）
+2. 为每个身份缓存中心特征（centroid），用于粗筛
+3. 向量化的内存检索，避免每帧从SQLite读取并解析JSON特征
+4. 两级检索：先按中心特征对身份排序，只对前P个候选身份做精确的样本比对
+"""
+
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+def _pairwise_distances(features: np.ndarray) -> np.ndarray:
+    """计算样本间的欧氏距离矩阵"""
+    squared = np.sum(features ** 2, axis=1)
+    dist2 = squared[:, None] + squared[None, :] - 2.0 * features @ features.T
+    return np.sqrt(np.maximum(dist2, 0.0))
+
+
+def farthest_point_sampling(features: np.ndarray, k: int) -> List[int]:
+    """
+    最远点采样：从最靠近中心的样本开始，每次选取距已选集合最远的样本
+
+    Returns:
+        选中样本的下标列表
+    """
+    n = len(features)
+    if n <= k:
+        return list(range(n))
+
+    centroid = features.mean(axis=0)
+    selected = [int(np.argmin(np.linalg.norm(features - centroid, axis=1)))]
+    min_dist = np.linalg.norm(features - features[selected[0]], axis=1)
+    while len(selected) < k:
+        idx = int(np.argmax(min_dist))
+        selected.append(idx)
+        min_dist = np.minimum(min_dist, np.linalg.norm(features - features[idx], axis=1))
+    return selected
+
+
+def k_medoids(features: np.ndarray, k: int, max_iter: int = 20) -> List[int]:
+    """
+    k-medoids（交替迭代），以最远点采样结果初始化
+
+    Returns:
+        medoid样本的下标列表
+    """
+    n = len(features)
+    if n <= k:
+        return list(range(n))
+
+    distances = _pairwise_distances(features)
+    medoids = farthest_point_sampling(features, k)
+    for _ in range(max_iter):
+        # 分配：每个样本归属到最近的medoid
+        labels = np.argmin(distances[:, medoids], axis=1)
+        new_medoids = []
+        for cluster in range(k):
+            members = np.where(labels == cluster)[0]
+            if len(members) == 0:
+                new_medoids.append(medoids[cluster])
+                continue
+            # 更新：簇内到其他成员距离和最小的样本作为新的medoid
+            costs = distances[np.ix_(members, members)].sum(axis=1)
+            new_medoids.append(int(members[np.argmin(costs)]))
+        if new_medoids == medoids:
+            break
+        medoids = new_medoids
+    return medoids
+
+
+def select_exemplars(features, k: int, method: str = 'kmedoids') -> List[int]:
+    """
+    从一个身份的全部特征中选出至多k个差异化的样本
+
+    Args:
+        features: 特征列表或 (N, 128) 数组
+        k: 最多保留的样本数
+        method: 'kmedoids' 或 'fps'（最远点采样）
+    """
+    features = np.asarray(features, dtype=np.float64)
+    if method == 'fps':
+        return farthest_point_sampling(features, k)
+    return k_medoids(features, k)
+
+
+class PersonTemplate:
+    """单个身份的模板：样本特征 + 缓存的中心特征"""
+
+    def __init__(self, person_id: int, name: str, real_name: str = None, real_id_card: str = None,
+                 is_temp: bool = False, is_important: bool = False):
+        self.person_id = person_id
+        self.name = name
+        self.real_name = real_name
+        self.real_id_card = real_id_card
+        self.is_temp = is_temp
+        self.is_important = is_important
+        self.feature_ids = []  # 样本对应的 face_features.id
+        self.exemplars = np.zeros((0, 128), dtype=np.float32)
+        self.feature_sum = np.zeros(128, dtype=np.float64)  # 样本累加和，用于增量维护中心特征
+        self.centroid = None
+
+    def _update_centroid(self):
+        count = len(self.feature_ids)
+        self.centroid = (self.feature_sum / count).astype(np.float32) if count else None
+
+    def set_exemplars(self, feature_ids: List[int], features):
+        """替换全部样本并重新计算中心特征"""
+        self.feature_ids = list(feature_ids)
+        self.exemplars = np.asarray(features, dtype=np.float32).reshape(-1, 128)
+        self.feature_sum = self.exemplars.sum(axis=0, dtype=np.float64)
+        self._update_centroid()
+
+    def add_exemplar(self, feature_id: int, feature):
+        """增量添加一个样本"""
+        feature = np.asarray(feature, dtype=np.float32).reshape(1, 128)
+        self.feature_ids.append(feature_id)
+        self.exemplars = np.vstack([self.exemplars, feature])
+        self.feature_sum += feature[0]
+        self._update_centroid()
+
+    def remove_exemplar(self, feature_id: int) -> bool:
+        """增量移除一个样本"""
+        if feature_id not in self.feature_ids:
+            return False
+        idx = self.feature_ids.index(feature_id)
+        self.feature_sum -= self.exemplars[idx]
+        self.feature_ids.pop(idx)
+        self.exemplars = np.delete(self.exemplars, idx, axis=0)
+        self._update_centroid()
+        return True
+
+    def match_tuple(self, distance: float) -> Tuple[int, float, str, str, bool]:
+        """与 FaceDatabaseManager.find_similar_face 一致的返回格式"""
+        return (self.person_id, distance, self.name, self.real_name, self.is_important)
+
+
+class FaceGallery:
+    """内存人脸库：按身份管理样本特征并提供向量化检索"""
+
+    # 检索模式
+    MODE_EXACT = 'exact'    # 与全部样本逐一比对
+    MODE_COARSE = 'coarse'  # 先比对中心特征，再精确比对前P个候选身份
+
+    def __init__(self, search_mode: str = 'exact', coarse_top_p: int = 8,
+                 coarse_threshold: Optional[float] = None):
+        """
+        初始化内存人脸库
+
+        Args:
+            search_mode: 'exact' 或 'coarse'
+            coarse_top_p: 两级检索时进入精确比对的候选身份数
+            coarse_threshold: 两级检索时中心特征距离的上限，超过的身份直接跳过（None表示不限制）
+        """
+        self.lock = threading.RLock()
+        self.templates = {}  # type: Dict[int, PersonTemplate]
+
+        self.search_mode = search_mode
+        self.coarse_top_p = coarse_top_p
+        self.coarse_threshold = coarse_threshold
+
+        # 扁平化的检索矩阵，模板变化时惰性重建
+        self._dirty = True
+        self._matrix = None
+        self._row_person = None
+        self._row_is_temp = None
+
+        # 中心特征矩阵，随样本增删增量维护（每个身份一行）
+        self._centroids = np.zeros((64, 128), dtype=np.float32)
+        self._centroid_is_temp = np.zeros(64, dtype=bool)
+        self._centroid_persons = []  # 行号 -> person_id
+        self._centroid_rows = {}     # person_id -> 行号
+
+    def __len__(self) -> int:
+        return len(self.templates)
+
+    @property
+    def feature_count(self) -> int:
+        """当前内存中的样本特征总数"""
+        return sum(len(t.feature_ids) for t in self.templates.values())
+
+    @property
+    def memory_bytes(self) -> int:
+        """样本、中心特征和检索矩阵占用的内存(字节，近似)"""
+        with self.lock:
+            total = sum(t.exemplars.nbytes + t.feature_sum.nbytes for t in self.templates.values())
+            total += self._centroids.nbytes + self._centroid_is_temp.nbytes
+            if self._matrix is not None:
+                total += self._matrix.nbytes + self._row_person.nbytes + self._row_is_temp.nbytes
+            return total
+
+    def load(self, rows):
+        """
+        从数据库行批量加载
+
+        Args:
+            rows: 可迭代的 (feature_id, person_id, feature_vector, name, real_name,
+                  real_id_card, is_temp, is_important)
+        """
+        grouped = {}
+        with self.lock:
+            self.templates.clear()
+            self._reset_centroids()
+            for feature_id, person_id, vector, name, real_name, real_id_card, is_temp, is_important in rows:
+                template = self.templates.get(person_id)
+                if template is None:
+                    template = PersonTemplate(person_id, name, real_name, real_id_card,
+                                              bool(is_temp), bool(is_important))
+                    self.templates[person_id] = template
+                    grouped[person_id] = ([], [])
+                grouped[person_id][0].append(feature_id)
+                grouped[person_id][1].append(vector)
+            for person_id, (feature_ids, vectors) in grouped.items():
+                self.templates[person_id].set_exemplars(feature_ids, vectors)
+                self._put_centroid(self.templates[person_id])
+            self._dirty = True
+        logging.info(f"内存人脸库已加载: {len(self.templates)} 个身份, {self.feature_count} 个样本特征")
+
+    def set_person(self, template: PersonTemplate):
+        """新增或替换一个身份的模板"""
+        with self.lock:
+            if len(template.feature_ids) == 0:
+                self.templates.pop(template.person_id, None)
+                self._drop_centroid(template.person_id)
+            else:
+                self.templates[template.person_id] = template
+                self._put_centroid(template)
+            self._dirty = True
+
+    def remove_person(self, person_id: int) -> bool:
+        """移除一个身份"""
+        with self.lock:
+            removed = self.templates.pop(person_id, None) is not None
+            if removed:
+                self._drop_centroid(person_id)
+                self._dirty = True
+            return removed
+
+    def remove_persons(self, person_ids) -> int:
+        """批量移除身份，返回实际移除的数量"""
+        with self.lock:
+            removed = 0
+            for person_id in person_ids:
+                if self.templates.pop(person_id, None) is not None:
+                    self._drop_centroid(person_id)
+                    removed += 1
+            if removed:
+                self._dirty = True
+            return removed
+
+    def add_feature(self, person_id: int, feature_id: int, feature) -> bool:
+        """
+        向已有身份增量添加一个样本
+
+        Returns:
+            身份不在内存人脸库中时返回False，调用方需改用 set_person
+        """
+        with self.lock:
+            template = self.templates.get(person_id)
+            if template is None:
+                return False
+            template.add_exemplar(feature_id, feature)
+            self._put_centroid(template)
+            self._dirty = True
+            return True
+
+    def remove_feature(self, person_id: int, feature_id: int) -> bool:
+        """从身份中增量移除一个样本，样本全部移除后身份也随之移除"""
+        with self.lock:
+            template = self.templates.get(person_id)
+            if template is None or not template.remove_exemplar(feature_id):
+                return False
+            if len(template.feature_ids) == 0:
+                self.templates.pop(person_id, None)
+                self._drop_centroid(person_id)
+            else:
+                self._put_centroid(template)
+            self._dirty = True
+            return True
+
+    def update_person(self, person_id: int, **fields) -> bool:
+        """更新身份元数据（real_name、is_temp、is_important等）"""
+        with self.lock:
+            template = self.templates.get(person_id)
+            if template is None:
+                return False
+            for key, value in fields.items():
+                if value is not None:
+                    setattr(template, key, value)
+            if 'is_temp' in fields:
+                self._put_centroid(template)
+                self._dirty = True
+            return True
+
+    def clear(self):
+        """清空内存人脸库"""
+        with self.lock:
+            self.templates.clear()
+            self._reset_centroids()
+            self._dirty = True
+
+    def _reset_centroids(self):
+        """清空中心特征矩阵（调用方需持有锁）"""
+        self._centroid_persons = []
+        self._centroid_rows = {}
+
+    def _put_centroid(self, template: PersonTemplate):
+        """写入或更新某身份的中心特征行（调用方需持有锁）"""
+        if template.centroid is None:
+            self._drop_centroid(template.person_id)
+            return
+        row = self._centroid_rows.get(template.person_id)
+        if row is None:
+            row = len(self._centroid_persons)
+            if row >= len(self._centroids):
+                # 容量不足时倍增
+                self._centroids = np.vstack([self._centroids, np.zeros_like(self._centroids)])
+                self._centroid_is_temp = np.concatenate([self._centroid_is_temp,
+                                                         np.zeros_like(self._centroid_is_temp)])
+            self._centroid_persons.append(template.person_id)
+            self._centroid_rows[template.person_id] = row
+        self._centroids[row] = template.centroid
+        self._centroid_is_temp[row] = bool(template.is_temp)
+
+    def _drop_centroid(self, person_id: int):
+        """移除某身份的中心特征行，用最后一行填补空位（调用方需持有锁）"""
+        row = self._centroid_rows.pop(person_id, None)
+        if row is None:
+            return
+        last = len(self._centroid_persons) - 1
+        if row != last:
+            moved_person = self._centroid_persons[last]
+            self._centroids[row] = self._centroids[last]
+            self._centroid_is_temp[row] = self._centroid_is_temp[last]
+            self._centroid_persons[row] = moved_person
+            self._centroid_rows[moved_person] = row
+        self._centroid_persons.pop()
+
+    def _rebuild(self):
+        """重建扁平化检索矩阵（调用方需持有锁）"""
+        matrices, persons, temps = [], [], []
+        for template in self.templates.values():
+            count = len(template.exemplars)
+            if count == 0:
+                continue
+            matrices.append(template.exemplars)
+            persons.append(np.full(count, template.person_id, dtype=np.int64))
+            temps.append(np.full(count, template.is_temp, dtype=bool))
+        if matrices:
+            self._matrix = np.vstack(matrices)
+            self._row_person = np.concatenate(persons)
+            self._row_is_temp = np.concatenate(temps)
+        else:
+            self._matrix = None
+            self._row_person = None
+            self._row_is_temp = None
+        self._dirty = False
+
+    def search(self, probe, threshold: float, include_temp: bool = False) -> Optional[Tuple[int, float, str, str, bool]]:
+        """
+        在全部样本特征中查找最相近的身份
+
+        Returns:
+            (person_id, distance, person_name, real_name, is_important) 或 None
+        """
+        probe = np.asarray(probe, dtype=np.float32)
+        if self.search_mode == FaceGallery.MODE_COARSE:
+            return self._search_coarse(probe, threshold, include_temp)
+
+        with self.lock:
+            if self._dirty:
+                self._rebuild()
+            if self._matrix is None:
+                return None
+
+            distances = np.linalg.norm(self._matrix - probe, axis=1)
+            if not include_temp:
+                distances = np.where(self._row_is_temp, np.inf, distances)
+            idx = int(np.argmin(distances))
+            distance = float(distances[idx])
+            if distance >= threshold:
+                return None
+            return self.templates[int(self._row_person[idx])].match_tuple(distance)
+
+    def _search_coarse(self, probe: np.ndarray, threshold: float,
+                       include_temp: bool) -> Optional[Tuple[int, float, str, str, bool]]:
+        """两级检索：按中心特征距离取前P个身份，再与其样本精确比对"""
+        with self.lock:
+            count = len(self._centroid_persons)
+            if count == 0:
+                return None
+
+            distances = np.linalg.norm(self._centroids[:count] - probe, axis=1)
+            if not include_temp:
+                distances = np.where(self._centroid_is_temp[:count], np.inf, distances)
+            if self.coarse_threshold is not None:
+                distances = np.where(distances > self.coarse_threshold, np.inf, distances)
+
+            top_p = min(max(1, self.coarse_top_p), count)
+            if top_p < count:
+                candidates = np.argpartition(distances, top_p - 1)[:top_p]
+            else:
+                candidates = np.arange(count)
+
+            best_distance = float('inf')
+            best_template = None
+            for row in candidates:
+                if not np.isfinite(distances[row]):
+                    continue
+                template = self.templates[self._centroid_persons[row]]
+                distance = float(np.min(np.linalg.norm(template.exemplars - probe, axis=1)))
+                if distance < best_distance:
+                    best_distance = distance
+                    best_template = template
+
+            if best_template is None or best_distance >= threshold:
+                return None
+            return best_template.match_tuple(best_distance)
@@ -0,0 +1,160 @@
+"""
+人脸图像外部存储（内容寻址）
+功能：
+1. 图像按 SHA-256 命名写入分级目录（root/ab/cd/<哈希>），数据库 face_images 只保存哈希，
+   主库不再随每张人脸增长几十KB，分页读取、VACUUM 和备份都不必带上图像数据
+2. 相同内容的图像只保存一份；引用计数保存在数据库 image_store_refs 表中，由触发器维护
+3. 先写临时文件再改名，写入中断不会留下残缺的图像文件
+4. 迁移工具：把已有的 BLOB 图像迁出到外部存储（或迁回数据库），并回收无引用的文件
+5. 重新压缩工具：按当前的尺寸上限和编码参数重新压缩已有图像，并报告节省的空间
+
+用法示例：
+    python face_image_store.py migrate --db data/face_database.db --vacuum
+    python face_image_store.py gc --db data/face_database.db --sweep
+    python face_image_store.py restore --db data/face_database.db
+    python face_image_store.py recompress --max-edge 400 --codec webp --quality 85 --dry-run
+"""
+
+import argparse
+import hashlib
+import logging
+import os
+import threading
+import time
+from typing import Iterator, Optional, Tuple
+
+
+class ImageStore:
+    """按内容哈希命名的图像文件存储"""
+
+    def __init__(self, root: str, shard_depth: int = 2):
+        """
+        Args:
+            root: 存储根目录
+            shard_depth: 分级目录层数（每层取哈希的两个字符），避免单个目录文件过多
+        """
+        self.root = root
+        self.shard_depth = shard_depth
+
+    @staticmethod
+    def hash_bytes(data: bytes) -> str:
+        """图像内容哈希（SHA-256 十六进制）"""
+        return hashlib.sha256(data).hexdigest()
+
+    def path_for(self, digest: str) -> str:
+        """哈希对应的文件路径"""
+        shards = [digest[i * 2:i * 2 + 2] for i in range(self.shard_depth)]
+        return os.path.join(self.root, *shards, digest)
+
+    def exists(self, digest: str) -> bool:
+        return os.path.exists(self.path_for(digest))
+
+    def put(self, data: bytes) -> str:
+        """
+        写入图像，内容相同的文件已存在时不重复写入
+
+        Returns:
+            内容哈希
+        """
+        digest = self.hash_bytes(data)
+        path = self.path_for(digest)
+        if os.path.exists(path):
+            return digest
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return digest
+
+    def get(self, digest: str) -> Optional[bytes]:
+        """读取图像，文件不存在时返回None"""
+        try:
+            with open(self.path_for(digest), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            logging.warning(f"外部存储中找不到图像: {digest}")
+            return None
+
+    def delete(self, digest: str) -> bool:
+        """删除图像文件"""
+        try:
+            os.remove(self.path_for(digest))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def remove_empty_dirs(self):
+        """删除空的分级目录（根目录为空时一并删除）"""
+        if not os.path.isdir(self.root):
+            return
+        for dirpath, _, _ in sorted(os.walk(self.root), key=lambda entry: len(entry[0]), reverse=True):
+            try:
+                os.rmdir(dirpath)
+            except OSError:
+                pass
+
+    def iter_files(self) -> Iterator[Tuple[str, str, float]]:
+        """遍历存储中的文件，返回 (哈希, 路径, 修改时间)；未完成的临时文件也会列出，哈希为None"""
+        if not os.path.isdir(self.root):
+            return
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                try:
+                    mtime = os.path.getmtime(path)
+                except OSError:
+                    continue
+                digest = None if filename.endswith('.tmp') else filename
+                yield digest, path, mtime
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="人脸图像外部存储迁移与回收")
+    parser.add_argument('command', choices=['migrate', 'restore', 'gc', 'recompress'],
+                        help="migrate: 数据库BLOB迁出到外部存储；restore: 迁回数据库；gc: 回收无引用的图像文件；"
+                             "recompress: 重新压缩已有图像")
+    parser.add_argument('--db', default='data/face_database.db', help="数据库路径")
+    parser.add_argument('--store', help="外部存储目录（默认为数据库所在目录下的 face_images）")
+    parser.add_argument('--batch-size', type=int, default=200, help="每批处理的图像数")
+    parser.add_argument('--vacuum', action='store_true', help="迁移后执行 VACUUM 释放数据库文件空间")
+    parser.add_argument('--max-edge', type=int, default=400, help="recompress: 长边像素上限，0 表示不缩放")
+    parser.add_argument('--codec', choices=['jpg', 'webp'], default='jpg', help="recompress: 编码格式")
+    parser.add_argument('--quality', type=int, default=90, help="recompress: 编码质量")
+    parser.add_argument('--dry-run', action='store_true', help="recompress: 只统计可节省的空间，不写入")
+    parser.add_argument('--sweep', action='store_true', help="gc 时同时清理数据库中没有记录的文件（如写入中断留下的）")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    from face_database_manager import FaceDatabaseManager
+
+    db_manager = FaceDatabaseManager(args.db, image_store_dir=args.store, image_max_edge=args.max_edge,
+                                     image_codec=args.codec, image_quality=args.quality)
+
+    def progress(done, total):
+        print(f"\r已处理 {done}/{total}", end='', flush=True)
+
+    start = time.time()
+    if args.command == 'migrate':
+        count = db_manager.migrate_images_to_store(args.batch_size, progress)
+        print(f"\n已迁出 {count} 张图像到 {db_manager.image_store.root}，耗时 {time.time() - start:.1f}秒")
+    elif args.command == 'restore':
+        count = db_manager.migrate_images_to_database(args.batch_size, progress)
+        print(f"\n已迁回 {count} 张图像到数据库，耗时 {time.time() - start:.1f}秒")
+    elif args.command == 'recompress':
+        stats = db_manager.recompress_images(args.batch_size, args.dry_run, progress)
+        saved = stats['bytes_before'] - stats['bytes_after']
+        print(f"\n{'可' if args.dry_run else '已'}重新压缩 {stats['recompressed']}/{stats['images']} 张图像: "
+              f"{stats['bytes_before'] / 1024 / 1024:.1f}MB -> {stats['bytes_after'] / 1024 / 1024:.1f}MB，"
+              f"节省 {saved / 1024 / 1024:.1f}MB ({saved / max(1, stats['bytes_before']):.0%})")
+    else:
+        count = db_manager.collect_image_garbage(sweep=args.sweep)
+        print(f"已删除 {count} 个无引用的图像文件")
+
+    if args.vacuum:
+        db_manager.vacuum()
+    return 0
+
+
+if __name__ == '__main__':
+    main()
@@ -29,6 +29,14 @@ class FaceLibraryManager:
         # 初始化数据库管理器
         self.db_manager = FaceDatabaseManager()
         
+        # 分页加载状态：列表滚动到底部附近时加载下一页
+        self.page_size = 200
+        self.next_cursor = None
+        self.page_load_pending = False
+        self.search_text = ''
+        self.search_job = None  # 输入搜索内容后延迟执行的查询
+        self.search_delay = 300  # 毫秒
+        
         # 创建主窗口
         self.root = tk.Tk()
         self.root.title("人脸库管理器")
@@ -87,6 +95,14 @@ class FaceLibraryManager:
         list_title = Label(left_frame, text="人员列表", font=('Arial', 12, 'bold'))
         list_title.pack(pady=(0, 5))
         
+        # 搜索框：按姓名或身份证号前缀搜索，输入停止后自动查询
+        search_frame = ttk.Frame(left_frame)
+        search_frame.pack(fill=tk.X, pady=(0, 5))
+        Label(search_frame, text="搜索:", font=('Arial', 9)).pack(side=tk.LEFT)
+        self.search_var = tk.StringVar()
+        self.search_var.trace_add('write', lambda *args: self.on_search_changed())
+        ttk.Entry(search_frame, textvariable=self.search_var).pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        
         # 创建Treeview显示人员列表
         columns = ('ID', '姓名', '身份证号', '类型', '创建时间')
         self.tree = ttk.Treeview(left_frame, columns=columns, show='headings', height=20)
@@ -105,8 +121,8 @@ class FaceLibraryManager:
             self.tree.column(col, width=column_widths.get(col, 100))
         
         # 添加滚动条
-        scrollbar = ttk.Scrollbar(left_frame, orient=tk.VERTICAL, command=self.tree.yview)
-        self.tree.configure(yscrollcommand=scrollbar.set)
+        self.scrollbar = scrollbar = ttk.Scrollbar(left_frame, orient=tk.VERTICAL, command=self.tree.yview)
+        self.tree.configure(yscrollcommand=self.on_tree_scroll)
         
         self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
@@ -146,6 +162,7 @@ class FaceLibraryManager:
         ttk.Button(button_frame, text="删除选中", command=self.delete_selected_person).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="设置重点关注", command=self.toggle_important_status).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="导出数据", command=self.export_data).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="今日识别排行", command=self.show_top_persons).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="关闭", command=self.close_window).pack(side=tk.RIGHT, padx=5)
         
         # 状态栏
@@ -164,74 +181,76 @@ class FaceLibraryManager:
         self.root.bind('<Escape>', lambda e: self.close_window())
     
     def load_person_data(self):
-        """加载人员数据到列表，按real_id_card去重"""
+        """重新加载人员列表的第一页（去重和搜索在数据库中完成）"""
         try:
             # 清空现有数据
-            for item in self.tree.get_children():
-                self.tree.delete(item)
-            
-            # 从数据库获取所有人员
-            conn = sqlite3.connect(self.db_manager.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT id, name, id_card, is_temp, is_important, created_time, real_name, real_id_card
-                FROM persons
-                ORDER BY created_time DESC
-            ''')
-            
-            # 按real_id_card去重，只保留最新一条
-            unique_persons = {}
-            for row in cursor.fetchall():
-                person_id, name, id_card, is_temp, is_important, created_time, real_name, real_id_card = row
-                key = real_id_card if real_id_card else id_card
-                if key and key not in unique_persons:
-                    unique_persons[key] = row
-                elif not key:
-                    # 没有身份证号的也显示
-                    unique_persons[person_id] = row
-            
-            # 统计去重后的各类人数
-            total_count = 0
-            real_count = 0
-            temp_count = 0
-            important_count = 0
-            for row in unique_persons.values():
-                person_id, name, id_card, is_temp, is_important, created_time, real_name, real_id_card = row
-                total_count += 1
-                if is_temp:
-                    temp_count += 1
-                else:
-                    real_count += 1
-                if is_important:
-                    important_count += 1
-                # 确定显示名称
-                display_name = real_name if real_name else name
-                # 确定身份证号
-                display_id = real_id_card if real_id_card else id_card
-                # 确定类型
-                person_type = "临时" if is_temp else "真实"
-                if is_important:
-                    person_type += " ⭐"
-                # 格式化时间
-                if created_time:
-                    try:
-                        dt = datetime.fromisoformat(created_time.replace('Z', '+00:00'))
-                        formatted_time = dt.strftime('%Y-%m-%d %H:%M')
-                    except:
-                        formatted_time = created_time
-                else:
-                    formatted_time = "未知"
-                self.tree.insert('', 'end', values=(person_id, display_name, display_id, person_type, formatted_time))
-            conn.close()
-            # 用去重后的统计信息更新状态栏
-            status_text = f"总人员: {total_count} | 真实身份: {real_count} | 临时身份: {temp_count} | 重点关注: {important_count}"
-            self.status_label.config(text=status_text)
-            logging.info(f"已加载 {total_count} 个人员数据（去重统计）")
+            self.tree.delete(*self.tree.get_children())
+            self.next_cursor = None
+            self.load_next_page(first=True)
+            self.update_status_bar()
         except Exception as e:
             logging.error(f"加载人员数据失败: {str(e)}")
             messagebox.showerror("错误", f"加载人员数据失败:\n{str(e)}")
     
+    def load_next_page(self, first=False):
+        """加载下一页人员数据，追加到列表末尾"""
+        self.page_load_pending = False
+        if not first and self.next_cursor is None:
+            return
+        persons, self.next_cursor = self.db_manager.get_persons_page(
+            self.next_cursor, self.page_size, search=self.search_text or None)
+        for person in persons:
+            # 确定显示名称
+            display_name = person['real_name'] if person['real_name'] else person['name']
+            # 确定身份证号
+            display_id = person['real_id_card'] if person['real_id_card'] else person['id_card']
+            # 确定类型
+            person_type = "临时" if person['is_temp'] else "真实"
+            if person['is_important']:
+                person_type += " ⭐"
+            # 格式化时间
+            created_time = person['created_time']
+            if created_time:
+                try:
+                    dt = datetime.fromisoformat(created_time.replace('Z', '+00:00'))
+                    formatted_time = dt.strftime('%Y-%m-%d %H:%M')
+                except:
+                    formatted_time = created_time
+            else:
+                formatted_time = "未知"
+            self.tree.insert('', 'end', values=(person['id'], display_name, display_id, person_type, formatted_time))
+        if first:
+            logging.info(f"已加载第一页 {len(persons)} 个人员数据（去重）")
+    
+    def on_tree_scroll(self, first, last):
+        """列表滚动：更新滚动条，接近底部时加载下一页"""
+        self.scrollbar.set(first, last)
+        if self.next_cursor is not None and float(last) > 0.9 and not self.page_load_pending:
+            # 延迟到当前事件处理结束后加载，避免在滚动回调中修改列表
+            self.page_load_pending = True
+            self.root.after_idle(self.load_next_page)
+    
+    def on_search_changed(self):
+        """搜索内容变化：停止输入一段时间后再查询"""
+        if self.search_job is not None:
+            self.root.after_cancel(self.search_job)
+        self.search_job = self.root.after(self.search_delay, self.apply_search)
+    
+    def apply_search(self):
+        self.search_job = None
+        search_text = self.search_var.get().strip()
+        if search_text != self.search_text:
+            self.search_text = search_text
+            self.load_person_data()
+    
+    def update_status_bar(self):
+        """用数据库计数表更新状态栏（不扫描人员表）"""
+        stats = self.db_manager.get_statistics()
+        status_text = (f"总人员: {stats['total_persons']} | 真实身份: {stats['real_persons']} | "
+                       f"临时身份: {stats['temp_persons']} | 重点关注: {stats['important_persons']} | "
+                       f"识别记录: {stats['total_logs']}")
+        self.status_label.config(text=status_text)
+    
     def on_person_select(self, event):
         """当选择人员时显示详细信息"""
         selection = self.tree.selection()
@@ -259,26 +278,24 @@ class FaceLibraryManager:
 创建时间: {person_info['created_time']}
 更新时间: {person_info['updated_time']}"""
             
+            # 识别记录汇总（读取按小时汇总表）
+            seen = self.db_manager.get_first_last_seen(person_id)
+            if seen:
+                first_seen, last_seen, sightings = seen
+                info_content += f"""
+首次识别: {first_seen} (UTC)
+最后识别: {last_seen} (UTC)
+识别次数: {sightings}"""
+            else:
+                info_content += "\n识别记录: 无"
+            
             self.info_text.insert(1.0, info_content)
             
-            # 获取并显示人脸图片
-            image_data = self.db_manager.get_face_image(person_id)
+            # 获取并显示人脸缩略图（已按长边200像素预先缩放）
+            image_data = self.db_manager.get_face_thumbnail(person_id, 200)
             if image_data:
                 try:
-                    # 将二进制数据转换为PIL图像
                     pil_img = Image.open(io.BytesIO(image_data))
-                    
-                    # 计算合适的显示尺寸
-                    display_width = 200
-                    display_height = 200
-                    
-                    # 保持宽高比
-                    img_width, img_height = pil_img.size
-                    ratio = min(display_width / img_width, display_height / img_height)
-                    new_width = int(img_width * ratio)
-                    new_height = int(img_height * ratio)
-                    
-                    pil_img = pil_img.resize((new_width, new_height), Image.Resampling.LANCZOS)
                     tk_img = ImageTk.PhotoImage(pil_img)
                     
                     # 更新图片显示
@@ -353,6 +370,23 @@ class FaceLibraryManager:
             except Exception as e:
                 messagebox.showerror("错误", f"{action}失败: {str(e)}")
     
+    def show_top_persons(self):
+        """显示今天识别次数最多的人员"""
+        try:
+            top_persons = self.db_manager.get_top_persons(limit=10)
+            if not top_persons:
+                messagebox.showinfo("今日识别排行", "今天还没有识别记录")
+                return
+            lines = []
+            for rank, person in enumerate(top_persons, 1):
+                display_name = person['real_name'] or person['name']
+                star = " ⭐" if person['is_important'] else ""
+                lines.append(f"{rank}. {display_name}{star}  {person['sightings']} 次  (最后: {person['last_seen']})")
+            messagebox.showinfo("今日识别排行", "\n".join(lines))
+        except Exception as e:
+            logging.error(f"获取识别排行失败: {str(e)}")
+            messagebox.showerror("错误", f"获取识别排行失败:\n{str(e)}")
+    
     def refresh_data(self):
         """刷新数据"""
         self.load_person_data()
@@ -0,0 +1,160 @@
+"""
+人脸质量评估
+功能：
+1. 检测之后、提取特征之前的快速质量评估（尺寸、清晰度、亮度、MMOD置信度）
+2. 基于68个关键点的姿态估计（左右偏转、平面内旋转）
+3. 两级门限：低于识别门限跳过特征提取，低于入库门限跳过入库和API调用
+"""
+
+import math
+from typing import Optional
+
+import cv2
+import numpy as np
+
+
+class FaceQuality:
+    """单个人脸的质量评估结果"""
+
+    def __init__(self):
+        self.size = 0              # 人脸框短边长度(像素，原始分辨率)
+        self.confidence = None     # MMOD检测置信度
+        self.sharpness = 0.0       # 拉普拉斯方差
+        self.brightness = 0.0      # 灰度均值
+        self.yaw = None            # 左右偏转角(度)，需要关键点
+        self.roll = None           # 平面内旋转角(度)，需要关键点
+        self.score = 0.0           # 综合质量分 0~1
+        self.recognizable = True   # 是否值得提取特征并比对
+        self.enrollable = True     # 是否值得入库并调用API
+        self.reject_reason = None  # 未通过门限的原因
+
+    def __repr__(self):
+        return (f"FaceQuality(size={self.size}, conf={self.confidence}, sharp={self.sharpness:.1f}, "
+                f"bright={self.brightness:.0f}, yaw={self.yaw}, roll={self.roll}, score={self.score:.2f})")
+
+
+class FaceQualityAssessor:
+    """人脸质量评估器，所有门限均可在运行时调整"""
+
+    def __init__(self):
+        # 识别门限 - 低于该门限的人脸不提取特征
+        self.min_face_size = 40
+        self.min_confidence = 0.2
+        self.min_sharpness = 15.0
+        self.min_brightness = 35
+        self.max_brightness = 225
+        self.max_yaw = 45.0
+        self.max_roll = 35.0
+
+        # 入库门限 - 低于该门限的人脸不创建临时身份、不调用API
+        self.enroll_min_face_size = 60
+        self.enroll_min_confidence = 0.6
+        self.enroll_min_sharpness = 40.0
+        self.enroll_max_yaw = 30.0
+        self.enroll_max_roll = 20.0
+
+        # 清晰度计算使用的固定尺寸，保证不同大小的人脸可比且计算量恒定
+        self.sharpness_patch_size = 64
+
+    def assess(self, img, rect, confidence: Optional[float] = None) -> FaceQuality:
+        """
+        检测阶段的质量评估（不需要关键点）
+
+        Args:
+            img: RGB图像（原始分辨率）
+            rect: dlib.rectangle 人脸框（原始分辨率坐标）
+            confidence: MMOD检测置信度 face.confidence
+        """
+        quality = FaceQuality()
+        quality.confidence = confidence
+
+        top = max(0, rect.top())
+        bottom = min(img.shape[0], rect.bottom())
+        left = max(0, rect.left())
+        right = min(img.shape[1], rect.right())
+        quality.size = max(0, min(bottom - top, right - left))
+
+        if quality.size < self.min_face_size:
+            return self._reject(quality, 'size')
+        if confidence is not None and confidence < self.min_confidence:
+            return self._reject(quality, 'confidence')
+
+        patch = cv2.resize(img[top:bottom, left:right],
+                           (self.sharpness_patch_size, self.sharpness_patch_size),
+                           interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(patch, cv2.COLOR_RGB2GRAY)
+        quality.brightness = float(gray.mean())
+        quality.sharpness = float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+        if not self.min_brightness <= quality.brightness <= self.max_brightness:
+            return self._reject(quality, 'brightness')
+        if quality.sharpness < self.min_sharpness:
+            return self._reject(quality, 'sharpness')
+
+        self._update_score(quality)
+        quality.enrollable = self._enroll_gate(quality)
+        return quality
+
+    def assess_pose(self, quality: FaceQuality, shape) -> FaceQuality:
+        """关键点阶段的姿态评估，更新传入的质量结果"""
+        if not quality.recognizable:
+            return quality
+
+        points = np.array([(shape.part(i).x, shape.part(i).y) for i in (0, 16, 30, 36, 39, 42, 45)],
+                          dtype=np.float64)
+        jaw_left, jaw_right, nose, left_outer, left_inner, right_inner, right_outer = points
+
+        # 偏转角：鼻尖在左右下颌点之间的相对位置，正面时约为0.5
+        jaw_span = max(1.0, jaw_right[0] - jaw_left[0])
+        ratio = (nose[0] - jaw_left[0]) / jaw_span
+        quality.yaw = math.degrees(math.asin(float(np.clip((ratio - 0.5) * 2, -1.0, 1.0))))
+
+        # 平面内旋转角：两眼中心连线与水平线的夹角
+        left_eye = (left_outer + left_inner) / 2
+        right_eye = (right_inner + right_outer) / 2
+        quality.roll = math.degrees(math.atan2(right_eye[1] - left_eye[1], right_eye[0] - left_eye[0]))
+
+        if abs(quality.yaw) > self.max_yaw:
+            return self._reject(quality, 'yaw')
+        if abs(quality.roll) > self.max_roll:
+            return self._reject(quality, 'roll')
+
+        self._update_score(quality)
+        quality.enrollable = self._enroll_gate(quality)
+        return quality
+
+    def _enroll_gate(self, quality: FaceQuality) -> bool:
+        """入库门限判断"""
+        if quality.size < self.enroll_min_face_size:
+            return False
+        if quality.confidence is not None and quality.confidence < self.enroll_min_confidence:
+            return False
+        if quality.sharpness < self.enroll_min_sharpness:
+            return False
+        if quality.yaw is not None and abs(quality.yaw) > self.enroll_max_yaw:
+            return False
+        if quality.roll is not None and abs(quality.roll) > self.enroll_max_roll:
+            return False
+        return True
+
+    def _update_score(self, quality: FaceQuality):
+        """计算综合质量分，用作入库队列的优先级"""
+        size_score = min(1.0, quality.size / 120.0)
+        sharpness_score = min(1.0, quality.sharpness / 300.0)
+        # 亮度越接近中间值越好
+        brightness_score = max(0.0, 1.0 - abs(quality.brightness - 128) / 128)
+        confidence_score = 1.0 if quality.confidence is None else float(np.clip(quality.confidence, 0.0, 1.0))
+        pose_score = 1.0
+        if quality.yaw is not None:
+            pose_score = max(0.0, 1.0 - abs(quality.yaw) / 90.0) * max(0.0, 1.0 - abs(quality.roll) / 90.0)
+
+        quality.score = (size_score * 0.3 + sharpness_score * 0.25 + pose_score * 0.25 +
+                         confidence_score * 0.1 + brightness_score * 0.1)
+
+    @staticmethod
+    def _reject(quality: FaceQuality, reason: str) -> FaceQuality:
+        quality.recognizable = False
+        quality.enrollable = False
+        quality.reject_reason = reason
+        quality.score = 0.0
+        return quality
@@ -7,10 +7,12 @@ import base64
 import json
 import random
 import time
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g, Response
 from flask_cors import CORS
 import logging
 
+from metrics_exporter import CONTENT_TYPE, MetricsRegistry, register_process_metrics
+
 # 配置日志
 logging.basicConfig(
     level=logging.INFO,
@@ -20,6 +22,34 @@ logging.basicConfig(
 app = Flask(__name__)
 CORS(app)  # 允许跨域请求
 
+# 监控指标
+metrics_registry = MetricsRegistry()
+REQUESTS_TOTAL = metrics_registry.counter('face_api_requests', 'API请求数', ['endpoint', 'status'])
+REQUEST_LATENCY = metrics_registry.histogram('face_api_request_seconds', 'API请求耗时(秒)', ['endpoint'])
+REQUESTS_IN_FLIGHT = metrics_registry.gauge('face_api_requests_in_flight', '正在处理的API请求数')
+RECOGNITIONS_TOTAL = metrics_registry.counter('face_api_recognitions', '人脸识别结果数', ['result'])
+IMAGE_BYTES = metrics_registry.histogram('face_api_image_bytes', '接收到的图片大小(字节)',
+                                         buckets=(1024, 4096, 16384, 65536, 262144, 1048576))
+register_process_metrics(metrics_registry, 'face_api')
+
+
+@app.before_request
+def start_request_timer():
+    """记录请求开始时间"""
+    g.request_start = time.perf_counter()
+    REQUESTS_IN_FLIGHT.inc()
+
+
+@app.after_request
+def record_request_metrics(response):
+    """记录请求数与耗时（/metrics 自身除外）"""
+    REQUESTS_IN_FLIGHT.dec()
+    endpoint = request.url_rule.rule if request.url_rule else 'unknown'
+    if endpoint != '/metrics':
+        REQUESTS_TOTAL.labels(endpoint=endpoint, status=response.status_code).inc()
+        REQUEST_LATENCY.labels(endpoint=endpoint).observe(time.perf_counter() - g.request_start)
+    return response
+
 # 模拟的姓名库
 CHINESE_NAMES = [
     "张三", "李四", "王五", "赵六", "钱七", "孙八", "周九", "吴十",
@@ -140,6 +170,7 @@ def recognize_face():
             # 尝试解码base64数据
             image_data = base64.b64decode(image_base64)
             logging.info(f"接收到图片数据，大小: {len(image_data)} 字节")
+            IMAGE_BYTES.observe(len(image_data))
         except Exception as e:
             return jsonify({
                 'success': False,
@@ -168,6 +199,7 @@ def recognize_face():
                 }
             }
             logging.info(f"识别成功: {name} - {id_card}")
+            RECOGNITIONS_TOTAL.labels(result='success').inc()
         else:
             # 识别失败
             result = {
@@ -178,6 +210,7 @@ def recognize_face():
                 }
             }
             logging.info("识别失败: 无法识别该人脸")
+            RECOGNITIONS_TOTAL.labels(result='failure').inc()
         
         return jsonify(result)
         
@@ -197,6 +230,11 @@ def health_check():
         'timestamp': time.time()
     })
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """监控指标接口（Prometheus 文本格式）"""
+    return Response(metrics_registry.render(), content_type=CONTENT_TYPE)
+
 @app.route('/', methods=['GET'])
 def index():
     """根路径，返回API使用说明"""
@@ -205,7 +243,8 @@ def index():
         'version': '1.0.0',
         'endpoints': {
             'POST /api/recognize_face': '人脸识别接口',
-            'GET /api/health': '健康检查接口'
+            'GET /api/health': '健康检查接口',
+            'GET /metrics': '监控指标接口'
         },
         'usage': {
             'recognize_face': {
@@ -234,6 +273,7 @@ if __name__ == '__main__':
     print("API地址: http://localhost:5000")
     print("健康检查: http://localhost:5000/api/health")
     print("人脸识别: POST http://localhost:5000/api/recognize_face")
+    print("监控指标: http://localhost:5000/metrics")
     print("按 Ctrl+C 停止服务")
     
     app.run(host='0.0.0.0', port=5000, debug=False) 
\ No newline at end of file
@@ -0,0 +1,246 @@
+"""
+帧来源抽象
+功能：
+1. 统一的帧读取接口：屏幕截图、摄像头、视频文件、图片目录、录制的屏幕画面
+2. 回放时可按原始速度（实时）或尽可能快地读取，便于复现性能问题
+3. 屏幕/摄像头画面可录制到目录（PNG帧 + 时间戳），之后按原始节奏回放
+"""
+
+import csv
+import logging
+import os
+import time
+from typing import Iterator, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mkv', '.mov', '.wmv', '.flv')
+
+# 录制目录中的时间戳文件
+RECORD_INDEX_FILE = 'frames.csv'
+
+
+class FrameSource:
+    """帧来源基类：read() 返回 (RGB图像, 时间戳秒) 或 None（结束）"""
+
+    def __init__(self, realtime: bool = False):
+        """
+        Args:
+            realtime: 回放类来源是否按原始时间间隔读取（实时来源忽略该参数）
+        """
+        self.realtime = realtime
+        self.frames_read = 0
+        self._first_timestamp = None
+        self._start_clock = None
+
+    def _read(self) -> Optional[Tuple[np.ndarray, float]]:
+        raise NotImplementedError
+
+    def read(self) -> Optional[Tuple[np.ndarray, float]]:
+        """读取下一帧"""
+        item = self._read()
+        if item is None:
+            return None
+        if self.realtime:
+            self._pace(item[1])
+        self.frames_read += 1
+        return item
+
+    def _pace(self, timestamp: float):
+        """按原始时间间隔等待"""
+        now = time.perf_counter()
+        if self._first_timestamp is None:
+            self._first_timestamp = timestamp
+            self._start_clock = now
+            return
+        delay = (timestamp - self._first_timestamp) - (now - self._start_clock)
+        if delay > 0:
+            time.sleep(delay)
+
+    def __iter__(self) -> Iterator[Tuple[np.ndarray, float]]:
+        while True:
+            item = self.read()
+            if item is None:
+                return
+            yield item
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class ScreenSource(FrameSource):
+    """屏幕截图（mss）"""
+
+    def __init__(self, monitor: Optional[dict] = None):
+        super().__init__()
+        import mss
+        self.sct = mss.mss()
+        # 默认截取主显示器
+        self.monitor = monitor or self.sct.monitors[1]
+
+    def _read(self):
+        img = np.array(self.sct.grab(self.monitor))
+        return cv2.cvtColor(img, cv2.COLOR_BGRA2RGB), time.time()
+
+    def close(self):
+        self.sct.close()
+
+
+class CameraSource(FrameSource):
+    """摄像头（cv2.VideoCapture）"""
+
+    def __init__(self, index: int = 0):
+        super().__init__()
+        self.cap = cv2.VideoCapture(index)
+        if not self.cap.isOpened():
+            raise IOError(f"无法打开摄像头: {index}")
+
+    def _read(self):
+        ok, frame = self.cap.read()
+        if not ok:
+            return None
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), time.time()
+
+    def close(self):
+        self.cap.release()
+
+
+class VideoFileSource(FrameSource):
+    """视频文件回放"""
+
+    def __init__(self, path: str, realtime: bool = False, loop: bool = False):
+        super().__init__(realtime)
+        self.path = path
+        self.loop = loop
+        self.cap = cv2.VideoCapture(path)
+        if not self.cap.isOpened():
+            raise IOError(f"无法打开视频文件: {path}")
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 25.0
+        self._loop_offset = 0.0
+        self._last_timestamp = 0.0
+
+    def _read(self):
+        ok, frame = self.cap.read()
+        if not ok and self.loop:
+            # 循环回放时时间戳继续递增
+            self._loop_offset = self._last_timestamp + 1.0 / self.fps
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, frame = self.cap.read()
+        if not ok:
+            return None
+        timestamp = self._loop_offset + self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+        self._last_timestamp = timestamp
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), timestamp
+
+    def close(self):
+        self.cap.release()
+
+
+class ImageDirectorySource(FrameSource):
+    """
+    图片目录回放
+
+    目录中存在 frames.csv（由 FrameRecorder 生成）时按记录的时间戳回放，
+    否则按文件名排序、以 fps 的固定间隔回放。
+    """
+
+    def __init__(self, path: str, realtime: bool = False, fps: float = 25.0, loop: bool = False):
+        super().__init__(realtime)
+        self.path = path
+        self.fps = fps
+        self.loop = loop
+        self.entries = self._load_index()
+        if not self.entries:
+            raise IOError(f"目录中没有图片: {path}")
+        self._index = 0
+        self._loop_offset = 0.0
+
+    def _load_index(self) -> List[Tuple[str, float]]:
+        index_path = os.path.join(self.path, RECORD_INDEX_FILE)
+        if os.path.exists(index_path):
+            with open(index_path, newline='', encoding='utf-8') as f:
+                return [(row['file'], float(row['timestamp'])) for row in csv.DictReader(f)]
+        files = sorted(f for f in os.listdir(self.path) if f.lower().endswith(IMAGE_EXTENSIONS))
+        return [(f, i / self.fps) for i, f in enumerate(files)]
+
+    def _read(self):
+        while True:
+            if self._index >= len(self.entries):
+                if not self.loop:
+                    return None
+                self._loop_offset += self.entries[-1][1] - self.entries[0][1] + 1.0 / self.fps
+                self._index = 0
+            filename, timestamp = self.entries[self._index]
+            self._index += 1
+            # 使用 np.fromfile 读取，兼容中文路径
+            img = cv2.imdecode(np.fromfile(os.path.join(self.path, filename), dtype=np.uint8), cv2.IMREAD_COLOR)
+            if img is None:
+                logging.warning(f"无法读取图像: {filename}")
+                continue
+            return cv2.cvtColor(img, cv2.COLOR_BGR2RGB), self._loop_offset + timestamp
+
+
+class FrameRecorder:
+    """将帧录制到目录（PNG + frames.csv），供 ImageDirectorySource 按原始节奏回放"""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._index_file = open(os.path.join(path, RECORD_INDEX_FILE), 'w', newline='', encoding='utf-8')
+        self._writer = csv.writer(self._index_file)
+        self._writer.writerow(['file', 'timestamp'])
+        self._start = None
+        self.count = 0
+
+    def write(self, frame: np.ndarray, timestamp: float):
+        """写入一帧RGB图像"""
+        if self._start is None:
+            self._start = timestamp
+        self.count += 1
+        filename = f"frame_{self.count:06d}.png"
+        ok, encoded = cv2.imencode('.png', cv2.cvtColor(frame, cv2.COLOR_RGB2BGR))
+        if not ok:
+            logging.error(f"帧编码失败: {filename}")
+            return
+        encoded.tofile(os.path.join(self.path, filename))
+        self._writer.writerow([filename, f"{timestamp - self._start:.6f}"])
+
+    def close(self):
+        self._index_file.close()
+        logging.info(f"已录制 {self.count} 帧到: {self.path}")
+
+
+def open_source(spec: str, realtime: bool = False, loop: bool = False, fps: float = 25.0) -> FrameSource:
+    """
+    根据描述创建帧来源
+
+    Args:
+        spec: 'screen'、'camera' / 'camera:1'、视频文件路径或图片目录路径
+        realtime: 回放时是否按原始速度
+        loop: 回放结束后是否从头循环
+        fps: 无时间戳的图片目录的回放帧率
+    """
+    if spec == 'screen':
+        return ScreenSource()
+    if spec == 'camera' or spec.startswith('camera:'):
+        index = int(spec.split(':', 1)[1]) if ':' in spec else 0
+        return CameraSource(index)
+    if os.path.isdir(spec):
+        return ImageDirectorySource(spec, realtime=realtime, fps=fps, loop=loop)
+    if os.path.isfile(spec):
+        if spec.lower().endswith(IMAGE_EXTENSIONS):
+            # 单张图片按单帧目录处理
+            directory, filename = os.path.split(os.path.abspath(spec))
+            source = ImageDirectorySource(directory, realtime=realtime, fps=fps, loop=loop)
+            source.entries = [(filename, 0.0)]
+            return source
+        return VideoFileSource(spec, realtime=realtime, loop=loop)
+    raise ValueError(f"无法识别的帧来源: {spec}")
@@ -0,0 +1,180 @@
+"""
+人脸库二进制交换格式（.fgal）
+功能：
+1. 特征矩阵（默认 float64，与数据库中的特征精度一致，重复导入时特征哈希不变；可选 float32 减小体积）+ 每行所属人员下标 + 人员信息（姓名、身份证号、真实身份、临时/重点标记）
+2. 带版本号的文件头，正文可选 zstd（需安装 zstandard）或 deflate 压缩
+3. 正文 SHA-256 校验，读取时校验不通过直接报错，避免导入损坏的数据
+4. 整体读写为连续内存块，在站点之间迁移人脸库时比逐行解析CSV快得多
+
+文件布局：
+    b'FGAL' | 版本 uint16 | 压缩方式 uint8 | 保留 uint8 | 文件头长度 uint32 | 文件头JSON | 正文(按压缩方式)
+    正文 = 特征 float64/float32[N, dim]（文件头 dtype，版本1固定为 float32） | 人员下标 int32[N] | 人员信息JSON
+"""
+
+import hashlib
+import json
+import struct
+import time
+import zlib
+from typing import Dict, List, Optional
+
+import numpy as np
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+MAGIC = b'FGAL'
+VERSION = 2  # 版本2：文件头记录特征的 dtype
+FILE_EXTENSION = '.fgal'
+
+CODEC_NONE = 0
+CODEC_DEFLATE = 1
+CODEC_ZSTD = 2
+CODEC_NAMES = {'none': CODEC_NONE, 'deflate': CODEC_DEFLATE, 'zstd': CODEC_ZSTD}
+
+_PREAMBLE = struct.Struct('<4sHBBI')
+_DECOMPRESS_ERRORS = (zlib.error, zstandard.ZstdError) if ZSTD_AVAILABLE else (zlib.error,)
+
+# 特征精度 -> 存储 dtype
+DTYPES = {'f8': '<f8', 'f4': '<f4'}
+
+# 人员信息字段（与 persons 表一致）
+PERSON_FIELDS = ('name', 'id_card', 'real_name', 'real_id_card', 'is_temp', 'is_important')
+
+
+class GalleryArchive:
+    """读取后的人脸库"""
+
+    def __init__(self, features: np.ndarray, person_index: np.ndarray, persons: List[Dict], header: Dict):
+        self.features = features          # (N, dim) float64 或 float32（见 header['dtype']）
+        self.person_index = person_index  # (N,) int32，指向 persons
+        self.persons = persons
+        self.header = header
+
+    def __len__(self):
+        return len(self.features)
+
+    def names(self) -> List[str]:
+        """每行特征对应的人员姓名"""
+        return [self.persons[i]['name'] for i in self.person_index]
+
+
+def _resolve_codec(codec: str) -> int:
+    if codec == 'auto':
+        return CODEC_ZSTD if ZSTD_AVAILABLE else CODEC_DEFLATE
+    if codec not in CODEC_NAMES:
+        raise ValueError(f"未知的压缩方式: {codec}")
+    if codec == 'zstd' and not ZSTD_AVAILABLE:
+        raise ValueError("zstd 压缩需要安装 zstandard: pip install zstandard")
+    return CODEC_NAMES[codec]
+
+
+def write_gallery_archive(path: str, features: np.ndarray, person_index: np.ndarray,
+                          persons: List[Dict], codec: str = 'auto', level: Optional[int] = None,
+                          dtype: str = 'f8') -> Dict:
+    """
+    写入人脸库文件
+
+    Args:
+        path: 输出路径（建议使用 .fgal 扩展名）
+        features: (N, dim) 特征矩阵，写入时转换为 dtype
+        person_index: (N,) 每行特征所属人员在 persons 中的下标
+        persons: 人员信息列表，字段见 PERSON_FIELDS
+        codec: 'auto'、'zstd'、'deflate' 或 'none'
+        level: 压缩级别，None 使用默认值
+        dtype: 'f8'（float64，保持数据库中的精度，导回数据库时不会因哈希不同而重复）或 'f4'（float32，体积减半）
+
+    Returns:
+        文件头信息
+    """
+    if dtype not in DTYPES:
+        raise ValueError(f"未知的特征精度: {dtype}")
+    features = np.ascontiguousarray(features, dtype=DTYPES[dtype]).reshape(len(features), -1)
+    person_index = np.ascontiguousarray(person_index, dtype='<i4')
+    if len(person_index) != len(features):
+        raise ValueError("特征数与人员下标数不一致")
+    if len(person_index) and (person_index.min() < 0 or person_index.max() >= len(persons)):
+        raise ValueError("人员下标超出范围")
+
+    persons_json = json.dumps([{field: person.get(field) for field in PERSON_FIELDS} for person in persons],
+                              ensure_ascii=False).encode('utf-8')
+    parts = (features.tobytes(), person_index.tobytes(), persons_json)
+
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part)
+
+    codec_id = _resolve_codec(codec)
+    if codec_id == CODEC_ZSTD:
+        body = zstandard.ZstdCompressor(level=level if level is not None else 3).compress(b''.join(parts))
+    elif codec_id == CODEC_DEFLATE:
+        body = zlib.compress(b''.join(parts), level if level is not None else 6)
+    else:
+        body = b''.join(parts)
+
+    header = {
+        'count': int(features.shape[0]),
+        'dim': int(features.shape[1]) if features.ndim == 2 and features.shape[0] else 128,
+        'persons': len(persons),
+        'dtype': DTYPES[dtype],
+        'features_bytes': len(parts[0]),
+        'index_bytes': len(parts[1]),
+        'persons_bytes': len(parts[2]),
+        'sha256': digest.hexdigest(),
+        'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+    header_bytes = json.dumps(header).encode('utf-8')
+
+    with open(path, 'wb') as f:
+        f.write(_PREAMBLE.pack(MAGIC, VERSION, codec_id, 0, len(header_bytes)))
+        f.write(header_bytes)
+        f.write(body)
+    return header
+
+
+def read_gallery_archive(path: str) -> GalleryArchive:
+    """
+    读取人脸库文件并校验
+
+    Raises:
+        ValueError: 文件格式、版本不支持或校验失败
+    """
+    with open(path, 'rb') as f:
+        preamble = f.read(_PREAMBLE.size)
+        if len(preamble) < _PREAMBLE.size:
+            raise ValueError(f"不是有效的人脸库文件: {path}")
+        magic, version, codec_id, _, header_len = _PREAMBLE.unpack(preamble)
+        if magic != MAGIC:
+            raise ValueError(f"不是有效的人脸库文件: {path}")
+        if version > VERSION:
+            raise ValueError(f"人脸库文件版本 {version} 高于当前支持的版本 {VERSION}")
+        header = json.loads(f.read(header_len).decode('utf-8'))
+        body = f.read()
+
+    if codec_id == CODEC_ZSTD and not ZSTD_AVAILABLE:
+        raise ValueError("该文件使用 zstd 压缩，需要安装 zstandard: pip install zstandard")
+    try:
+        if codec_id == CODEC_ZSTD:
+            body = zstandard.ZstdDecompressor().decompress(
+                body, max_output_size=header['features_bytes'] + header['index_bytes'] + header['persons_bytes'])
+        elif codec_id == CODEC_DEFLATE:
+            body = zlib.decompress(body)
+        elif codec_id != CODEC_NONE:
+            raise ValueError(f"未知的压缩方式: {codec_id}")
+    except _DECOMPRESS_ERRORS as e:
+        raise ValueError(f"人脸库文件解压失败（文件可能已损坏）: {path}: {str(e)}")
+
+    if hashlib.sha256(body).hexdigest() != header['sha256']:
+        raise ValueError(f"人脸库文件校验失败（文件可能已损坏）: {path}")
+
+    features_end = header['features_bytes']
+    index_end = features_end + header['index_bytes']
+    # 版本1的文件头没有 dtype，特征为 float32
+    features = np.frombuffer(body, dtype=header.get('dtype', '<f4'),
+                             count=header['count'] * header['dim']).reshape(header['count'], header['dim'])
+    person_index = np.frombuffer(body, dtype='<i4', count=header['count'], offset=features_end)
+    persons = json.loads(body[index_end:].decode('utf-8'))
+    return GalleryArchive(features, person_index, persons, header)
@@ -0,0 +1,313 @@
+"""
+Prometheus 文本格式指标导出
+功能：
+1. 计数器(Counter)、仪表(Gauge)、直方图(Histogram)，支持标签
+2. 按 Prometheus 文本格式(0.0.4)输出，供 /metrics 接口返回
+3. 基于标准库 http.server 的轻量 /metrics 服务（后台线程），无需额外依赖
+"""
+
+import logging
+import math
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# 默认的延迟直方图分桶(秒)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if value == -math.inf:
+        return '-Inf'
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+def _escape_label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence) -> str:
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{_escape_label(value)}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class _Metric:
+    """指标基类：按标签值分组保存数据"""
+
+    TYPE = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self._values = {}     # label_values -> 数据
+        self._function = None  # 采集时调用的回调，返回当前值
+
+    def _key(self, args, kwargs) -> Tuple:
+        if kwargs:
+            args = tuple(kwargs[name] for name in self.labelnames)
+        if len(args) != len(self.labelnames):
+            raise ValueError(f"指标 {self.name} 需要标签 {self.labelnames}")
+        return tuple(str(value) for value in args)
+
+    def labels(self, *args, **kwargs) -> '_BoundMetric':
+        """绑定一组标签值"""
+        return _BoundMetric(self, self._key(args, kwargs))
+
+    def set_function(self, function: Callable[[], Optional[float]]):
+        """设置采集回调（无标签指标），采集时取回调的返回值，返回None表示暂无数据"""
+        self._function = function
+
+    def _samples(self) -> List[Tuple[str, Tuple, float]]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.TYPE}']
+        for suffix, label_pairs, value in self._samples():
+            names = [pair[0] for pair in label_pairs]
+            values = [pair[1] for pair in label_pairs]
+            lines.append(f'{self.name}{suffix}{_format_labels(names, values)} {_format_value(value)}')
+        return '\n'.join(lines)
+
+
+class _BoundMetric:
+    """绑定了标签值的指标"""
+
+    def __init__(self, metric: _Metric, key: Tuple):
+        self._metric = metric
+        self._key = key
+
+    def inc(self, amount: float = 1):
+        self._metric._inc(self._key, amount)
+
+    def dec(self, amount: float = 1):
+        self._metric._inc(self._key, -amount)
+
+    def set(self, value: float):
+        self._metric._set(self._key, value)
+
+    def observe(self, value: float):
+        self._metric._observe(self._key, value)
+
+
+class Counter(_Metric):
+    """单调递增计数器"""
+
+    TYPE = 'counter'
+
+    def inc(self, amount: float = 1):
+        self._inc((), amount)
+
+    def _inc(self, key: Tuple, amount: float):
+        if amount < 0:
+            raise ValueError("计数器只能递增")
+        with self.lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        if self._function is not None:
+            value = self._function()
+            return [('_total', (), value)] if value is not None else []
+        with self.lock:
+            items = list(self._values.items())
+        return [('_total', tuple(zip(self.labelnames, key)), value) for key, value in items]
+
+
+class Gauge(_Metric):
+    """可增可减的仪表"""
+
+    TYPE = 'gauge'
+
+    def set(self, value: float):
+        self._set((), value)
+
+    def inc(self, amount: float = 1):
+        self._inc((), amount)
+
+    def dec(self, amount: float = 1):
+        self._inc((), -amount)
+
+    def _set(self, key: Tuple, value: float):
+        with self.lock:
+            self._values[key] = value
+
+    def _inc(self, key: Tuple, amount: float):
+        with self.lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        if self._function is not None:
+            value = self._function()
+            return [('', (), value)] if value is not None else []
+        with self.lock:
+            items = list(self._values.items())
+        return [('', tuple(zip(self.labelnames, key)), value) for key, value in items]
+
+
+class Histogram(_Metric):
+    """累积分桶直方图"""
+
+    TYPE = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float):
+        self._observe((), value)
+
+    def _observe(self, key: Tuple, value: float):
+        with self.lock:
+            data = self._values.get(key)
+            if data is None:
+                # [各分桶计数..., 总和, 总数]
+                data = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    data[i] += 1
+            data[-2] += value
+            data[-1] += 1
+
+    def _samples(self):
+        with self.lock:
+            items = [(key, list(data)) for key, data in self._values.items()]
+        samples = []
+        for key, data in items:
+            base = tuple(zip(self.labelnames, key))
+            for bound, count in zip(self.buckets, data):
+                samples.append(('_bucket', base + (('le', _format_value(float(bound))),), count))
+            samples.append(('_bucket', base + (('le', '+Inf'),), data[-1]))
+            samples.append(('_sum', base, data[-2]))
+            samples.append(('_count', base, data[-1]))
+        return samples
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._metrics = {}  # type: Dict[str, _Metric]
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self.lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """输出全部指标（Prometheus 文本格式）"""
+        with self.lock:
+            metrics = list(self._metrics.values())
+        blocks = []
+        for metric in metrics:
+            try:
+                blocks.append(metric.render())
+            except Exception as e:
+                logging.warning(f"采集指标 {metric.name} 失败: {str(e)}")
+        return '\n'.join(blocks) + '\n'
+
+
+def process_memory_bytes() -> Optional[int]:
+    """当前进程的常驻内存(字节)，无法获取时返回None"""
+    try:
+        import psutil
+        return psutil.Process(os.getpid()).memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def register_process_metrics(registry: MetricsRegistry, prefix: str):
+    """注册进程内存指标"""
+    registry.gauge(f'{prefix}_process_resident_memory_bytes',
+                   '进程常驻内存(字节)').set_function(process_memory_bytes)
+
+
+class MetricsServer:
+    """后台线程运行的 /metrics HTTP 服务"""
+
+    def __init__(self, registry: MetricsRegistry, port: int = 9108, host: str = '127.0.0.1',
+                 port_retries: int = 10):
+        """
+        Args:
+            registry: 指标注册表
+            port: 起始端口，被占用时依次尝试后续端口（同机运行多个监控实例）
+            host: 监听地址，默认只监听本机
+            port_retries: 最多尝试的端口数
+        """
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.port_retries = port_retries
+        self._server = None
+        self._thread = None
+
+    def start(self) -> Optional[int]:
+        """启动服务，返回实际监听的端口，失败返回None"""
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # 抓取请求很频繁，不写入日志
+                pass
+
+        for port in range(self.port, self.port + self.port_retries):
+            try:
+                self._server = ThreadingHTTPServer((self.host, port), Handler)
+            except OSError:
+                continue
+            self._server.daemon_threads = True
+            self.port = port
+            self._thread = threading.Thread(target=self._server.serve_forever, name='metrics-server', daemon=True)
+            self._thread.start()
+            logging.info(f"指标服务已启动: http://{self.host}:{port}/metrics")
+            return port
+
+        logging.error(f"指标服务启动失败: 端口 {self.port}-{self.port + self.port_retries - 1} 均被占用")
+        return None
+
+    def stop(self):
+        """停止服务"""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
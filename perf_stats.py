@@ -0,0 +1,143 @@
+"""
+分阶段耗时统计
+功能：
+1. 记录每帧各处理阶段（截屏、颜色转换、缩放、检测、关键点、特征提取、比对、入库、绘制）的耗时
+2. 滚动窗口内计算 p50/p95/p99，用于状态栏显示
+3. 定期将统计结果写入日志，便于定位超出帧预算的阶段
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+class PerfStats:
+    """轻量级的分阶段耗时统计（线程安全）"""
+
+    # 显示顺序
+    STAGES = ['grab', 'convert', 'resize', 'detect', 'quality', 'landmarks',
+              'descriptor', 'match', 'enqueue', 'db_write', 'draw', 'frame']
+
+    def __init__(self, window: int = 300, refresh_interval: float = 0.5):
+        """
+        初始化统计器
+
+        Args:
+            window: 每个阶段保留的最近样本数
+            refresh_interval: 百分位数缓存的刷新间隔(秒)，避免每帧重复排序
+        """
+        self.window = window
+        self.refresh_interval = refresh_interval
+        self.lock = threading.Lock()
+
+        self._samples = {}        # type: Dict[str, deque]
+        self._frame_totals = {}   # 当前帧内各阶段的累计耗时(秒)
+        self._frame_start = None
+        self._frame_thread = None  # 只有帧循环所在线程的计时按帧累加
+        self._summary = {}
+        self._summary_time = 0.0
+
+        # 每条样本的回调 (stage, seconds)，用于同步到指标导出等
+        self.listeners = []
+
+    def record(self, stage: str, seconds: float):
+        """直接记录一次耗时（用于不属于帧循环的阶段，如后台线程的入库）"""
+        with self.lock:
+            samples = self._samples.get(stage)
+            if samples is None:
+                samples = self._samples[stage] = deque(maxlen=self.window)
+            samples.append(seconds * 1000.0)
+        for listener in self.listeners:
+            try:
+                listener(stage, seconds)
+            except Exception as e:
+                logging.debug(f"耗时统计回调出错: {str(e)}")
+
+    def begin_frame(self):
+        """开始一帧的计时"""
+        with self.lock:
+            self._frame_totals = {}
+            self._frame_start = time.perf_counter()
+            self._frame_thread = threading.get_ident()
+
+    def end_frame(self):
+        """结束一帧：按帧记录各阶段累计耗时以及整帧耗时"""
+        with self.lock:
+            if self._frame_start is None:
+                return
+            totals = self._frame_totals
+            totals['frame'] = time.perf_counter() - self._frame_start
+            self._frame_totals = {}
+            self._frame_start = None
+        for stage, seconds in totals.items():
+            self.record(stage, seconds)
+
+    @contextmanager
+    def measure(self, stage: str):
+        """
+        计时上下文：帧内同一阶段多次出现（如多张人脸）时按帧累加
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                if self._frame_start is not None and self._frame_thread == threading.get_ident():
+                    self._frame_totals[stage] = self._frame_totals.get(stage, 0.0) + elapsed
+                    return
+            self.record(stage, elapsed)
+
+    def summary(self, force: bool = False) -> Dict[str, Dict[str, float]]:
+        """
+        返回各阶段的统计结果 {stage: {'p50', 'p95', 'p99', 'count'}}，单位毫秒
+        """
+        now = time.time()
+        with self.lock:
+            if not force and now - self._summary_time < self.refresh_interval:
+                return self._summary
+            snapshot = {stage: list(samples) for stage, samples in self._samples.items() if samples}
+
+        summary = {}
+        for stage, values in snapshot.items():
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            summary[stage] = {'p50': float(p50), 'p95': float(p95), 'p99': float(p99), 'count': len(values)}
+
+        with self.lock:
+            self._summary = summary
+            self._summary_time = now
+        return summary
+
+    def ordered_stages(self, summary: Dict[str, Dict[str, float]]) -> List[str]:
+        """按处理顺序排列已有数据的阶段"""
+        known = [stage for stage in PerfStats.STAGES if stage in summary]
+        return known + sorted(stage for stage in summary if stage not in PerfStats.STAGES)
+
+    def format_lines(self, summary: Optional[Dict[str, Dict[str, float]]] = None) -> List[str]:
+        """格式化为每阶段一行的文本"""
+        if summary is None:
+            summary = self.summary()
+        return [f"{stage:<10} {summary[stage]['p50']:6.1f} {summary[stage]['p95']:6.1f} {summary[stage]['p99']:6.1f}"
+                for stage in self.ordered_stages(summary)]
+
+    def log_summary(self, prefix: str = "阶段耗时"):
+        """将当前统计写入日志"""
+        summary = self.summary(force=True)
+        if not summary:
+            return
+        parts = [f"{stage}={summary[stage]['p50']:.1f}/{summary[stage]['p95']:.1f}/{summary[stage]['p99']:.1f}"
+                 for stage in self.ordered_stages(summary)]
+        logging.info(f"{prefix}(ms, p50/p95/p99, 最近{self.window}帧): " + ", ".join(parts))
+
+    def reset(self):
+        """清空全部统计"""
+        with self.lock:
+            self._samples.clear()
+            self._frame_totals = {}
+            self._summary = {}
+            self._summary_time = 0.0
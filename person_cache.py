@@ -0,0 +1,132 @@
+"""
+人员信息缓存（内存）
+功能：
+1. 按人员ID和 (姓名, 身份证号) 两种键缓存 persons 表的人员信息，识别循环中判断重点关注等身份信息时不访问SQLite
+2. 加载内存人脸库时一次性填充；未命中时由调用方读库后写入（read-through）
+3. 查无此人的键同样缓存，避免每帧重复查询不存在的人员；写入新人员后清除这些记录
+4. 修改、删除人员时由数据库管理器同步更新缓存；其他进程修改人员后，数据库管理器按人脸库版本发现变化并整体清空缓存
+"""
+
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+# persons 表列（即 get_person_by_id 返回的字典字段）
+PERSON_COLUMNS = ('id', 'name', 'id_card', 'real_name', 'real_id_card', 'is_temp', 'is_important',
+                  'created_time', 'updated_time')
+
+
+class PersonCache:
+    """按ID和 (姓名, 身份证号) 索引的人员信息缓存，线程安全"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_id: Dict[int, Dict] = {}
+        self._by_key: Dict[Tuple[str, Optional[str]], int] = {}
+        self._missing_ids = set()
+        self._missing_keys = set()
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    @staticmethod
+    def person_from_row(row) -> Dict:
+        """按 PERSON_COLUMNS 顺序的查询结果行转为人员信息字典"""
+        person = dict(zip(PERSON_COLUMNS, row))
+        person['is_temp'] = bool(person['is_temp'])
+        person['is_important'] = bool(person['is_important'])
+        return person
+
+    def load(self, persons: Iterable[Dict]):
+        """用全部人员信息替换缓存"""
+        with self._lock:
+            self._by_id = {}
+            self._by_key = {}
+            self._missing_ids.clear()
+            self._missing_keys.clear()
+            for person in persons:
+                self._put(person)
+
+    def get(self, person_id: int) -> Tuple[bool, Optional[Dict]]:
+        """
+        按人员ID查找
+
+        Returns:
+            (是否命中, 人员信息副本)；命中但人员不存在时为 (True, None)
+        """
+        with self._lock:
+            person = self._by_id.get(person_id)
+            if person is not None:
+                return True, dict(person)
+            return person_id in self._missing_ids, None
+
+    def get_by_name_id(self, name: str, id_card: str) -> Tuple[bool, Optional[Dict]]:
+        """按 (姓名, 身份证号) 查找，返回值同 get"""
+        key = (name, id_card)
+        with self._lock:
+            person_id = self._by_key.get(key)
+            if person_id is not None:
+                return True, dict(self._by_id[person_id])
+            return key in self._missing_keys, None
+
+    def put(self, person: Dict):
+        """写入（或替换）人员信息"""
+        with self._lock:
+            self._put(person)
+
+    def _put(self, person: Dict):
+        old = self._by_id.get(person['id'])
+        if old is not None:
+            self._by_key.pop((old['name'], old['id_card']), None)
+        self._by_id[person['id']] = dict(person)
+        self._by_key[(person['name'], person['id_card'])] = person['id']
+        self._missing_ids.discard(person['id'])
+        self._missing_keys.discard((person['name'], person['id_card']))
+
+    def mark_missing(self, person_id: int = None, name: str = None, id_card: str = None):
+        """记录查无此人的ID或 (姓名, 身份证号)"""
+        with self._lock:
+            if person_id is not None:
+                self._missing_ids.add(person_id)
+            if name is not None:
+                self._missing_keys.add((name, id_card))
+
+    def update(self, person_id: int, **fields) -> bool:
+        """更新已缓存人员的部分字段（值为None的字段不更新），人员不在缓存中时返回False"""
+        with self._lock:
+            person = self._by_id.get(person_id)
+            if person is None:
+                return False
+            for field, value in fields.items():
+                if value is not None:
+                    person[field] = value
+            return True
+
+    def discard(self, person_id: int):
+        """移除人员，下次查询时重新读库"""
+        with self._lock:
+            person = self._by_id.pop(person_id, None)
+            if person is not None:
+                self._by_key.pop((person['name'], person['id_card']), None)
+
+    def remove(self, person_ids: Iterable[int]):
+        """人员已从数据库删除：移除并记为不存在"""
+        with self._lock:
+            for person_id in person_ids:
+                person = self._by_id.pop(person_id, None)
+                if person is not None:
+                    self._by_key.pop((person['name'], person['id_card']), None)
+                    self._missing_keys.add((person['name'], person['id_card']))
+                self._missing_ids.add(person_id)
+
+    def forget_missing(self):
+        """写入新人员后清除查无此人的记录"""
+        with self._lock:
+            self._missing_ids.clear()
+            self._missing_keys.clear()
+
+    def clear(self):
+        with self._lock:
+            self._by_id.clear()
+            self._by_key.clear()
+            self._missing_ids.clear()
+            self._missing_keys.clear()
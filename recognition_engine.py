@@ -0,0 +1,249 @@
+"""
+无界面人脸识别引擎
+功能：
+1. 加载Dlib模型（CNN人脸检测、68点关键点、ResNet特征提取）并检测GPU可用性
+2. process(frame) 完成 缩放 -> 检测 -> 质量评估 -> 关键点 -> 特征提取 -> 比对 的完整流程
+3. 不依赖 Tkinter、系统托盘和 Windows API，可用于批处理、服务和性能测试
+"""
+
+import logging
+import os
+from typing import Callable, List, Optional, Tuple
+
+import cv2
+import dlib
+import numpy as np
+
+from face_quality import FaceQuality, FaceQualityAssessor
+from perf_stats import PerfStats
+
+DEFAULT_MODEL_DIR = 'data/data_dlib'
+
+
+def detect_gpu_availability():
+    """检测GPU可用性"""
+    try:
+        # 检查dlib是否支持CUDA
+        if hasattr(dlib, 'DLIB_USE_CUDA') and dlib.DLIB_USE_CUDA:  # type: ignore
+            # 检查CUDA设备数量
+            if hasattr(dlib, 'cuda') and hasattr(dlib.cuda, 'get_num_devices'):  # type: ignore
+                num_devices = dlib.cuda.get_num_devices()  # type: ignore
+                if num_devices > 0:
+                    logging.info(f"检测到 {num_devices} 个CUDA设备，启用GPU加速")
+                    return True, num_devices
+                else:
+                    logging.warning("dlib支持CUDA但未检测到可用的GPU设备")
+                    return False, 0
+            else:
+                logging.warning("dlib支持CUDA但无法获取设备信息")
+                return False, 0
+        else:
+            logging.info("dlib未编译CUDA支持，使用CPU模式")
+            return False, 0
+    except Exception as e:
+        logging.error(f"GPU检测过程中出错: {e}")
+        return False, 0
+
+
+def load_models(model_dir: str = DEFAULT_MODEL_DIR):
+    """
+    加载Dlib预训练模型
+
+    Returns:
+        (cnn_face_detector, predictor, face_reco_model)
+    """
+    cnn_face_detector = dlib.cnn_face_detection_model_v1(os.path.join(model_dir, 'mmod_human_face_detector.dat'))  # type: ignore
+    predictor = dlib.shape_predictor(os.path.join(model_dir, 'shape_predictor_68_face_landmarks.dat'))  # type: ignore
+    face_reco_model = dlib.face_recognition_model_v1(os.path.join(model_dir, 'dlib_face_recognition_resnet_model_v1.dat'))  # type: ignore
+    return cnn_face_detector, predictor, face_reco_model
+
+
+class FaceResult:
+    """单个人脸的识别结果"""
+
+    def __init__(self, rect, quality: FaceQuality):
+        self.rect = rect                # dlib.rectangle，原始分辨率坐标
+        self.position = (rect.left(), rect.top(), rect.right(), rect.bottom())
+        self.quality = quality
+        self.shape = None               # 68点关键点（质量不足时为None）
+        self.feature = None             # 128维特征（质量不足时为None）
+        self.known = False
+        self.name = "Unknown"           # 显示名称，优先使用真实姓名
+        self.person_id = None
+        self.person_name = None
+        self.real_name = None
+        self.is_important = False
+        self.distance = None
+        self.match_source = None        # 'database' / 'memory'
+
+    @property
+    def recognizable(self) -> bool:
+        return self.quality.recognizable
+
+    def to_dict(self) -> dict:
+        """转换为可序列化的字典（不含关键点和特征）"""
+        return {
+            'position': list(self.position),
+            'known': self.known,
+            'name': self.name,
+            'person_id': self.person_id,
+            'person_name': self.person_name,
+            'real_name': self.real_name,
+            'is_important': self.is_important,
+            'distance': self.distance,
+            'match_source': self.match_source,
+            'quality_score': round(self.quality.score, 3),
+            'reject_reason': self.quality.reject_reason,
+        }
+
+
+class RecognitionEngine:
+    """无界面的人脸检测与识别流程"""
+
+    def __init__(self, db_manager, models: Optional[Tuple] = None,
+                 quality_assessor: Optional[FaceQualityAssessor] = None,
+                 perf: Optional[PerfStats] = None, recognition_threshold: float = 0.48,
+                 image_scale: float = 0.5):
+        """
+        初始化识别引擎
+
+        Args:
+            db_manager: FaceDatabaseManager 实例
+            models: (cnn_face_detector, predictor, face_reco_model)，为None时从默认目录加载
+            quality_assessor: 人脸质量评估器
+            perf: 分阶段耗时统计
+            recognition_threshold: 识别阈值
+            image_scale: 检测前的图像缩放比例
+        """
+        self.db_manager = db_manager
+        self.cnn_face_detector, self.predictor, self.face_reco_model = models or load_models()
+        self.quality_assessor = quality_assessor or FaceQualityAssessor()
+        self.perf = perf or PerfStats()
+        self.recognition_threshold = recognition_threshold
+        self.image_scale = image_scale
+
+        # 内存中的已知人脸（数据库检索未命中时的补充比对）
+        self.face_feature_known_list = []
+        self.face_name_known_list = []
+        self.face_image_data_list = []
+        self.real_name_known_list = []
+        self.person_id_known_list = []
+
+        # 未知人脸且质量达到入库门限时的回调 (img, result)，为None时不入库
+        self.on_unknown_face = None  # type: Optional[Callable]
+
+    def detect(self, img: np.ndarray, scale: float):
+        """
+        缩放后检测人脸
+
+        Returns:
+            [(dlib.rectangle 原始分辨率坐标, 置信度), ...]
+        """
+        with self.perf.measure('resize'):
+            img_small = cv2.resize(img, (0, 0), fx=scale, fy=scale) if scale != 1 else img
+        with self.perf.measure('detect'):
+            faces = self.cnn_face_detector(img_small, 0)
+
+        detections = []
+        for face in faces:
+            rect = face.rect
+            rect = dlib.rectangle(  # type: ignore
+                int(rect.left() / scale),
+                int(rect.top() / scale),
+                int(rect.right() / scale),
+                int(rect.bottom() / scale)
+            )
+            detections.append((rect, face.confidence))
+        return detections
+
+    def process(self, frame: np.ndarray, scale: Optional[float] = None) -> List[FaceResult]:
+        """
+        处理一帧图像
+
+        Args:
+            frame: RGB图像（原始分辨率）
+            scale: 检测缩放比例，默认使用 image_scale
+
+        Returns:
+            每个检测到的人脸的识别结果
+        """
+        scale = self.image_scale if scale is None else scale
+        results = []
+        for rect, confidence in self.detect(frame, scale):
+            results.append(self.recognize(frame, rect, confidence))
+        return results
+
+    def recognize(self, img: np.ndarray, rect, confidence: Optional[float] = None) -> FaceResult:
+        """对单个人脸框做质量评估、特征提取和比对"""
+        # 质量评估 - 过小、模糊、过暗/过亮或置信度低的人脸不提取特征
+        with self.perf.measure('quality'):
+            quality = self.quality_assessor.assess(img, rect, confidence)
+        result = FaceResult(rect, quality)
+        if quality.recognizable:
+            with self.perf.measure('landmarks'):
+                result.shape = self.predictor(img, rect)
+            # 姿态评估 - 侧脸过大的人脸同样跳过特征提取
+            self.quality_assessor.assess_pose(quality, result.shape)
+
+        if not quality.recognizable:
+            logging.debug(f"人脸质量不足，跳过识别 (原因: {quality.reject_reason}, {quality})")
+            return result
+
+        with self.perf.measure('descriptor'):
+            result.feature = self.face_reco_model.compute_face_descriptor(img, result.shape)
+
+        # 使用数据库查找相似人脸
+        with self.perf.measure('match'):
+            match_result = self.db_manager.find_similar_face(result.feature, self.recognition_threshold)
+
+        if match_result:
+            person_id, distance, person_name, real_name, is_important = match_result
+            self._set_match(result, person_name, real_name, distance, 'database')
+            result.person_id = person_id
+            result.is_important = bool(is_important)
+            return result
+
+        # 数据库中没有找到，检查内存中的特征
+        best_match_idx, min_distance = self.match_memory(result.feature)
+        if best_match_idx >= 0:
+            person_name = self.face_name_known_list[best_match_idx]
+            real_name = self.real_name_known_list[best_match_idx] if best_match_idx < len(self.real_name_known_list) else None
+            self._set_match(result, person_name, real_name, min_distance, 'memory')
+            result.person_id = self.person_id_known_list[best_match_idx] if best_match_idx < len(self.person_id_known_list) else None
+            return result
+
+        # 未找到匹配的人脸，质量达到入库门限时交给回调处理
+        logging.debug("检测到未知人脸")
+        if quality.enrollable:
+            if self.on_unknown_face is not None:
+                with self.perf.measure('enqueue'):
+                    self.on_unknown_face(img, result)
+        else:
+            logging.debug(f"人脸质量未达到入库门限，跳过入库 ({quality})")
+        return result
+
+    def match_memory(self, feature) -> Tuple[int, float]:
+        """
+        在内存已知人脸中查找阈值内最相近的一个
+
+        Returns:
+            (下标, 距离)，未找到时下标为-1
+        """
+        if not self.face_feature_known_list:
+            return -1, float('inf')
+        known = np.asarray(self.face_feature_known_list, dtype=np.float64)
+        distances = np.linalg.norm(known - np.asarray(list(feature), dtype=np.float64), axis=1)
+        idx = int(np.argmin(distances))
+        if distances[idx] < self.recognition_threshold:
+            return idx, float(distances[idx])
+        return -1, float('inf')
+
+    @staticmethod
+    def _set_match(result: FaceResult, person_name: str, real_name: Optional[str], distance: float, source: str):
+        # 优先使用real_name，如果没有则使用person_name
+        result.name = real_name if real_name else person_name
+        result.known = True
+        result.person_name = person_name
+        result.real_name = real_name
+        result.distance = distance
+        result.match_source = source
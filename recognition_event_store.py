@@ -0,0 +1,351 @@
+"""
+识别事件存储（按天分区的列式文件）
+功能：
+1. 只追加的识别事件记录：时间、人员、跟踪ID、来源、人脸框、距离、质量分
+2. 内存缓冲，按行数或时间间隔批量写入 data/recognition_events/YYYYMMDD/ 下的 .npz 列式分段
+3. 按时间范围扫描时只读取相关日期分区，分段文件名带有时间范围可直接跳过
+4. 压缩合并（将一天的小分段合并为一个按时间排序的压缩文件）与按天数保留策略
+5. 基于IoU的简单跟踪器，为连续帧中的同一人脸分配跟踪ID
+"""
+
+import logging
+import os
+import shutil
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# 列定义：列名 -> dtype
+COLUMNS = {
+    'timestamp': np.float64,   # Unix时间戳(秒)
+    'person_id': np.int64,     # 人员ID，未识别为 -1
+    'track_id': np.int64,      # 跟踪ID
+    'source': 'U32',           # 帧来源，如 screen / camera:0 / 文件名
+    'bbox': np.int32,          # (N, 4) left, top, right, bottom
+    'distance': np.float32,    # 匹配距离，未识别为 NaN
+    'quality': np.float32,     # 质量分 0~1
+    'known': np.bool_,         # 是否识别为已知身份
+}
+
+COMPACTED_PREFIX = 'compacted-'
+
+
+def _empty_columns() -> Dict[str, np.ndarray]:
+    columns = {}
+    for name, dtype in COLUMNS.items():
+        shape = (0, 4) if name == 'bbox' else (0,)
+        columns[name] = np.zeros(shape, dtype=dtype)
+    return columns
+
+
+def _concat(parts: List[Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+    if not parts:
+        return _empty_columns()
+    return {name: np.concatenate([part[name] for part in parts]) for name in COLUMNS}
+
+
+class RecognitionEventStore:
+    """按天分区的列式识别事件存储（线程安全）"""
+
+    def __init__(self, root: str = 'data/recognition_events', flush_rows: int = 2048,
+                 flush_interval: float = 30.0, retention_days: int = 90):
+        """
+        初始化事件存储
+
+        Args:
+            root: 存储目录
+            flush_rows: 缓冲达到该行数时写入分段
+            flush_interval: 距上次写入超过该秒数时写入分段
+            retention_days: 保留天数，更早的日期分区在维护时删除（0表示永久保留）
+        """
+        self.root = root
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.retention_days = retention_days
+        self.lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+        self._buffer = []  # [(timestamp, person_id, track_id, source, bbox, distance, quality, known)]
+        self._last_flush = time.time()
+        self._segment_seq = 0
+
+        self.stats = {'appended': 0, 'flushed': 0, 'segments': 0}
+
+    # ---------------- 写入 ----------------
+
+    def append(self, timestamp: float, person_id: Optional[int], track_id: int, source: str,
+               bbox: Sequence[int], distance: Optional[float], quality: float, known: bool):
+        """追加一条事件（写入内存缓冲）"""
+        row = (timestamp, -1 if person_id is None else int(person_id), int(track_id), source,
+               tuple(int(v) for v in bbox), np.nan if distance is None else float(distance),
+               float(quality), bool(known))
+        with self.lock:
+            self._buffer.append(row)
+            self.stats['appended'] += 1
+            should_flush = (len(self._buffer) >= self.flush_rows or
+                            time.time() - self._last_flush >= self.flush_interval)
+        if should_flush:
+            self.flush()
+
+    def flush(self) -> int:
+        """将缓冲写入分段文件，返回写入的行数"""
+        with self.lock:
+            rows, self._buffer = self._buffer, []
+            self._last_flush = time.time()
+        if not rows:
+            return 0
+
+        # 按日期分组，跨零点的缓冲写入不同分区
+        by_day = {}
+        for row in rows:
+            by_day.setdefault(self._day_key(row[0]), []).append(row)
+        for day, day_rows in by_day.items():
+            self._write_segment(day, self._rows_to_columns(day_rows))
+
+        with self.lock:
+            self.stats['flushed'] += len(rows)
+        return len(rows)
+
+    @staticmethod
+    def _rows_to_columns(rows) -> Dict[str, np.ndarray]:
+        fields = list(zip(*rows))
+        columns = {}
+        for i, (name, dtype) in enumerate(COLUMNS.items()):
+            columns[name] = np.asarray(fields[i], dtype=dtype)
+        return columns
+
+    @staticmethod
+    def _day_key(timestamp: float) -> str:
+        return datetime.fromtimestamp(timestamp).strftime('%Y%m%d')
+
+    def _write_segment(self, day: str, columns: Dict[str, np.ndarray], compressed: bool = False,
+                       filename: str = None):
+        """写入一个分段：文件名包含时间范围(毫秒)，扫描时无需打开即可过滤"""
+        day_dir = os.path.join(self.root, day)
+        os.makedirs(day_dir, exist_ok=True)
+        if filename is None:
+            with self.lock:
+                self._segment_seq += 1
+                seq = self._segment_seq
+            t_min = int(columns['timestamp'].min() * 1000)
+            t_max = int(columns['timestamp'].max() * 1000)
+            filename = f"seg_{t_min}_{t_max}_{os.getpid()}_{seq}.npz"
+
+        path = os.path.join(day_dir, filename)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            (np.savez_compressed if compressed else np.savez)(f, **columns)
+        os.replace(tmp_path, path)
+        with self.lock:
+            self.stats['segments'] += 1
+
+    # ---------------- 读取 ----------------
+
+    def _day_dirs(self, start: float, end: float) -> List[str]:
+        """与时间范围重叠的日期分区"""
+        if not os.path.isdir(self.root):
+            return []
+        first, last = self._day_key(start), self._day_key(end)
+        return sorted(day for day in os.listdir(self.root)
+                      if len(day) == 8 and day.isdigit() and first <= day <= last)
+
+    @staticmethod
+    def _segment_range(filename: str) -> Optional[Tuple[float, float]]:
+        if not filename.startswith('seg_'):
+            return None
+        try:
+            parts = filename.split('_')
+            return int(parts[1]) / 1000.0, int(parts[2]) / 1000.0
+        except (IndexError, ValueError):
+            return None
+
+    def scan(self, start: float, end: float, person_id: Optional[int] = None,
+             columns: Optional[Sequence[str]] = None, include_buffer: bool = True) -> Dict[str, np.ndarray]:
+        """
+        按时间范围扫描事件
+
+        Args:
+            start, end: 时间范围（Unix时间戳，包含两端）
+            person_id: 只返回该人员的事件
+            columns: 只读取这些列（默认全部）
+            include_buffer: 是否包含尚未写入文件的缓冲
+
+        Returns:
+            {列名: np.ndarray}，按时间排序
+        """
+        names = list(columns) if columns else list(COLUMNS)
+        for required in ('timestamp', 'person_id'):
+            if required not in names:
+                names.append(required)
+
+        parts = []
+        for day in self._day_dirs(start, end):
+            day_dir = os.path.join(self.root, day)
+            for filename in sorted(os.listdir(day_dir)):
+                if not filename.endswith('.npz'):
+                    continue
+                time_range = self._segment_range(filename)
+                if time_range and (time_range[1] < start or time_range[0] > end):
+                    continue
+                try:
+                    with np.load(os.path.join(day_dir, filename)) as data:
+                        part = {name: data[name] for name in names}
+                except Exception as e:
+                    logging.warning(f"读取识别事件分段失败 {filename}: {str(e)}")
+                    continue
+                parts.append(part)
+
+        if include_buffer:
+            with self.lock:
+                buffered = list(self._buffer)
+            if buffered:
+                buffered_columns = self._rows_to_columns(buffered)
+                parts.append({name: buffered_columns[name] for name in names})
+
+        if not parts:
+            empty = _empty_columns()
+            return {name: empty[name] for name in names}
+
+        result = {name: np.concatenate([part[name] for part in parts]) for name in names}
+        mask = (result['timestamp'] >= start) & (result['timestamp'] <= end)
+        if person_id is not None:
+            mask &= result['person_id'] == person_id
+        order = np.argsort(result['timestamp'][mask], kind='stable')
+        return {name: values[mask][order] for name, values in result.items()}
+
+    def count_by_person(self, start: float, end: float) -> Dict[int, int]:
+        """统计时间范围内每个人员的事件数（不含未识别）"""
+        data = self.scan(start, end, columns=['person_id'])
+        ids, counts = np.unique(data['person_id'][data['person_id'] >= 0], return_counts=True)
+        return dict(zip(ids.tolist(), counts.tolist()))
+
+    # ---------------- 维护 ----------------
+
+    def compact(self, day: str) -> bool:
+        """将一天的所有分段合并为一个按时间排序的压缩文件"""
+        day_dir = os.path.join(self.root, day)
+        if not os.path.isdir(day_dir):
+            return False
+        files = sorted(f for f in os.listdir(day_dir) if f.endswith('.npz'))
+        if len(files) <= 1 and (not files or files[0].startswith(COMPACTED_PREFIX)):
+            return False
+
+        parts = []
+        for filename in files:
+            try:
+                with np.load(os.path.join(day_dir, filename)) as data:
+                    parts.append({name: data[name] for name in COLUMNS})
+            except Exception as e:
+                logging.warning(f"压缩合并时读取分段失败 {filename}: {str(e)}")
+                return False
+
+        merged = _concat(parts)
+        order = np.argsort(merged['timestamp'], kind='stable')
+        merged = {name: values[order] for name, values in merged.items()}
+
+        # 合并结果写入新的唯一文件名后再删除旧分段（包括旧的合并文件），中途失败不丢数据
+        compacted_name = f"{COMPACTED_PREFIX}{int(time.time() * 1000)}-{os.getpid()}.npz"
+        self._write_segment(day, merged, compressed=True, filename=compacted_name)
+        for filename in files:
+            os.remove(os.path.join(day_dir, filename))
+        logging.info(f"识别事件分区 {day} 已压缩合并: {len(files)} 个分段, {len(order)} 条事件")
+        return True
+
+    def apply_retention(self, now: float = None) -> int:
+        """删除超过保留天数的日期分区，返回删除的分区数"""
+        if self.retention_days <= 0 or not os.path.isdir(self.root):
+            return 0
+        now = now or time.time()
+        cutoff = (datetime.fromtimestamp(now) - timedelta(days=self.retention_days)).strftime('%Y%m%d')
+        removed = 0
+        for day in os.listdir(self.root):
+            if len(day) == 8 and day.isdigit() and day < cutoff:
+                shutil.rmtree(os.path.join(self.root, day), ignore_errors=True)
+                removed += 1
+        if removed:
+            logging.info(f"已删除 {removed} 个超过 {self.retention_days} 天的识别事件分区")
+        return removed
+
+    def maintain(self, now: float = None):
+        """写入缓冲、压缩合并今天以前的分区并执行保留策略"""
+        self.flush()
+        today = self._day_key(now or time.time())
+        for day in os.listdir(self.root):
+            if len(day) == 8 and day.isdigit() and day < today:
+                try:
+                    self.compact(day)
+                except Exception as e:
+                    logging.error(f"压缩合并识别事件分区 {day} 失败: {str(e)}")
+        self.apply_retention(now)
+
+    def close(self):
+        self.flush()
+
+
+class IoUTracker:
+    """基于人脸框IoU的简单跟踪器，为连续帧中的同一人脸分配稳定的跟踪ID"""
+
+    def __init__(self, iou_threshold: float = 0.3, max_age: float = 1.0):
+        """
+        Args:
+            iou_threshold: 与上一帧人脸框的IoU大于该值视为同一目标
+            max_age: 目标超过该秒数未出现即结束跟踪
+        """
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age
+        self._tracks = {}  # track_id -> (bbox, last_seen)
+        self._next_id = 1
+
+    @staticmethod
+    def iou(a: Sequence[int], b: Sequence[int]) -> float:
+        left, top = max(a[0], b[0]), max(a[1], b[1])
+        right, bottom = min(a[2], b[2]), min(a[3], b[3])
+        inter = max(0, right - left) * max(0, bottom - top)
+        if inter == 0:
+            return 0.0
+        area_a = (a[2] - a[0]) * (a[3] - a[1])
+        area_b = (b[2] - b[0]) * (b[3] - b[1])
+        return inter / float(area_a + area_b - inter)
+
+    def update(self, bboxes: Sequence[Sequence[int]], timestamp: float = None) -> List[int]:
+        """为当前帧的人脸框分配跟踪ID（贪心匹配，IoU从大到小）"""
+        timestamp = timestamp or time.time()
+        self._tracks = {tid: track for tid, track in self._tracks.items()
+                        if timestamp - track[1] <= self.max_age}
+
+        pairs = []
+        for i, bbox in enumerate(bboxes):
+            for track_id, (track_bbox, _) in self._tracks.items():
+                overlap = self.iou(bbox, track_bbox)
+                if overlap >= self.iou_threshold:
+                    pairs.append((overlap, i, track_id))
+        pairs.sort(reverse=True)
+
+        assigned = [None] * len(bboxes)
+        used_tracks = set()
+        for _, i, track_id in pairs:
+            if assigned[i] is None and track_id not in used_tracks:
+                assigned[i] = track_id
+                used_tracks.add(track_id)
+
+        for i, bbox in enumerate(bboxes):
+            if assigned[i] is None:
+                assigned[i] = self._next_id
+                self._next_id += 1
+            self._tracks[assigned[i]] = (tuple(bbox), timestamp)
+        return assigned
+
+
+def record_face_results(store: RecognitionEventStore, tracker: IoUTracker, results, source: str,
+                        timestamp: float = None):
+    """将一帧的识别结果（recognition_engine.FaceResult 列表）写入事件存储"""
+    if not results:
+        return
+    timestamp = timestamp or time.time()
+    track_ids = tracker.update([result.position for result in results], timestamp)
+    for result, track_id in zip(results, track_ids):
+        store.append(timestamp, result.person_id if result.known else None, track_id, source,
+                     result.position, result.distance, result.quality.score, result.known)
@@ -0,0 +1,130 @@
+"""
+离线回放与吞吐量测试
+功能：
+1. 从屏幕、摄像头、视频文件或图片目录读取帧，无界面运行 检测 -> 特征提取 -> 比对 全流程
+2. 输出 帧/秒、人脸/秒 以及各阶段 p50/p95/p99 耗时，可选输出JSON
+3. 可将屏幕/摄像头画面录制到目录，之后在无显示器、无摄像头的机器上复现
+
+用法示例：
+    python replay_pipeline.py data/replay/video.mp4
+    python replay_pipeline.py data/replay/frames --realtime --json result.json
+    python replay_pipeline.py screen --max-frames 300 --record data/replay/screen_001
+    python replay_pipeline.py data/replay/video.mp4 --events data/recognition_events
+"""
+
+import argparse
+import json
+import logging
+import sys
+import time
+
+from face_database_manager import FaceDatabaseManager
+from frame_sources import FrameRecorder, open_source
+from perf_stats import PerfStats
+from recognition_engine import RecognitionEngine
+from recognition_event_store import IoUTracker, RecognitionEventStore, record_face_results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="无界面回放人脸识别流程并统计吞吐量")
+    parser.add_argument('source', help="screen、camera[:N]、视频文件或图片目录")
+    parser.add_argument('--realtime', action='store_true', help="按原始速度回放（默认尽可能快）")
+    parser.add_argument('--loop', action='store_true', help="回放结束后从头循环（需配合 --max-frames）")
+    parser.add_argument('--fps', type=float, default=25.0, help="无时间戳图片目录的回放帧率")
+    parser.add_argument('--max-frames', type=int, default=0, help="最多处理的帧数，0表示不限制")
+    parser.add_argument('--warmup', type=int, default=3, help="不计入统计的预热帧数")
+    parser.add_argument('--scale', type=float, default=0.5, help="检测前的图像缩放比例")
+    parser.add_argument('--threshold', type=float, default=0.48, help="识别阈值")
+    parser.add_argument('--db', default='data/face_database.db', help="人脸数据库路径")
+    parser.add_argument('--search-mode', default='coarse', choices=['exact', 'coarse'], help="人脸库检索模式")
+    parser.add_argument('--record', help="同时把读取到的帧录制到该目录")
+    parser.add_argument('--json', help="将统计结果写入JSON文件")
+    parser.add_argument('--events', help="将识别事件写入该目录（按天分区的列式文件）")
+    return parser.parse_args(argv)
+
+
+def run(args) -> dict:
+    """运行回放并返回统计结果"""
+    db_manager = FaceDatabaseManager(args.db, search_mode=args.search_mode)
+    perf = PerfStats(window=max(args.max_frames, 1000))
+    engine = RecognitionEngine(db_manager, perf=perf, recognition_threshold=args.threshold,
+                               image_scale=args.scale)
+    # 预先加载内存人脸库，避免计入第一帧
+    db_manager.load_gallery()
+
+    recorder = FrameRecorder(args.record) if args.record else None
+    event_store = RecognitionEventStore(args.events, retention_days=0) if args.events else None
+    tracker = IoUTracker()
+    frames = faces = known = 0
+    start = None
+
+    with open_source(args.source, realtime=args.realtime, loop=args.loop, fps=args.fps) as source:
+        try:
+            for frame, timestamp in source:
+                if recorder:
+                    recorder.write(frame, timestamp)
+
+                if source.frames_read == args.warmup + 1:
+                    # 预热结束，重新开始统计
+                    perf.reset()
+                    start = time.perf_counter()
+                    frames = faces = known = 0
+
+                perf.begin_frame()
+                results = engine.process(frame)
+                perf.end_frame()
+
+                if event_store:
+                    record_face_results(event_store, tracker, results, args.source)
+
+                frames += 1
+                faces += len(results)
+                known += sum(1 for result in results if result.known)
+
+                if args.max_frames and source.frames_read >= args.max_frames + args.warmup:
+                    break
+        except KeyboardInterrupt:
+            logging.info("回放被中断")
+        finally:
+            if recorder:
+                recorder.close()
+            if event_store:
+                event_store.close()
+
+    elapsed = time.perf_counter() - start if start else 0.0
+    summary = perf.summary(force=True)
+    return {
+        'source': args.source,
+        'frames': frames,
+        'faces': faces,
+        'known_faces': known,
+        'elapsed': elapsed,
+        'frames_per_second': frames / elapsed if elapsed > 0 else 0.0,
+        'faces_per_second': faces / elapsed if elapsed > 0 else 0.0,
+        'scale': args.scale,
+        'stages_ms': {stage: summary[stage] for stage in perf.ordered_stages(summary)},
+    }
+
+
+def print_report(report: dict):
+    print(f"来源: {report['source']}  (缩放: {report['scale']})")
+    print(f"帧数: {report['frames']}  人脸: {report['faces']}  已识别: {report['known_faces']}  耗时: {report['elapsed']:.2f}s")
+    print(f"吞吐量: {report['frames_per_second']:.2f} 帧/秒, {report['faces_per_second']:.2f} 人脸/秒")
+    print(f"{'阶段':<10} {'p50':>8} {'p95':>8} {'p99':>8}  (ms)")
+    for stage, stats in report['stages_ms'].items():
+        print(f"{stage:<10} {stats['p50']:8.2f} {stats['p95']:8.2f} {stats['p99']:8.2f}")
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    args = parse_args(argv)
+    report = run(args)
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0 if report['frames'] > 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
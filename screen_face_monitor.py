@@ -38,6 +38,16 @@ import sqlite3
 
 # 导入数据库管理器
 from face_database_manager import FaceDatabaseManager
+from db_backup import BackupScheduler, DatabaseBackup
+from db_maintenance import MaintenanceScheduler
+from face_api_cache import EmbeddingResultCache
+from face_enroll_queue import EnrollmentQueue
+from face_quality import FaceQualityAssessor
+from recognition_engine import RecognitionEngine, detect_gpu_availability, load_models
+from face_gallery import select_exemplars
+from perf_stats import PerfStats
+from metrics_exporter import MetricsRegistry, MetricsServer, register_process_metrics
+from recognition_event_store import IoUTracker, RecognitionEventStore, record_face_results
 
 # 尝试导入requests库，如果失败则禁用API功能
 try:
@@ -89,20 +99,12 @@ class DailyLogManager:
 log_manager = DailyLogManager()
  
 # 加载Dlib预训练模型 
-cnn_face_detector = dlib.cnn_face_detection_model_v1('data/data_dlib/mmod_human_face_detector.dat')  # type: ignore
-predictor = dlib.shape_predictor('data/data_dlib/shape_predictor_68_face_landmarks.dat')  # type: ignore
-face_reco_model = dlib.face_recognition_model_v1("data/data_dlib/dlib_face_recognition_resnet_model_v1.dat")  # type: ignore
+cnn_face_detector, predictor, face_reco_model = load_models()
  
 class TransparentFaceRecognizer:
     def __init__(self):
         # 初始化数据库管理器
-        self.db_manager = FaceDatabaseManager()
-        
-        # 人脸数据库相关 - 从数据库加载
-        self.face_feature_known_list = []
-        self.face_name_known_list = []
-        self.face_image_data_list = []  # 存储图像数据而不是路径
-        self.real_name_known_list = []  # 存储真实姓名
+        self.db_manager = FaceDatabaseManager(search_mode='coarse', coarse_top_p=8)
         
         # 当前帧数据 
         self.current_frame_face_feature_list = []
@@ -110,12 +112,40 @@ class TransparentFaceRecognizer:
         self.current_frame_face_name_list = []
         self.current_frame_face_position_list = []
         self.current_frame_face_known_list = []
+        self.current_frame_face_quality_list = []
         
         # 性能统计 
         self.fps_show = 0 
         self.frame_cnt = 0 
         self.start_time = time.time() 
         
+        # 分阶段耗时统计（p50/p95/p99），定期写入日志
+        self.perf = PerfStats(window=300)
+        self.perf_log_interval = 60  # 秒
+        self.last_perf_log_time = time.time()
+        
+        # 无界面识别引擎：检测、质量评估（低质量人脸跳过特征提取、入库和API调用）、特征提取与比对
+        # 已知人脸列表、识别阈值和质量评估器都由引擎持有，本类通过同名属性访问
+        self.engine = RecognitionEngine(
+            self.db_manager,
+            models=(cnn_face_detector, predictor, face_reco_model),
+            quality_assessor=FaceQualityAssessor(),
+            perf=self.perf
+        )
+        self.engine.on_unknown_face = lambda img, result: self.create_new_face_data(
+            img, result.rect, result.shape, result.feature, result.quality)
+        
+        # 识别事件记录（按天分区的列式文件，不写入业务数据库）
+        self.event_store = RecognitionEventStore('data/recognition_events', retention_days=90)
+        self.event_tracker = IoUTracker()
+        
+        # 识别记录（数据库 recognition_logs）：同一人每 recognition_log_interval 秒最多记录一次，批量写入
+        self.recognition_log_interval = 10  # 秒
+        self.recognition_log_flush_interval = 5  # 秒
+        self.last_recognition_log_time = {}  # {person_id: timestamp}
+        self.pending_recognition_logs = []
+        self.last_recognition_log_flush = time.time()
+        
         # 屏幕捕获 
         self.sct = mss.mss() 
         self.screen_width = pyautogui.size().width  
@@ -154,10 +184,7 @@ class TransparentFaceRecognizer:
         self.show_status_display = True  # 是否显示左上角状态信息
         
         # 新面孔管理 - 增强弹窗控制
-        self.last_new_face_time = 0 
-        self.new_face_cooldown = 2  # 新面孔检测冷却时间(秒)
         self.current_new_face = None  # 当前正在处理的新面孔 
-        self.is_processing_new_face = False  # 是否正在处理新面孔 
         self.new_face_popup_window = None  # 当前新面孔弹窗窗口对象
         self.shown_faces = set()  # 已显示的面孔 
         self.show_popup = False  # 是否显示弹窗 - 默认关闭
@@ -175,10 +202,59 @@ class TransparentFaceRecognizer:
         self.api_retry_count = 3  # API重试次数
         self.temp_faces = {}  # 临时存储的人脸信息 {feature_str: {'temp_name': 'xxx', 'temp_id': 'xxx', 'face_img': img_array}}
         self.temp_user_counter = 1  # 临时用户计数器
+        # 入库工作线程与界面线程共同访问 temp_faces 和 temp_user_counter，由该锁保护
+        self.temp_faces_lock = threading.Lock()
+        
+        # API结果缓存 - 相近特征复用已完成的结果或合并到进行中的请求
+        self.api_cache_epsilon = 0.4  # 特征距离小于该值视为同一人
+        self.api_cache_ttl = 600  # 成功结果缓存时间(秒)
+        self.api_cache_max_entries = 1024  # 最大缓存条数
+        self.api_cache = EmbeddingResultCache(
+            epsilon=self.api_cache_epsilon,
+            ttl=self.api_cache_ttl,
+            max_entries=self.api_cache_max_entries
+        )
         
-        # 清理计时器
-        self.last_cleanup_time = time.time()
-        self.cleanup_interval = 3600  # 每小时清理一次临时文件
+        # 新面孔入库队列 - 有界优先队列 + 固定工作线程
+        self.new_face_queue_size = 32  # 队列最大长度
+        self.new_face_workers = 2  # 工作线程数量
+        self.new_face_queue = EnrollmentQueue(
+            self.process_new_face_job,
+            max_size=self.new_face_queue_size,
+            num_workers=self.new_face_workers,
+            merge_distance=self.api_cache_epsilon
+        )
+        self.new_face_queue.start()
+        
+        # 本地 /metrics 指标服务（Prometheus 文本格式）
+        self.metrics_enabled = True
+        self.metrics_port = 9108  # 被占用时自动顺延，便于同机运行多个实例
+        self.metrics_server = None
+        self.init_metrics()
+        
+        # 定时数据库备份：每小时一次页级增量备份，每 24 次一次全量备份，保留最近 3 条备份链
+        self.backup_interval = 3600  # 秒
+        self.db_backup = DatabaseBackup(
+            self.db_manager.db_path, 'data/backups', keep_chains=3, full_every=24,
+            image_store_dir=self.db_manager.image_store.root if self.db_manager.external_images else None)
+        self.backup_scheduler = BackupScheduler(self.db_backup, interval=self.backup_interval)
+        self.backup_scheduler.start()
+        
+        # 后台数据库维护：分批清理过期临时人员和识别记录，空闲时归还空闲页、更新统计信息
+        self.cleanup_interval = 3600  # 每小时维护一次
+        self.maintenance_idle_seconds = 120  # 超过该时间没有检测到人脸视为空闲
+        self.last_face_time = time.time()
+        self.maintenance = MaintenanceScheduler(
+            self.db_manager,
+            interval=self.cleanup_interval,
+            temp_max_age_hours=24,
+            log_retention_days=90,
+            is_idle=self.is_maintenance_idle,
+            on_report=self.on_maintenance_report,
+            on_temp_purged=self.forget_temp_persons
+        )
+        self.maintenance.add_task('识别事件压缩合并', self.event_store.maintain)
+        self.maintenance.start()
         
         # 进度条状态
         self.progress_active = False
@@ -186,6 +262,8 @@ class TransparentFaceRecognizer:
         # 初始化 
         self.set_window_clickthrough() 
         self.get_face_database() 
+        # 后台为旧数据补齐缩略图，弹窗和管理工具直接读取缩略图
+        threading.Thread(target=self.db_manager.backfill_thumbnails, daemon=True).start()
         self.setup_exit_controls() 
         self.create_system_tray_icon() 
         
@@ -207,6 +285,41 @@ class TransparentFaceRecognizer:
             logging.info(f"API地址: {self.api_url}")
             logging.info(f"API超时: {self.api_timeout}秒")
  
+    @property
+    def face_feature_known_list(self):
+        return self.engine.face_feature_known_list
+    
+    @property
+    def face_name_known_list(self):
+        return self.engine.face_name_known_list
+    
+    @property
+    def face_image_data_list(self):
+        """存储图像数据而不是路径"""
+        return self.engine.face_image_data_list
+    
+    @property
+    def real_name_known_list(self):
+        """存储真实姓名"""
+        return self.engine.real_name_known_list
+    
+    @property
+    def person_id_known_list(self):
+        """存储人员ID（记录识别事件时使用）"""
+        return self.engine.person_id_known_list
+    
+    @property
+    def quality_assessor(self):
+        return self.engine.quality_assessor
+    
+    @property
+    def recognition_threshold(self):
+        return self.engine.recognition_threshold
+    
+    @recognition_threshold.setter
+    def recognition_threshold(self, value):
+        self.engine.recognition_threshold = value
+    
     def create_system_tray_icon(self):
         """创建系统托盘图标"""
         # 创建一个更美观的图标
@@ -473,15 +586,14 @@ class TransparentFaceRecognizer:
 
     def generate_temp_identity(self):
         """生成临时身份信息"""
-        # 生成类似 unknown1, unknown2 的临时姓名
-        temp_name = f"unknown{self.temp_user_counter}"
+        # 生成类似 unknown1, unknown2 的临时姓名，多个入库工作线程同时生成时不重复
+        with self.temp_faces_lock:
+            temp_name = f"unknown{self.temp_user_counter}"
+            self.temp_user_counter += 1
         
         # 生成临时身份证号
         temp_id = "TEMP" + str(random.randint(100000, 999999))
         
-        # 增加计数器
-        self.temp_user_counter += 1
-        
         return temp_name, temp_id
 
     def image_to_base64(self, img_array):
@@ -531,12 +643,14 @@ class TransparentFaceRecognizer:
             
             # 发送API请求
             logging.info("正在调用人脸识别API...")
+            api_start = time.perf_counter()
             response = requests.post(
                 self.api_url,
                 json=request_data,
                 timeout=self.api_timeout,
                 headers={'Content-Type': 'application/json'}
             )
+            self.metrics['api_latency'].observe(time.perf_counter() - api_start)
             
             if response.status_code == 200:
                 result = response.json()
@@ -548,6 +662,7 @@ class TransparentFaceRecognizer:
                     processing_time = data.get('processing_time', 0.0)
                     
                     logging.info(f"API识别成功: {name} - {id_card} (置信度: {confidence:.3f}, 耗时: {processing_time:.2f}s)")
+                    self.metrics['api_calls'].labels(result='success').inc()
                     return {
                         'name': name,
                         'id_card': id_card,
@@ -557,19 +672,24 @@ class TransparentFaceRecognizer:
                 else:
                     error_msg = result.get('error', '未知错误')
                     logging.warning(f"API识别失败: {error_msg}")
+                    self.metrics['api_calls'].labels(result='unrecognized').inc()
                     return None
             else:
                 logging.error(f"API请求失败，状态码: {response.status_code}")
+                self.metrics['api_calls'].labels(result='http_error').inc()
                 return None
                 
         except requests.exceptions.Timeout:
             logging.error("API请求超时")
+            self.metrics['api_calls'].labels(result='timeout').inc()
             return None
         except requests.exceptions.ConnectionError:
             logging.error("无法连接到API服务器")
+            self.metrics['api_calls'].labels(result='connection_error').inc()
             return None
         except Exception as e:
             logging.error(f"API调用出错: {str(e)}")
+            self.metrics['api_calls'].labels(result='error').inc()
             return None
 
     def update_face_with_api_result(self, feature_str, api_result):
@@ -580,11 +700,12 @@ class TransparentFaceRecognizer:
         
         try:
             # 检查临时人脸是否存在
-            if feature_str not in self.temp_faces:
+            with self.temp_faces_lock:
+                temp_face = self.temp_faces.get(feature_str)
+            if temp_face is None:
                 logging.warning(f"临时人脸 {feature_str} 不存在")
                 return False
-            
-            temp_face = self.temp_faces[feature_str]
+
             real_name = api_result.get('name', '').strip()
             real_id_card = api_result.get('id_card', '').strip()
             person_id = temp_face['person_id']
@@ -615,6 +736,7 @@ class TransparentFaceRecognizer:
                     self.face_feature_known_list.pop(temp_index)
                     self.face_image_data_list.pop(temp_index)
                     self.real_name_known_list.pop(temp_index)  # 同时清理真实姓名列表
+                    self.person_id_known_list.pop(temp_index)
                     logging.debug(f"已从内存数据库中移除临时身份: {temp_person_name}")
                 
                 # 更新现有人员的特征
@@ -651,8 +773,9 @@ class TransparentFaceRecognizer:
                     self.face_name_known_list.append(real_person_name)
                     self.face_feature_known_list.append(temp_face['feature'])
                     self.real_name_known_list.append(real_name)  # 添加真实姓名
-                    # 获取图像数据
-                    image_data = self.db_manager.get_face_image(person_id)
+                    self.person_id_known_list.append(person_id)
+                    # 获取缩略图数据
+                    image_data = self.db_manager.get_face_thumbnail(person_id, 64)
                     if image_data:
                         self.face_image_data_list.append(image_data)
                     else:
@@ -664,7 +787,8 @@ class TransparentFaceRecognizer:
                 self.processed_features.add(feature_str)
             
             # 从临时存储中移除
-            del self.temp_faces[feature_str]
+            with self.temp_faces_lock:
+                self.temp_faces.pop(feature_str, None)
             
             logging.info(f"成功更新人脸信息: {real_name} - {real_id_card} (真实身份)")
             return True
@@ -674,24 +798,42 @@ class TransparentFaceRecognizer:
             return False
 
     def cleanup_temp_files(self, max_age_hours=24):
-        """清理过期的临时文件"""
+        """
+        清理临时人员（max_age_hours 为 None 时清理全部）
+
+        Returns:
+            删除的临时人员数
+        """
         try:
-            # 使用数据库管理器清理过期的临时人员
-            deleted_count = self.db_manager.delete_temp_persons(max_age_hours)
+            # 分批按集合删除，同时从内存人脸库和临时面孔记录中移除
+            deleted_count = self.db_manager.purge_temp_persons(max_age_hours, on_purged=self.forget_temp_persons)
             
             if deleted_count > 0:
-                logging.info(f"已清理 {deleted_count} 个过期的临时人员")
+                logging.info(f"已清理 {deleted_count} 个临时人员")
                 
                 # 重新加载数据库以更新内存中的数据
                 self.face_name_known_list.clear()
                 self.face_feature_known_list.clear()
                 self.face_image_data_list.clear()
                 self.real_name_known_list.clear()  # 清空真实姓名列表
-                self.processed_features.clear()
+                self.person_id_known_list.clear()
                 self.get_face_database()
+            return deleted_count
                 
         except Exception as e:
             logging.error(f"清理临时文件时出错: {str(e)}")
+            return 0
+
+    def forget_temp_persons(self, person_ids):
+        """临时人员被删除后，移除对应的临时面孔记录，相同的人脸再次出现时重新处理"""
+        purged = set(person_ids)
+        with self.temp_faces_lock:
+            forgotten = [feature_str for feature_str, temp_face in self.temp_faces.items()
+                         if temp_face.get('person_id') in purged]
+            for feature_str in forgotten:
+                del self.temp_faces[feature_str]
+        for feature_str in forgotten:
+            self.processed_features.discard(feature_str)
 
     def show_api_update_notification(self, temp_name, real_name, real_id):
         """显示API更新通知"""
@@ -826,10 +968,7 @@ class TransparentFaceRecognizer:
             logging.info("开始清理所有临时身份...")
             
             # 清理数据库中的临时人员
-            before_count = self.db_manager.get_statistics()['temp_persons']
-            self.cleanup_temp_files(max_age_hours=0)  # 清理所有临时文件
-            after_count = self.db_manager.get_statistics()['temp_persons']
-            db_cleaned_count = before_count - after_count
+            db_cleaned_count = self.cleanup_temp_files(max_age_hours=None)
             
             # 清理内存中的临时身份
             temp_names_to_remove = []
@@ -843,24 +982,18 @@ class TransparentFaceRecognizer:
                 self.face_feature_known_list.pop(i)
                 self.face_image_data_list.pop(i)
                 self.real_name_known_list.pop(i)  # 同时清理真实姓名列表
+                self.person_id_known_list.pop(i)
             
             memory_cleaned_count = len(temp_names_to_remove)
             
             # 清理临时存储
-            temp_faces_count = len(self.temp_faces)
-            self.temp_faces.clear()
-            
-            # 清理已处理特征集合中的临时特征
-            temp_features_to_remove = []
-            for feature_str in self.processed_features:
-                if 'unknown' in feature_str or 'TEMP' in feature_str:
-                    temp_features_to_remove.append(feature_str)
-            
-            for feature_str in temp_features_to_remove:
-                self.processed_features.discard(feature_str)
-            
-            # 重置临时用户计数器
-            self.temp_user_counter = 1
+            with self.temp_faces_lock:
+                temp_faces_count = len(self.temp_faces)
+                self.temp_faces.clear()
+                # 重置临时用户计数器
+                self.temp_user_counter = 1
+            self.api_cache.clear()
+            self.new_face_queue.clear()
             
             # 显示清理结果
             import tkinter.messagebox as messagebox
@@ -1007,6 +1140,7 @@ class TransparentFaceRecognizer:
             self.face_feature_known_list.clear()
             self.face_image_data_list.clear()
             self.real_name_known_list.clear()  # 清空真实姓名列表
+            self.person_id_known_list.clear()
             self.processed_features.clear()
             
             # 重新加载数据库
@@ -1024,10 +1158,41 @@ class TransparentFaceRecognizer:
         menu.add_command(label=" 退出", command=self.quit_program) 
         self.root.bind("<Button-3>",  lambda e: menu.tk_popup(e.x_root,  e.y_root))
  
+    def is_maintenance_idle(self):
+        """一段时间内没有检测到人脸且没有等待入库的新面孔时，允许执行较重的数据库维护"""
+        return (time.time() - self.last_face_time > self.maintenance_idle_seconds
+                and self.new_face_queue.depth == 0)
+
+    def on_maintenance_report(self, report):
+        """维护完成（在维护线程中调用）：删除了临时人员时在主线程重新加载人脸库"""
+        expired = next((item['result'] for item in report if item['task'] == '清理过期临时人员'), 0)
+        if expired:
+            self.root.after(0, self.reload_face_database)
+
     def quit_program(self):
         """退出程序"""
         try:
             logging.info("开始退出程序...")
+            # 停止新面孔入库队列
+            if hasattr(self, 'new_face_queue'):
+                self.new_face_queue.stop()
+            
+            # 停止定时备份和后台维护
+            if hasattr(self, 'backup_scheduler'):
+                self.backup_scheduler.stop()
+            if hasattr(self, 'maintenance'):
+                self.maintenance.stop()
+            
+            # 停止指标服务
+            if getattr(self, 'metrics_server', None):
+                self.metrics_server.stop()
+            
+            # 写入缓冲中的识别事件和识别记录
+            if hasattr(self, 'event_store'):
+                self.event_store.close()
+            if getattr(self, 'pending_recognition_logs', None):
+                self.flush_recognition_logs(background=False)
+            
             # 清理系统托盘图标
             if hasattr(self, 'tray_icon') and self.tray_icon:
                 self.tray_icon.stop()
@@ -1072,6 +1237,12 @@ class TransparentFaceRecognizer:
     def get_face_database(self):
         """从SQLite数据库加载人脸数据库"""
         try:
+            # 旧数据库中每人可能有大量重复特征，先精简到K个样本
+            self.db_manager.prune_features_to_exemplars()
+            
+            # 其他进程（人脸库管理、采集工具等）的修改在重新加载时一并生效
+            self.db_manager.reload_gallery()
+            
             # 从数据库获取所有特征
             features = self.db_manager.get_face_features()
             
@@ -1080,9 +1251,10 @@ class TransparentFaceRecognizer:
                     self.face_name_known_list.append(person_name)
                     self.face_feature_known_list.append(feature_vector)
                     self.real_name_known_list.append(real_name)  # 存储真实姓名
+                    self.person_id_known_list.append(person_id)
                     
-                    # 获取该人员的图像数据
-                    image_data = self.db_manager.get_face_image(person_id)
+                    # 获取该人员的缩略图数据（内存中不保留原图）
+                    image_data = self.db_manager.get_face_thumbnail(person_id, 64)
                     self.face_image_data_list.append(image_data)
                     
                     # 生成特征字符串用于去重
@@ -1160,18 +1332,75 @@ class TransparentFaceRecognizer:
         """计算两个特征向量之间的欧氏距离"""
         return np.linalg.norm(np.array(f1)  - np.array(f2))
  
+    def init_metrics(self):
+        """注册监控指标并启动 /metrics 服务"""
+        registry = MetricsRegistry()
+        self.metrics_registry = registry
+        self.metrics = {
+            'frames': registry.counter('face_monitor_frames', '已处理的帧数'),
+            'faces': registry.counter('face_monitor_faces_detected', '检测到的人脸数'),
+            'low_quality': registry.counter('face_monitor_faces_low_quality', '因质量不足跳过识别的人脸数'),
+            'matches': registry.counter('face_monitor_matches', '识别为已知身份的人脸数', ['source']),
+            'unknowns': registry.counter('face_monitor_unknown_faces', '未匹配到身份的人脸数'),
+            'api_calls': registry.counter('face_monitor_api_calls', '身份识别API调用次数', ['result']),
+            'api_latency': registry.histogram('face_monitor_api_latency_seconds', '身份识别API调用耗时(秒)'),
+            'db_query': registry.histogram('face_monitor_db_query_seconds', '数据库操作耗时(秒)', ['operation']),
+            'stage': registry.histogram('face_monitor_stage_seconds', '每帧各处理阶段耗时(秒)', ['stage']),
+        }
+        
+        # 从各组件的现有状态采集的指标
+        registry.gauge('face_monitor_enroll_queue_depth', '入库队列等待中的任务数').set_function(
+            lambda: self.new_face_queue.depth)
+        registry.gauge('face_monitor_enroll_active_workers', '正在处理入库任务的工作线程数').set_function(
+            lambda: self.new_face_queue.active_workers)
+        for key in ('submitted', 'merged', 'dropped', 'processed', 'failed'):
+            registry.counter(f'face_monitor_enroll_jobs_{key}', f'入库队列任务数({key})').set_function(
+                lambda key=key: self.new_face_queue.stats[key])
+        for key in ('hits', 'coalesced', 'misses', 'evictions'):
+            registry.counter(f'face_monitor_api_cache_{key}', f'API结果缓存统计({key})').set_function(
+                lambda key=key: self.api_cache.stats[key])
+        registry.gauge('face_monitor_api_cache_entries', 'API结果缓存条数').set_function(
+            lambda: len(self.api_cache))
+        registry.gauge('face_monitor_temp_faces', '等待API结果的临时面孔数').set_function(
+            lambda: len(self.temp_faces))
+        registry.gauge('face_monitor_gallery_persons', '内存人脸库中的身份数').set_function(
+            lambda: len(self.db_manager.gallery))
+        registry.gauge('face_monitor_gallery_features', '内存人脸库中的样本特征数').set_function(
+            lambda: self.db_manager.gallery.feature_count)
+        registry.gauge('face_monitor_gallery_memory_bytes', '内存人脸库占用内存(字节)').set_function(
+            lambda: self.db_manager.gallery.memory_bytes)
+        registry.gauge('face_monitor_fps', '当前帧率').set_function(lambda: self.fps_show)
+        register_process_metrics(registry, 'face_monitor')
+        
+        # 分阶段耗时同步到直方图，入库阶段同时计入数据库耗时（比对使用内存人脸库，只计入阶段耗时）
+        db_operations = {'db_write': 'enroll'}
+        
+        def on_stage(stage, seconds):
+            self.metrics['stage'].labels(stage=stage).observe(seconds)
+            if stage in db_operations:
+                self.metrics['db_query'].labels(operation=db_operations[stage]).observe(seconds)
+        
+        self.perf.listeners.append(on_stage)
+        
+        if self.metrics_enabled:
+            self.metrics_server = MetricsServer(registry, self.metrics_port)
+            self.metrics_port = self.metrics_server.start()
+    
     def update_fps(self):
         """更新帧率统计"""
         now = time.time() 
         self.frame_cnt  += 1 
         if now - self.start_time  >= 1:
             self.fps_show  = self.frame_cnt  / (now - self.start_time) 
-            # 每30秒记录一次详细性能统计
-            if int(now) % 30 == 0:
-                mode = "GPU加速" if gpu_available else "CPU优化"
-                logging.info(f"性能统计 - 模式:{mode}, FPS:{self.fps_show:.1f}, 检测到人脸:{self.current_frame_face_cnt}, 处理间隔:{self.process_interval}ms, 图像缩放:{self.image_scale}")
             self.start_time  = now 
-        self.frame_cnt  = 0
+            self.frame_cnt  = 0
+        
+        # 定期记录详细性能统计
+        if now - self.last_perf_log_time >= self.perf_log_interval:
+            mode = "GPU加速" if gpu_available else "CPU优化"
+            logging.info(f"性能统计 - 模式:{mode}, FPS:{self.fps_show:.1f}, 检测到人脸:{self.current_frame_face_cnt}, 处理间隔:{self.process_interval}ms, 图像缩放:{self.image_scale}")
+            self.perf.log_summary()
+            self.last_perf_log_time = now
  
     def get_screen(self):
         """捕获屏幕图像"""
@@ -1188,7 +1417,7 @@ class TransparentFaceRecognizer:
         
         # 检查是否为重点关注人员
         try:
-            # 从数据库获取人员信息
+            # 获取人员信息（优先读取数据库管理器的人员信息缓存）
             person_info = None
             if person_id:
                 person_info = self.db_manager.get_person_by_id(person_id)
@@ -1245,15 +1474,14 @@ class TransparentFaceRecognizer:
             popup.title(f"⚠️ 重点关注人员: {name}")
             popup.attributes("-topmost", True)
             
-            # 从数据库获取图像数据
+            # 从数据库获取缩略图（已按长边200像素预先缩放）
             image_data = None
             if person_id:
-                image_data = self.db_manager.get_face_image(person_id)
+                image_data = self.db_manager.get_face_thumbnail(person_id, 200)
             
             if image_data: 
                 try:
-                    # 将二进制数据转换为PIL图像
-                    pil_img = Image.open(io.BytesIO(image_data)).resize((200, 200))
+                    pil_img = Image.open(io.BytesIO(image_data))
                     tk_img = ImageTk.PhotoImage(pil_img)
                     label_img = Label(popup, image=tk_img)
                     label_img.image = tk_img  # type: ignore
@@ -1310,254 +1538,247 @@ class TransparentFaceRecognizer:
  
         threading.Thread(target=show).start()
  
-    def create_new_face_data(self, img, face_rect, shape, feature):
-        """处理新检测到的人脸 - 保存到数据库"""
+    def create_new_face_data(self, img, face_rect, shape, feature, quality=None):
+        """处理新检测到的人脸 - 提交到有界优先队列，由工作线程保存到数据库"""
         # 检查自动发现新面孔功能是否开启
         if not self.auto_add_new_faces:
             logging.debug("自动发现新面孔功能已关闭，跳过")
             return
             
-        current_time = time.time() 
-        
-        # 检查冷却时间 
-        if current_time - self.last_new_face_time < self.new_face_cooldown: 
-            logging.debug("新面孔检测过于频繁，已忽略")
-            return 
-            
         # 检查是否已经处理过这个特征 
         feature_str = ','.join(map(str, feature))
         if feature_str in self.processed_features: 
             logging.debug("已处理过此特征的人脸，跳过")
             return 
             
-        # 检查是否正在处理新面孔
-        if self.is_processing_new_face or self.new_face_popup_window is not None: 
-            logging.debug("已有正在处理的新面孔或弹窗还在显示，跳过")
-            return 
-            
-        # 记录新面孔检测
-        logging.info(f"发现新面孔，准备处理 (位置: {face_rect.left()},{face_rect.top()}-{face_rect.right()},{face_rect.bottom()})")
+        # 检查API结果缓存 - 相近的特征已解析或正在请求中，则不再入队
+        cache_entry = self.api_cache.lookup(feature)
+        if cache_entry is not None:
+            self.processed_features.add(feature_str)
+            if cache_entry.is_pending:
+                logging.debug("相近的人脸正在请求API，合并到进行中的请求")
+            else:
+                logging.debug(f"复用缓存的API结果 (人员ID: {cache_entry.person_id})")
+            return
         
-        # 截取人脸图像
+        # 截取人脸图像（复制一份，避免持有整帧图像）
         top = max(0, face_rect.top()) 
         bottom = min(img.shape[0], face_rect.bottom()) 
         left = max(0, face_rect.left()) 
         right = min(img.shape[1], face_rect.right()) 
-        face_img = img[top:bottom, left:right]
+        face_img = img[top:bottom, left:right].copy()
+        if face_img.size == 0:
+            return
+        
+        # 质量分越高（越大、越清晰、越正面）越优先入库
+        if quality is None:
+            quality = self.quality_assessor.assess_pose(self.quality_assessor.assess(img, face_rect), shape)
+        priority = quality.score
+        status = self.new_face_queue.submit(feature, priority, {
+            'feature_str': feature_str,
+            'feature': feature,
+            'face_img': face_img,
+            'detect_time': time.time()
+        })
+        
+        if status == EnrollmentQueue.QUEUED:
+            self.processed_features.add(feature_str)
+            logging.info(f"发现新面孔，已加入入库队列 (位置: {face_rect.left()},{face_rect.top()}-{face_rect.right()},{face_rect.bottom()}, 优先级: {priority:.2f}, 队列: {self.new_face_queue.depth})")
+        elif status == EnrollmentQueue.MERGED:
+            self.processed_features.add(feature_str)
+            logging.debug("新面孔与队列中的人脸相近，已合并")
+        else:
+            logging.debug(f"入库队列已满且优先级较低，丢弃新面孔 (优先级: {priority:.2f})")
+
+    def process_new_face_job(self, job):
+        """入库队列工作线程：创建临时身份并调用API获取真实身份"""
+        feature = job.payload['feature']
+        feature_str = job.payload['feature_str']
+        face_img = job.payload['face_img']
+        
+        # 再次检查API结果缓存，同时登记为进行中的请求
+        cache_entry, is_owner = self.api_cache.reserve(feature)
+        if not is_owner:
+            logging.debug("相近的人脸已在处理中，跳过入库")
+            return
         
         # 生成临时身份信息
         temp_name, temp_id = self.generate_temp_identity()
         
+        person_id = None
+        api_result = None
         try:
-            # 将图像转换为JPEG格式的二进制数据
+            # 转换为BGR格式，由数据库按统一的尺寸上限和编码参数压缩后保存
             face_img_bgr = cv2.cvtColor(face_img, cv2.COLOR_RGB2BGR)
-            success, encoded_img = cv2.imencode('.jpg', face_img_bgr)
-            if not success:
-                logging.error("图像编码失败")
-                return
-            image_data = encoded_img.tobytes()
             
-            # 添加到数据库
-            person_id = self.db_manager.add_person(temp_name, temp_id, is_temp=True)
-            self.db_manager.add_face_image(person_id, image_data, 'jpg')
-            self.db_manager.add_face_feature(person_id, feature)
+            # 人员、图像、特征在一个事务中写入数据库（在工作线程中，直接记录耗时）
+            db_start = time.perf_counter()
+            person_id = self.db_manager.enroll_face(
+                {'name': temp_name, 'id_card': temp_id, 'is_temp': True}, face_img_bgr, feature)['person_id']
+            self.perf.record('db_write', time.perf_counter() - db_start)
             
             # 添加到临时存储
-            self.temp_faces[feature_str] = {
-                'temp_name': temp_name,
-                'temp_id': temp_id,
-                'person_id': person_id,
-                'face_img': face_img,
-                'feature': feature,
-                'detect_time': current_time
-            }
+            with self.temp_faces_lock:
+                self.temp_faces[feature_str] = {
+                    'temp_name': temp_name,
+                    'temp_id': temp_id,
+                    'person_id': person_id,
+                    'face_img': face_img,
+                    'feature': feature,
+                    'detect_time': job.payload['detect_time']
+                }
             
             # 不添加到内存数据库，避免被识别为已知人脸
-            # temp_person_name = f"{temp_name}_{temp_id}"
-            # self.face_name_known_list.append(temp_person_name)
-            # self.face_feature_known_list.append(feature)
-            # self.face_image_data_list.append(image_data)
             
-            # 标记为已处理
-            self.processed_features.add(feature_str)
-            self.last_new_face_time = current_time
+            logging.info(f"已创建临时身份: {temp_name} - {temp_id} (数据库ID: {person_id}, 排队: {time.time() - job.submit_time:.2f}s)")
             
-            logging.info(f"已创建临时身份: {temp_name} - {temp_id} (数据库ID: {person_id})")
+            # 调用API（在工作线程中同步执行，并发数受工作线程数限制）
+            logging.info(f"开始为 {temp_name} 调用API获取真实身份...")
+            api_result = self.call_face_recognition_api(face_img)
             
-        except Exception as e:
-            logging.error(f"保存新面孔到数据库失败: {str(e)}")
-            return
-        
-        # 在新线程中调用API
-        def api_call_thread():
-            try:
-                logging.info(f"开始为 {temp_name} 调用API获取真实身份...")
-                api_result = self.call_face_recognition_api(face_img)
-                
-                if api_result:
-                    # API调用成功，更新身份信息
-                    success = self.update_face_with_api_result(feature_str, api_result)
-                    if success:
-                        logging.info(f"成功更新 {temp_name} 为真实身份: {api_result['name']} - {api_result['id_card']}")
-                        
-                        # 显示更新通知 - 已注释掉，不再显示"身份信息已更新"弹窗
-                        # if self.show_popup:
-                        #     self.show_api_update_notification(temp_name, api_result['name'], api_result['id_card'])
-                    else:
-                        logging.error(f"更新 {temp_name} 身份信息失败")
+            if api_result:
+                # API调用成功，更新身份信息
+                success = self.update_face_with_api_result(feature_str, api_result)
+                if success:
+                    logging.info(f"成功更新 {temp_name} 为真实身份: {api_result['name']} - {api_result['id_card']}")
                 else:
-                    logging.warning(f"API调用失败，保持临时身份: {temp_name}")
-                    
-            except Exception as e:
-                logging.error(f"API调用线程出错: {str(e)}")
-        
-        # 启动API调用线程
-        threading.Thread(target=api_call_thread, daemon=True).start()
+                    logging.error(f"更新 {temp_name} 身份信息失败")
+            else:
+                logging.warning(f"API调用失败，保持临时身份: {temp_name}")
+                
+        except Exception as e:
+            logging.error(f"处理新面孔失败: {str(e)}")
+        finally:
+            # 完成缓存记录，唤醒合并到该请求上的等待者
+            self.api_cache.resolve(cache_entry, api_result, person_id)
  
     def process_frame(self):
         """处理每一帧图像"""
         # 检查日志轮转
         log_manager.check_and_rotate()
         
-        # 定期清理临时文件
         current_time = time.time()
-        if current_time - self.last_cleanup_time > self.cleanup_interval:
-            self.cleanup_temp_files(max_age_hours=24)
-            self.last_cleanup_time = current_time
         
         # 如果正在显示进度条，跳过人脸检测
         if hasattr(self, 'progress_active') and self.progress_active:
             self.root.after(self.process_interval, self.process_frame)
             return
         
+        self.perf.begin_frame()
+        
         # 立即清空画布 - 确保框选立即消失
         self.canvas.delete("all") 
         
         # 获取屏幕截图
-        img = self.get_screen() 
+        with self.perf.measure('grab'):
+            screenshot = np.array(self.sct.grab(self.monitor))
+        with self.perf.measure('convert'):
+            img = cv2.cvtColor(screenshot, cv2.COLOR_BGRA2RGB)
         scale = self.image_scale if self.cpu_optimization else 0.5
-        img_small = cv2.resize(img,  (0, 0), fx=scale, fy=scale)
         
-        # 人脸检测 
-        faces = cnn_face_detector(img_small, 0)
+        # 检测与识别由无界面引擎完成
+        results = self.engine.process(img, scale)
+        
+        self.metrics['frames'].inc()
+        self.metrics['faces'].inc(len(results))
+        
+        try:
+            record_face_results(self.event_store, self.event_tracker, results, 'screen')
+        except Exception as e:
+            logging.error(f"记录识别事件失败: {str(e)}")
         
         # 记录检测到的人脸数量
-        if len(faces) > 0:
-            logging.debug(f"检测到 {len(faces)} 个人脸")
+        if len(results) > 0:
+            logging.debug(f"检测到 {len(results)} 个人脸")
+            self.last_face_time = current_time
         
         # 清空当前帧数据 
         self.current_frame_face_feature_list.clear() 
         self.current_frame_face_position_list.clear() 
         self.current_frame_face_name_list.clear() 
         self.current_frame_face_known_list.clear() 
-        self.current_frame_face_cnt = len(faces)
-        
-        # 如果没有检测到人脸，直接绘制结果并返回
-        if len(faces) == 0:
-            self.draw_results() 
-            self.update_fps() 
-            self.root.after(self.process_interval, self.process_frame)
-            return
-        
-        # 批量处理所有人脸，减少循环开销
-        for face in faces:
-            rect = face.rect  
-            rect = dlib.rectangle(  # type: ignore
-                int(rect.left()  / scale), 
-                int(rect.top()  / scale),
-                int(rect.right()  / scale), 
-                int(rect.bottom()  / scale)
-            )
-            
-            # 快速特征提取
-            shape = predictor(img, rect)
-            feature = face_reco_model.compute_face_descriptor(img, shape)
-            name = "Unknown"
-            known = False 
-            
-            # 使用数据库查找相似人脸
-            match_result = self.db_manager.find_similar_face(feature, self.recognition_threshold)
-            
-            if match_result:
-                # 找到匹配的人脸
-                person_id, distance, person_name, real_name, is_important = match_result
-                
-                # 优先使用real_name，如果没有则使用person_name
-                display_name = real_name if real_name else person_name
-                name = display_name
-                known = True
-                
-                # 检查是否需要显示弹窗 - 使用延迟执行避免阻塞主线程
-                if name not in self.shown_faces and self.show_popup: 
-                    if is_important:
-                        self.root.after(50, lambda n=name, p_id=person_id, p_name=person_name, r_name=real_name: 
-                                      self.show_important_person_popup(n, p_id, p_name, r_name))
-                    else:
-                        self.root.after(50, lambda n=name, p_id=person_id, p_name=person_name, r_name=real_name: 
-                                      self.show_face_info(n, p_id, p_name, r_name))
+        self.current_frame_face_quality_list.clear()
+        self.current_frame_face_cnt = len(results)
+        
+        for result in results:
+            if not result.recognizable:
+                self.metrics['low_quality'].inc()
+            elif result.known:
+                self.metrics['matches'].labels(source=result.match_source).inc()
+                self.schedule_face_popup(result)
+                self.queue_recognition_log(result, current_time)
             else:
-                # 数据库中没有找到，检查内存中的特征
-                min_distance = float('inf')
-                best_match_idx = -1
-                
-                # 优化内存特征搜索
-                for i, stored_feature in enumerate(self.face_feature_known_list):
-                    distance = self.return_euclidean_distance(feature, stored_feature)
-                    if distance < min_distance and distance < self.recognition_threshold:
-                        min_distance = distance
-                        best_match_idx = i
-                
-                if best_match_idx >= 0:
-                    # 在内存中找到匹配的人脸
-                    person_name = self.face_name_known_list[best_match_idx]
-                    real_name = self.real_name_known_list[best_match_idx] if best_match_idx < len(self.real_name_known_list) else None
-                    
-                    # 优先使用real_name，如果没有则使用person_name
-                    display_name = real_name if real_name else person_name
-                    name = display_name
-                    known = True
-                    
-                    if name not in self.shown_faces and self.show_popup:
-                        # 检查是否为重点关注人员
-                        is_important = False
-                        person_id = None
-                        try:
-                            # 从数据库获取人员信息以检查重点关注状态
-                            if '_' in person_name:
-                                name_parts = person_name.split('_', 1)
-                                person_info = self.db_manager.get_person_by_name_id(name_parts[0], name_parts[1])
-                                if person_info:
-                                    is_important = person_info.get('is_important', False)
-                                    person_id = person_info['id']
-                        except:
-                            pass
-                        
-                        if is_important:
-                            # 重点关注人员弹窗
-                            self.root.after(50, lambda n=name, p_id=person_id, p_name=person_name, r_name=real_name: 
-                                          self.show_important_person_popup(n, p_id, p_name, r_name))
-                        else:
-                            # 普通人员弹窗
-                            self.root.after(50, lambda n=name, p_id=person_id, p_name=person_name, r_name=real_name: 
-                                          self.show_face_info(n, p_id, p_name, r_name))
-                else:
-                    # 未找到匹配的人脸，标记为未知
-                    name = "Unknown"
-                    known = False
-                    logging.debug(f"检测到未知人脸")
-                    # 未知人脸，尝试添加到处理 
-                    self.create_new_face_data(img, rect, shape, feature)
-                
+                self.metrics['unknowns'].inc()
+            
             # 更新当前帧数据 
-            self.current_frame_face_feature_list.append(feature) 
-            self.current_frame_face_position_list.append((rect.left(), rect.top(), rect.right(), rect.bottom())) 
-            self.current_frame_face_name_list.append(name) 
-            self.current_frame_face_known_list.append(known)
+            self.current_frame_face_feature_list.append(result.feature) 
+            self.current_frame_face_position_list.append(result.position) 
+            self.current_frame_face_name_list.append(result.name) 
+            self.current_frame_face_known_list.append(result.known)
+            self.current_frame_face_quality_list.append(result.quality)
             
+        if current_time - self.last_recognition_log_flush >= self.recognition_log_flush_interval:
+            self.flush_recognition_logs()
+        
         # 立即绘制结果 
-        self.draw_results() 
+        with self.perf.measure('draw'):
+            self.draw_results() 
+        self.perf.end_frame()
         self.update_fps() 
         self.root.after(self.process_interval, self.process_frame)
+    
+    def queue_recognition_log(self, result, timestamp):
+        """已知人脸：按人限频加入待写入的识别记录"""
+        person_id = result.person_id
+        if person_id is None:
+            return
+        if timestamp - self.last_recognition_log_time.get(person_id, 0) < self.recognition_log_interval:
+            return
+        self.last_recognition_log_time[person_id] = timestamp
+        self.pending_recognition_logs.append((person_id, result.quality.confidence, result.distance, timestamp))
+    
+    def flush_recognition_logs(self, background=True):
+        """批量写入识别记录，默认在后台线程中执行以免阻塞界面"""
+        self.last_recognition_log_flush = time.time()
+        if not self.pending_recognition_logs:
+            return
+        entries, self.pending_recognition_logs = self.pending_recognition_logs, []
+        if background:
+            threading.Thread(target=self.db_manager.add_recognition_logs, args=(entries,), daemon=True).start()
+        else:
+            self.db_manager.add_recognition_logs(entries)
+    
+    def schedule_face_popup(self, result):
+        """已知人脸：检查是否需要显示弹窗 - 使用延迟执行避免阻塞主线程"""
+        name = result.name
+        if name in self.shown_faces or not self.show_popup:
+            return
+        
+        person_id = result.person_id
+        person_name = result.person_name
+        real_name = result.real_name
+        is_important = result.is_important
+        
+        if result.match_source == 'memory':
+            # 内存中匹配的人脸，从人员信息缓存获取重点关注状态（命中时不访问数据库）
+            try:
+                if '_' in person_name:
+                    name_parts = person_name.split('_', 1)
+                    person_info = self.db_manager.get_person_by_name_id(name_parts[0], name_parts[1])
+                    if person_info:
+                        is_important = person_info.get('is_important', False)
+                        person_id = person_info['id']
+            except:
+                pass
+        
+        if is_important:
+            # 重点关注人员弹窗
+            self.root.after(50, lambda n=name, p_id=person_id, p_name=person_name, r_name=real_name: 
+                          self.show_important_person_popup(n, p_id, p_name, r_name))
+        else:
+            # 普通人员弹窗
+            self.root.after(50, lambda n=name, p_id=person_id, p_name=person_name, r_name=real_name: 
+                          self.show_face_info(n, p_id, p_name, r_name))
  
     def draw_results(self):
         """在画布上绘制检测结果"""
@@ -1569,6 +1790,12 @@ class TransparentFaceRecognizer:
         
         # 批量绘制所有人脸框和名称 - 减少画布操作次数
         for i, (left, top, right, bottom) in enumerate(self.current_frame_face_position_list): 
+            quality = self.current_frame_face_quality_list[i]
+            if not quality.recognizable:
+                # 低质量人脸：只画灰色框，不参与识别
+                self.canvas.create_rectangle(left, top, right, bottom, outline='gray', width=2)
+                continue
+            
             color = 'red' if self.current_frame_face_known_list[i] else 'cyan'
             
             # 使用更粗的线条提高可见性
@@ -1615,7 +1842,7 @@ class TransparentFaceRecognizer:
         """绘制状态信息"""
         # 创建半透明背景
         bg_width = 310
-        bg_height = 235  # 增加高度以容纳新的状态行
+        bg_height = 260  # 增加高度以容纳新的状态行
         self.canvas.create_rectangle(
             10, 10, 10 + bg_width, 10 + bg_height,
             fill='black', outline='white', width=2, stipple='gray50'
@@ -1646,7 +1873,7 @@ class TransparentFaceRecognizer:
         
         # 显示弹窗状态
         popup_status = "弹窗显示: 开启" if self.show_popup else "弹窗显示: 关闭"
-        if self.is_processing_new_face or self.new_face_popup_window is not None:
+        if self.new_face_queue.active_workers or self.new_face_popup_window is not None:
             popup_status += " | 新面孔处理中"
         self.canvas.create_text( 
             20, 75, 
@@ -1682,6 +1909,9 @@ class TransparentFaceRecognizer:
         api_status = "API调用: 开启" if self.api_enabled else "API调用: 关闭"
         if self.temp_faces:
             api_status += f" | 临时面孔: {len(self.temp_faces)}"
+        cache_stats = self.api_cache.stats
+        if cache_stats['hits'] or cache_stats['coalesced']:
+            api_status += f" | 缓存命中: {cache_stats['hits'] + cache_stats['coalesced']}"
         api_color = 'green' if self.api_enabled else 'red'
         self.canvas.create_text( 
             20, 150, 
@@ -1710,6 +1940,52 @@ class TransparentFaceRecognizer:
             font=('Arial', 10, 'bold'), 
             anchor='nw'
         )
+        
+        # 显示新面孔入库队列状态
+        queue_stats = self.new_face_queue.stats_snapshot()
+        queue_status = f"入库队列: {self.new_face_queue.depth}/{self.new_face_queue.max_size} | 丢弃: {queue_stats['dropped']} | 合并: {queue_stats['merged']}"
+        self.canvas.create_text( 
+            20, 225, 
+            text=queue_status, 
+            fill='cyan', 
+            font=('Arial', 10, 'bold'), 
+            anchor='nw'
+        )
+        
+        # 显示分阶段耗时
+        self.draw_perf_info(10 + bg_width + 10, 10)
+    
+    def draw_perf_info(self, x, y):
+        """绘制分阶段耗时面板 (ms, p50/p95/p99)"""
+        summary = self.perf.summary()
+        if not summary:
+            return
+        
+        lines = self.perf.format_lines(summary)
+        line_height = 16
+        self.canvas.create_rectangle(
+            x, y, x + 240, y + 30 + line_height * len(lines),
+            fill='black', outline='white', width=2, stipple='gray50'
+        )
+        self.canvas.create_text( 
+            x + 10, y + 8, 
+            text=f"{'阶段':<8} {'p50':>6} {'p95':>6} {'p99':>6} (ms)", 
+            fill='white', 
+            font=('Courier', 9, 'bold'), 
+            anchor='nw'
+        )
+        
+        # 帧预算：处理间隔，超出预算的阶段标红
+        budget_ms = max(self.process_interval, 1)
+        for i, (stage, line) in enumerate(zip(self.perf.ordered_stages(summary), lines)):
+            color = 'red' if summary[stage]['p95'] > budget_ms else 'lime'
+            self.canvas.create_text( 
+                x + 10, y + 26 + i * line_height, 
+                text=line, 
+                fill=color, 
+                font=('Courier', 9), 
+                anchor='nw'
+            )
  
     def run(self):
         """运行主循环"""
@@ -1725,6 +2001,7 @@ class TransparentFaceRecognizer:
             self.face_name_known_list.clear()
             self.face_feature_known_list.clear()
             self.face_image_data_list.clear()
+            self.person_id_known_list.clear()
             self.processed_features.clear()
             
             # 获取所有人员文件夹
@@ -1848,37 +2125,41 @@ class TransparentFaceRecognizer:
                     
                     # 无论是否成功提取到特征，都生成CSV数据
                     if features_list:
-                        # 计算平均特征
-                        avg_feature = np.mean(features_list, axis=0)
-                        msg = f"已处理 {display_name}: {processed_images} 张图像成功提取特征"
+                        # 保留至多K个差异化样本，而不是把多角度的特征平均成一个
+                        keep = select_exemplars(features_list, self.db_manager.max_exemplars_per_person,
+                                                self.db_manager.exemplar_method)
+                        exemplar_features = [list(features_list[i]) for i in keep]
+                        msg = f"已处理 {display_name}: {processed_images} 张图像成功提取特征，保留 {len(exemplar_features)} 个样本"
                         print(msg)
                         logging.info(msg)
                     else:
                         # 生成128维的零向量作为默认特征
-                        avg_feature = np.zeros(128)
+                        exemplar_features = [[0.0] * 128]
                         msg = f"警告: {display_name} 没有成功提取到特征，使用默认零向量"
                         print(msg)
                         logging.warning(msg)
                     
-                    # 写入CSV - 无论是否有特征都写入
-                    writer.writerow([person_name] + list(avg_feature))
-                    
-                    # 更新内存数据
-                    self.face_name_known_list.append(person_name)
-                    self.face_feature_known_list.append(list(avg_feature))
-                    
                     # 设置图像路径 - 如果有图像文件则使用第一个，否则使用默认路径
                     if image_files:
-                        self.face_image_data_list.append(os.path.join(folder_path, image_files[0]))
+                        image_path = os.path.join(folder_path, image_files[0])
                     else:
                         # 创建一个默认的图像路径，即使文件不存在
-                        default_img_path = os.path.join(folder_path, "img_face_1.jpg")
-                        self.face_image_data_list.append(default_img_path)
+                        image_path = os.path.join(folder_path, "img_face_1.jpg")
                     
-                    feature_str = ','.join(map(str, avg_feature))
-                    self.processed_features.add(feature_str)
+                    for exemplar in exemplar_features:
+                        # 写入CSV - 每个样本一行，同名多行
+                        writer.writerow([person_name] + exemplar)
+                        
+                        # 更新内存数据
+                        self.face_name_known_list.append(person_name)
+                        self.face_feature_known_list.append(exemplar)
+                        self.face_image_data_list.append(image_path)
+                        self.person_id_known_list.append(None)  # CSV 中的人员不在数据库中
+                        
+                        feature_str = ','.join(map(str, exemplar))
+                        self.processed_features.add(feature_str)
             
-            msg = f"CSV文件重新生成完成，共处理 {len(self.face_name_known_list)} 个人"
+            msg = f"CSV文件重新生成完成，共处理 {len(set(self.face_name_known_list))} 个人"
             print(msg)
             logging.info(msg)
             return True
@@ -1927,8 +2208,10 @@ class TransparentFaceRecognizer:
                     text_widget.insert(tk.END, f"总人员: {stats['total_persons']} 个\n")
                     text_widget.insert(tk.END, f"真实身份: {stats['real_persons']} 个\n")
                     text_widget.insert(tk.END, f"临时身份: {stats['temp_persons']} 个\n")
+                    text_widget.insert(tk.END, f"重点关注: {stats['important_persons']} 个\n")
                     text_widget.insert(tk.END, f"人脸特征: {stats['total_features']} 个\n")
-                    text_widget.insert(tk.END, f"人脸图像: {stats['total_images']} 个\n\n")
+                    text_widget.insert(tk.END, f"人脸图像: {stats['total_images']} 个\n")
+                    text_widget.insert(tk.END, f"识别记录: {stats['total_logs']} 条\n\n")
                     
                     # 内存数据库信息
                     text_widget.insert(tk.END, "=== 内存数据库信息 ===\n")
@@ -1945,10 +2228,11 @@ class TransparentFaceRecognizer:
                         text_widget.insert(tk.END, "没有加载任何真实身份\n")
                     
                     text_widget.insert(tk.END, "\n=== 临时身份信息 ===\n")
-                    text_widget.insert(tk.END, f"临时面孔数量: {len(self.temp_faces)}\n")
-                    if self.temp_faces:
-                        for feature_str, temp_info in self.temp_faces.items():
-                            text_widget.insert(tk.END, f"临时身份: {temp_info['temp_name']}_{temp_info['temp_id']}\n")
+                    with self.temp_faces_lock:
+                        temp_infos = list(self.temp_faces.values())
+                    text_widget.insert(tk.END, f"临时面孔数量: {len(temp_infos)}\n")
+                    for temp_info in temp_infos:
+                        text_widget.insert(tk.END, f"临时身份: {temp_info['temp_name']}_{temp_info['temp_id']}\n")
                     
                     text_widget.insert(tk.END, "\n=== 识别设置 ===\n")
                     text_widget.insert(tk.END, f"识别阈值: {self.recognition_threshold}\n")
@@ -2074,15 +2358,14 @@ class TransparentFaceRecognizer:
             popup.title(f"⚠️ 重点关注人员: {name}")
             popup.attributes("-topmost", True)
             
-            # 从数据库获取图像数据
+            # 从数据库获取缩略图（已按长边200像素预先缩放）
             image_data = None
             if person_id:
-                image_data = self.db_manager.get_face_image(person_id)
+                image_data = self.db_manager.get_face_thumbnail(person_id, 200)
             
             if image_data: 
                 try:
-                    # 将二进制数据转换为PIL图像
-                    pil_img = Image.open(io.BytesIO(image_data)).resize((200, 200))
+                    pil_img = Image.open(io.BytesIO(image_data))
                     tk_img = ImageTk.PhotoImage(pil_img)
                     label_img = Label(popup, image=tk_img)
                     label_img.image = tk_img  # type: ignore
@@ -2222,30 +2505,6 @@ class TransparentFaceRecognizer:
         
         self.root.after(0, show_cooldown_dialog)
 
-def detect_gpu_availability():
-    """检测GPU可用性"""
-    try:
-        # 检查dlib是否支持CUDA
-        if hasattr(dlib, 'DLIB_USE_CUDA') and dlib.DLIB_USE_CUDA:  # type: ignore
-            # 检查CUDA设备数量
-            if hasattr(dlib, 'cuda') and hasattr(dlib.cuda, 'get_num_devices'):  # type: ignore
-                num_devices = dlib.cuda.get_num_devices()  # type: ignore
-                if num_devices > 0:
-                    logging.info(f"检测到 {num_devices} 个CUDA设备，启用GPU加速")
-                    return True, num_devices
-                else:
-                    logging.warning("dlib支持CUDA但未检测到可用的GPU设备")
-                    return False, 0
-            else:
-                logging.warning("dlib支持CUDA但无法获取设备信息")
-                return False, 0
-        else:
-            logging.info("dlib未编译CUDA支持，使用CPU模式")
-            return False, 0
-    except Exception as e:
-        logging.error(f"GPU检测过程中出错: {e}")
-        return False, 0
-
 # 检测GPU可用性
 gpu_available, gpu_count = detect_gpu_availability()
 
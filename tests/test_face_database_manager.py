@@ -0,0 +1,134 @@
+"""
+FaceDatabaseManager 测试
+运行：python -m pytest -q tests
+"""
+
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+# 允许以 python -m pytest tests 方式运行
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from face_database_manager import FaceDatabaseManager
+
+
+class DeletePersonTest(unittest.TestCase):
+    """删除人员时其特征、图像一并删除（外键约束未开启，由触发器完成）"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmp_dir, 'face_database.db')
+        self.db_manager = FaceDatabaseManager(self.db_path)
+        self.rng = np.random.default_rng(0)
+
+    def tearDown(self):
+        self.db_manager.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def count_rows(self, table: str, person_id: int) -> int:
+        conn = sqlite3.connect(self.db_path)
+        try:
+            return conn.execute(f'SELECT COUNT(*) FROM {table} WHERE person_id = ?', (person_id,)).fetchone()[0]
+        finally:
+            conn.close()
+
+    def test_delete_person_removes_features(self):
+        image = (self.rng.random((64, 64, 3)) * 255).astype(np.uint8)
+        person_id = self.db_manager.enroll_faces(
+            {'name': '张三', 'id_card': '110101199001011234'},
+            [(image, self.rng.random(128)) for _ in range(5)])[0]['person_id']
+        other_id = self.db_manager.enroll_face({'name': '李四', 'id_card': '110101199001015678'},
+                                               image, self.rng.random(128))['person_id']
+        self.assertEqual(self.count_rows('face_features', person_id), 5)
+
+        self.assertTrue(self.db_manager.delete_person(person_id))
+
+        self.assertEqual(self.count_rows('face_features', person_id), 0)
+        self.assertEqual(self.count_rows('face_images', person_id), 0)
+        self.assertEqual(self.count_rows('face_features', other_id), 1)
+        stats = self.db_manager.get_statistics()
+        self.assertEqual(stats['total_features'], 1)
+        self.assertTrue(self.db_manager.rebuild_statistics())
+        self.assertEqual(self.db_manager.get_statistics(), stats)
+
+    def test_orphan_features_removed_on_upgrade(self):
+        person_id = self.db_manager.enroll_face({'name': '王五', 'id_card': '110101199001019999'},
+                                                None, self.rng.random(128))['person_id']
+        # 模拟旧版本：没有删除特征的触发器时删除人员，特征遗留
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('DROP TRIGGER trg_persons_delete_features')
+        conn.execute('DELETE FROM persons WHERE id = ?', (person_id,))
+        conn.commit()
+        conn.close()
+        self.assertEqual(self.count_rows('face_features', person_id), 1)
+
+        FaceDatabaseManager(self.db_path)
+
+        self.assertEqual(self.count_rows('face_features', person_id), 0)
+
+
+class ImageStoreGarbageTest(unittest.TestCase):
+    """共享外部图像目录的两个进程：回收只删除无引用的文件"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmp_dir, 'face_database.db')
+        self.store_dir = os.path.join(self.tmp_dir, 'face_images')
+        self.managers = [FaceDatabaseManager(self.db_path, image_store_dir=self.store_dir) for _ in range(2)]
+
+    def tearDown(self):
+        for db_manager in self.managers:
+            db_manager.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_shared_image_kept_until_last_reference(self):
+        image = (np.random.default_rng(0).random((64, 64, 3)) * 255).astype(np.uint8)
+        first, second = self.managers
+        person_a = first.enroll_face({'name': '张三', 'id_card': '110101199001011234'}, image)['person_id']
+        person_b = second.enroll_face({'name': '李四', 'id_card': '110101199001015678'}, image)['person_id']
+        files = list(first.image_store.iter_files())
+        self.assertEqual(len(files), 1)
+
+        self.assertTrue(first.delete_person(person_a))
+        self.assertTrue(os.path.exists(files[0][1]))
+        self.assertIsNotNone(second.get_face_image(person_b))
+
+        self.assertTrue(second.delete_person(person_b))
+        self.assertFalse(os.path.exists(files[0][1]))
+        self.assertEqual(first.collect_image_garbage(sweep=True, grace_seconds=0), 0)
+
+
+class GalleryArchiveRoundTripTest(unittest.TestCase):
+    """导出的 .fgal 导回同一数据库时不产生重复特征"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_manager = FaceDatabaseManager(os.path.join(self.tmp_dir, 'face_database.db'))
+
+    def tearDown(self):
+        self.db_manager.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_reimport_is_idempotent(self):
+        rng = np.random.default_rng(0)
+        for i in range(4):
+            self.db_manager.enroll_faces({'name': f'人员{i}', 'id_card': f'11010119900101{i:04d}'},
+                                         [(None, rng.random(128)) for _ in range(5)])
+        path = os.path.join(self.tmp_dir, 'features_all.fgal')
+
+        self.assertTrue(self.db_manager.export_gallery(path))
+        self.assertTrue(self.db_manager.import_gallery(path))
+
+        self.assertEqual(self.db_manager.get_statistics()['total_features'], 20)
+
+
+if __name__ == '__main__':
+    unittest.main()